@@ -37,6 +37,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы замер охватывал всю цепочку; без REQUEST_PROFILING отключается сам
+    "movies.profiling.RequestProfilingMiddleware",
+    "movies.metrics.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
@@ -88,6 +91,25 @@ else:
         }
     }
 
+# Cache
+# kinopoisk — дисковый кэш ответов API Кинопоиска (переживает перезапуски).
+# FileBasedCache при каждой записи перечисляет все файлы и, если их не меньше
+# MAX_ENTRIES, удаляет 1/CULL_FREQUENCY из них (при 2 — половину)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "kinopoisk": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get('KINOPOISK_CACHE_DIR', BASE_DIR / "data" / "kinopoisk_cache"),
+        "TIMEOUT": None,
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get('KINOPOISK_CACHE_MAX_ENTRIES', 10000)),
+            "CULL_FREQUENCY": int(os.environ.get('KINOPOISK_CACHE_CULL_FREQUENCY', 2)),
+        },
+    },
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -139,6 +161,55 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Выгрузка каталога /api/catalog/export/: фильмов в одном чанке чтения из БД
+CATALOG_EXPORT_CHUNK_SIZE = int(os.environ.get('CATALOG_EXPORT_CHUNK_SIZE', 500))
+
+# Фасеты /api/movies/facets/: алиас из CACHES и время хранения в секундах.
+# Ключ включает версию журнала изменений, поэтому устаревшие записи не читаются
+MOVIE_FACETS_CACHE_ALIAS = os.environ.get('MOVIE_FACETS_CACHE_ALIAS', 'default')
+MOVIE_FACETS_CACHE_TTL = int(os.environ.get('MOVIE_FACETS_CACHE_TTL', 60 * 60))
+# Жанры и страны с числом фильмов хранятся в памяти процесса; раз в столько секунд
+# сверяются с версией журнала изменений (изменения из воркера импорта и команд)
+CATALOG_LIST_CACHE_TTL = float(os.environ.get('CATALOG_LIST_CACHE_TTL', 30))
+
+# Похожие фильмы /api/movies/{id}/similar/: сколько соседей хранить на фильм
+SIMILAR_MOVIES_TOP_K = int(os.environ.get('SIMILAR_MOVIES_TOP_K', 20))
+
+# Взвешенный рейтинг: сколько голосов нужно, чтобы оценка фильма перевесила среднюю по каталогу,
+# и сколько лидеров хранить на жанр (/api/genres/{id}/top/)
+WEIGHTED_RATING_MIN_VOTES = int(os.environ.get('WEIGHTED_RATING_MIN_VOTES', 1000))
+GENRE_TOP_SIZE = int(os.environ.get('GENRE_TOP_SIZE', 100))
+
+# Профилирование запросов (movies.profiling.RequestProfilingMiddleware); выключенное не стоит ничего.
+# Заголовок Server-Timing на каждый ответ; JSON в лог movies.profiling — для доли запросов
+# REQUEST_PROFILING_SAMPLE_RATE, а медленных и с повторяющимся SQL (N+1) — всегда
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', 'False').lower() in ('true', '1', 'yes')
+REQUEST_PROFILING_SAMPLE_RATE = float(os.environ.get('REQUEST_PROFILING_SAMPLE_RATE', 0.01))
+REQUEST_PROFILING_SLOW_MS = float(os.environ.get('REQUEST_PROFILING_SLOW_MS', 500))
+REQUEST_PROFILING_DUPLICATE_THRESHOLD = int(os.environ.get('REQUEST_PROFILING_DUPLICATE_THRESHOLD', 3))
+# Дамп профиля запроса с заголовком X-Profile: <токен> (пустой токен — дампы выключены);
+# профайлер cprofile или pyinstrument (если установлен)
+REQUEST_PROFILING_TOKEN = os.environ.get('REQUEST_PROFILING_TOKEN', '')
+REQUEST_PROFILER = os.environ.get('REQUEST_PROFILER', 'cprofile')
+REQUEST_PROFILING_DIR = os.environ.get('REQUEST_PROFILING_DIR', BASE_DIR / "data" / "profiles")
+
+# Метрики Prometheus на /metrics (movies.metrics); при заданном токене — только с
+# Authorization: Bearer <METRICS_TOKEN>, без DEBUG токен обязателен.
+# Несколько воркеров — PROMETHEUS_MULTIPROC_DIR
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'False').lower() in ('true', '1', 'yes')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'movies.profiling': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 # API Documentation (drf-spectacular)
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Кинокаталог API',
@@ -151,12 +222,16 @@ SPECTACULAR_SETTINGS = {
 - Получение детальной информации о фильме
 - Получение актёрского состава фильма
 - Списки жанров и актёров
+- Выгрузка всего каталога одним потоковым ответом (NDJSON) для офлайн-кэша
 
 ## Фильтрация фильмов
-- `?genre=1` — по ID жанра
+- `?genre=1,2` — любой из жанров (`?genre_all=1,2` — все сразу)
+- `?country=1,2` — любая из стран (`?country_all=1,2` — все сразу)
 - `?actor=1` — по ID актёра
-- `?year=2024` — по году выхода
+- `?type=FILM,TV_SERIES` — по типу
+- `?year=2024`, `?year_min=2000&year_max=2010` — по году выхода
 - `?min_rating=8.0` — минимальный рейтинг
+- `?age_rating_min=6&age_rating_max=16`, `?film_length_min=60&film_length_max=120` — диапазоны
 - `?search=текст` — поиск по названию/описанию
 - `?ordering=-rating` — сортировка (rating, -rating, release_date, -release_date, vote_count, title)
 ''',
@@ -167,6 +242,8 @@ SPECTACULAR_SETTINGS = {
         {'name': 'movies', 'description': 'Операции с фильмами'},
         {'name': 'genres', 'description': 'Операции с жанрами'},
         {'name': 'actors', 'description': 'Операции с актёрами'},
+        {'name': 'countries', 'description': 'Операции со странами'},
+        {'name': 'catalog', 'description': 'Выгрузка каталога'},
     ],
 }
 
@@ -190,3 +267,41 @@ JAZZMIN_SETTINGS = {
 # Kinopoisk API settings
 KINOPOISK_API_TOKEN = os.environ.get('KINOPOISK_API_TOKEN')
 
+# Пакетный импорт: число одновременно загружаемых фильмов и размер пачки на транзакцию
+KINOPOISK_IMPORT_CONCURRENCY = int(os.environ.get('KINOPOISK_IMPORT_CONCURRENCY', 5))
+KINOPOISK_IMPORT_BATCH_SIZE = int(os.environ.get('KINOPOISK_IMPORT_BATCH_SIZE', 50))
+# Сколько загруженных фильмов может ждать записи в БД (0 — две пачки); при заполнении загрузка приостанавливается
+KINOPOISK_IMPORT_QUEUE_SIZE = int(os.environ.get('KINOPOISK_IMPORT_QUEUE_SIZE', 0))
+
+# Ограничение запросов к API: квота неофициального API — 20 запросов в секунду
+KINOPOISK_TIMEOUT = float(os.environ.get('KINOPOISK_TIMEOUT', 15))
+KINOPOISK_RATE_LIMIT = float(os.environ.get('KINOPOISK_RATE_LIMIT', 20))
+KINOPOISK_MAX_RETRIES = int(os.environ.get('KINOPOISK_MAX_RETRIES', 5))
+KINOPOISK_BACKOFF_BASE = float(os.environ.get('KINOPOISK_BACKOFF_BASE', 0.5))
+KINOPOISK_BACKOFF_MAX = float(os.environ.get('KINOPOISK_BACKOFF_MAX', 30))
+KINOPOISK_CIRCUIT_BREAKER_THRESHOLD = int(os.environ.get('KINOPOISK_CIRCUIT_BREAKER_THRESHOLD', 10))
+KINOPOISK_CIRCUIT_BREAKER_TIMEOUT = float(os.environ.get('KINOPOISK_CIRCUIT_BREAKER_TIMEOUT', 30))
+
+# Кэш ответов API: алиас из CACHES (пустая строка — выключен), время свежести
+# по эндпоинтам в секундах и срок хранения устаревших записей для перепроверки по ETag
+KINOPOISK_CACHE_ALIAS = os.environ.get('KINOPOISK_CACHE_ALIAS', 'kinopoisk')
+KINOPOISK_CACHE_TTL = {
+    'film': int(os.environ.get('KINOPOISK_CACHE_TTL_FILM', 24 * 60 * 60)),
+    'staff': int(os.environ.get('KINOPOISK_CACHE_TTL_STAFF', 7 * 24 * 60 * 60)),
+    'videos': int(os.environ.get('KINOPOISK_CACHE_TTL_VIDEOS', 7 * 24 * 60 * 60)),
+    'list': int(os.environ.get('KINOPOISK_CACHE_TTL_LIST', 24 * 60 * 60)),
+}
+KINOPOISK_CACHE_RETENTION = int(os.environ.get('KINOPOISK_CACHE_RETENTION', 30 * 24 * 60 * 60))
+# Офлайн-режим: импорт только из кэша (повтор прошлых импортов без сети)
+KINOPOISK_CACHE_OFFLINE = os.environ.get('KINOPOISK_CACHE_OFFLINE', 'False').lower() in ('true', '1', 'yes')
+
+# Пул HTTP соединений к API (общий на процесс, HTTP/2 — если установлен пакет h2)
+KINOPOISK_HTTP2 = os.environ.get('KINOPOISK_HTTP2', 'True').lower() in ('true', '1', 'yes')
+KINOPOISK_MAX_CONNECTIONS = int(os.environ.get('KINOPOISK_MAX_CONNECTIONS', 20))
+KINOPOISK_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('KINOPOISK_MAX_KEEPALIVE_CONNECTIONS', 10))
+KINOPOISK_KEEPALIVE_EXPIRY = float(os.environ.get('KINOPOISK_KEEPALIVE_EXPIRY', 30))
+
+# Очередь импорта: задача, выполняющаяся дольше KINOPOISK_JOB_TIMEOUT секунд,
+# считается зависшей и возвращается в очередь (не более KINOPOISK_JOB_MAX_ATTEMPTS попыток)
+KINOPOISK_JOB_TIMEOUT = int(os.environ.get('KINOPOISK_JOB_TIMEOUT', 15 * 60))
+KINOPOISK_JOB_MAX_ATTEMPTS = int(os.environ.get('KINOPOISK_JOB_MAX_ATTEMPTS', 3))
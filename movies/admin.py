@@ -2,9 +2,13 @@ from django.contrib import admin
 from django.urls import path
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.http import JsonResponse
+from django.urls import reverse
 from django.utils.html import format_html
-from .models import Genre, Actor, Movie, MovieCast, SiteSettings, Country, MovieSource
+from .models import Genre, Actor, Movie, MovieCast, SiteSettings, Country, MovieSource, ImportJob, CrawlState, ChangeLog
 from .kinopoisk import KinopoiskService, KinopoiskImportError
+from .jobs import enqueue_imports
+from .ranking import update_weighted_ratings
 
 
 @admin.register(Country)
@@ -13,6 +17,44 @@ class CountryAdmin(admin.ModelAdmin):
     search_fields = ['name']
 
 
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'source', 'status', 'movie', 'attempts', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['source', 'error']
+    list_select_related = ['movie']
+    readonly_fields = ['movie', 'attempts', 'created_at', 'started_at', 'finished_at']
+    actions = ['requeue']
+
+    @admin.action(description="Повторить импорт")
+    def requeue(self, request, queryset):
+        count = queryset.exclude(status=ImportJob.STATUS_RUNNING).update(
+            status=ImportJob.STATUS_PENDING, error=None, finished_at=None
+        )
+        self.message_user(request, f"Возвращено в очередь: {count}", level=messages.SUCCESS)
+
+
+@admin.register(CrawlState)
+class CrawlStateAdmin(admin.ModelAdmin):
+    list_display = ['name', 'source', 'position', 'total_pages', 'finished',
+                    'imported', 'skipped', 'not_found', 'failed', 'updated_at']
+    list_filter = ['source', 'finished']
+    search_fields = ['name']
+    readonly_fields = ['discovered', 'skipped', 'imported', 'not_found', 'failed', 'created_at', 'updated_at']
+
+
+@admin.register(ChangeLog)
+class ChangeLogAdmin(admin.ModelAdmin):
+    list_display = ['id', 'model', 'object_id', 'action', 'changed_at']
+    list_filter = ['model', 'action']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(MovieSource)
 class MovieSourceAdmin(admin.ModelAdmin):
     list_display = ['__str__', 'movie', 'name', 'created_at']
@@ -49,9 +91,9 @@ class GenreAdmin(admin.ModelAdmin):
 
 @admin.register(Actor)
 class ActorAdmin(admin.ModelAdmin):
-    list_display = ['id', 'profile_preview', 'name', 'kinopoisk_id']
+    list_display = ['id', 'profile_preview', 'name', 'kinopoisk_id', 'movie_count', 'total_votes']
     search_fields = ['name', 'kinopoisk_id']
-    readonly_fields = ['profile_preview_large']
+    readonly_fields = ['profile_preview_large', 'movie_count', 'total_votes']
 
     def profile_preview(self, obj):
         url = obj.get_profile_url()
@@ -85,9 +127,14 @@ class MovieAdmin(admin.ModelAdmin):
     filter_horizontal = ['genres', 'countries']
     inlines = [MovieSourceInline, MovieCastInline]
     date_hierarchy = 'release_date'
-    readonly_fields = ['poster_preview_large', 'backdrop_preview_large']
+    readonly_fields = ['poster_preview_large', 'backdrop_preview_large', 'weighted_rating']
     change_list_template = "admin/movies/movie/change_list.html"
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Рейтинг или голоса могли измениться вручную
+        update_weighted_ratings([obj.pk])
+
     def year_display(self, obj):
         return obj.release_date.year if obj.release_date else "-"
     year_display.short_description = "Год"
@@ -117,36 +164,64 @@ class MovieAdmin(admin.ModelAdmin):
         urls = super().get_urls()
         custom_urls = [
             path('import-kinopoisk/', self.admin_site.admin_view(self.import_kinopoisk_view), name='movies_movie_import_kinopoisk'),
+            path('import-kinopoisk/status/', self.admin_site.admin_view(self.import_status_view), name='movies_movie_import_status'),
         ]
         return custom_urls + urls
 
     def import_kinopoisk_view(self, request):
-        context = {
-            'title': 'Импорт с Кинопоиск'
-        }
-        
+        """Ставит импорт в очередь; выполняет его воркер run_import_worker"""
         if request.method == 'POST':
-            url = request.POST.get('kinopoisk_url')
-            if url:
+            raw = request.POST.get('kinopoisk_urls', '')
+            upload = request.FILES.get('kinopoisk_file')
+            if upload:
+                raw += '\n' + upload.read().decode('utf-8', errors='ignore')
+
+            items, invalid = [], []
+            for item in KinopoiskService.parse_items(raw):
                 try:
-                    service = KinopoiskService()
-                    movie = service.import_from_url(url)
-                    self.message_user(
-                        request, 
-                        format_html('Фильм "<b>{}</b>" успешно импортирован!', movie.title), 
-                        level=messages.SUCCESS
-                    )
-                    # Не редиректим, а показываем превью
-                    context['movie'] = movie
-                    context['kinopoisk_url'] = url
-                except KinopoiskImportError as e:
-                    self.message_user(request, f"Ошибка импорта: {str(e)}", level=messages.ERROR)
-                    context['kinopoisk_url'] = url
-                except Exception as e:
-                    self.message_user(request, f"Неизвестная ошибка: {str(e)}", level=messages.ERROR)
-                    context['kinopoisk_url'] = url
-        
+                    KinopoiskService.extract_id(item)
+                    items.append(item)
+                except KinopoiskImportError:
+                    invalid.append(item)
+
+            if items:
+                jobs = enqueue_imports(items)
+                self.message_user(request, f"Добавлено в очередь импорта: {len(jobs)}", level=messages.SUCCESS)
+            if invalid:
+                self.message_user(
+                    request,
+                    f"Не удалось распознать URL/ID: {', '.join(invalid[:20])}",
+                    level=messages.ERROR
+                )
+            return redirect('admin:movies_movie_import_kinopoisk')
+
+        context = {
+            'title': 'Импорт с Кинопоиск',
+            'jobs': ImportJob.objects.select_related('movie')[:100],
+            'pending_count': ImportJob.objects.filter(
+                status__in=[ImportJob.STATUS_PENDING, ImportJob.STATUS_RUNNING]
+            ).count(),
+        }
         return render(request, 'admin/movies/movie/import_kinopoisk.html', context)
+
+    def import_status_view(self, request):
+        """Статусы задач импорта для опроса со страницы импорта (?ids=1,2,3)"""
+        ids = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk.isdigit()]
+        jobs = ImportJob.objects.filter(pk__in=ids).select_related('movie')
+        return JsonResponse({
+            'pending_count': ImportJob.objects.filter(
+                status__in=[ImportJob.STATUS_PENDING, ImportJob.STATUS_RUNNING]
+            ).count(),
+            'jobs': [{
+                'id': job.pk,
+                'status': job.status,
+                'status_display': job.get_status_display(),
+                'finished': job.status in ImportJob.FINISHED_STATUSES,
+                'error': job.error,
+                'movie_title': job.movie.title if job.movie else None,
+                'movie_url': reverse('admin:movies_movie_change', args=[job.movie.pk]) if job.movie else None,
+            } for job in jobs],
+        })
     
     fieldsets = (
         (None, {
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class MoviesConfig(AppConfig):
     name = "movies"
+
+    def ready(self):
+        # Сигналы журнала изменений каталога, счётчиков актёров и кэша списков
+        from . import changes, counters, facets  # noqa: F401
@@ -0,0 +1,170 @@
+"""
+Отслеживание изменений каталога для дельта-синхронизации клиентов.
+Изменения через ORM (save, delete, M2M) попадают в ChangeLog через сигналы;
+пакетные операции (bulk_create, bulk_update, update) сигналов не шлют,
+поэтому вызывают record_changes явно.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import ChangeLog, Movie, Actor, Genre, Country, MovieCast, MovieSource
+
+MODEL_NAMES = {
+    Movie: ChangeLog.MODEL_MOVIE,
+    Actor: ChangeLog.MODEL_ACTOR,
+    Genre: ChangeLog.MODEL_GENRE,
+    Country: ChangeLog.MODEL_COUNTRY,
+}
+
+# Поля, изменение которых клиенту не видно (служебные отметки импорта)
+INTERNAL_FIELDS = {'refreshed_at'}
+
+_suspended = ContextVar('catalog_changes_suspended', default=False)
+_buffer = ContextVar('catalog_changes_buffer', default=None)
+
+
+@contextmanager
+def tracking_suspended():
+    """Не записывать изменения внутри блока (например, перед record_reset)"""
+    token = _suspended.set(True)
+    try:
+        yield
+    finally:
+        _suspended.reset(token)
+
+
+@contextmanager
+def batched_changes():
+    """
+    Копит изменения внутри блока и пишет их одним INSERT на выходе.
+    Вложенный блок при успехе передаёт изменения внешнему, при исключении
+    (например, откат точки сохранения) — отбрасывает.
+    """
+    parent = _buffer.get()
+    changes = {}
+    token = _buffer.set(changes)
+    try:
+        yield
+    finally:
+        _buffer.reset(token)
+    if parent is not None:
+        parent.update(changes)
+    else:
+        _write(changes)
+
+
+def record_changes(model, ids, action: str = ChangeLog.ACTION_UPSERT) -> None:
+    """Записывает изменение объектов model (класс модели каталога) с указанными ID"""
+    if _suspended.get():
+        return
+    name = MODEL_NAMES[model]
+    changes = {(name, pk): action for pk in ids if pk is not None}
+    buffer = _buffer.get()
+    if buffer is not None:
+        # Повторное изменение объекта переносит его в конец (важно для удаления после изменения)
+        for key, value in changes.items():
+            buffer.pop(key, None)
+            buffer[key] = value
+    else:
+        _write(changes)
+
+
+def _write(changes: dict) -> None:
+    if changes:
+        ChangeLog.objects.bulk_create([
+            ChangeLog(model=name, object_id=pk, action=action) for (name, pk), action in changes.items()
+        ])
+
+
+def record_reset() -> None:
+    """Каталог заменён целиком: клиенты должны выполнить полную синхронизацию"""
+    ChangeLog.objects.create(action=ChangeLog.ACTION_RESET)
+
+
+def current_version() -> int:
+    """Версия каталога — ID последней записи журнала (0, если записей нет)"""
+    return ChangeLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+# Только модели каталога: приёмник без sender вызывался бы для всех моделей проекта,
+# а post_delete для всех моделей отключает быстрое каскадное удаление (Collector.can_fast_delete)
+@receiver(post_save, sender=Movie)
+@receiver(post_save, sender=Actor)
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Country)
+@receiver(post_save, sender=MovieCast)
+@receiver(post_save, sender=MovieSource)
+def _on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if sender in MODEL_NAMES:
+        if update_fields is not None and set(update_fields) <= INTERNAL_FIELDS:
+            return
+        record_changes(sender, [instance.pk])
+    elif sender in (MovieCast, MovieSource):
+        # Роли и источники — часть карточки фильма
+        record_changes(Movie, [instance.movie_id])
+
+
+@receiver(post_delete, sender=Movie)
+@receiver(post_delete, sender=Actor)
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Country)
+@receiver(post_delete, sender=MovieCast)
+@receiver(post_delete, sender=MovieSource)
+def _on_delete(sender, instance, **kwargs):
+    if sender in MODEL_NAMES:
+        record_changes(sender, [instance.pk], ChangeLog.ACTION_DELETE)
+    elif sender in (MovieCast, MovieSource):
+        record_changes(Movie, [instance.movie_id])
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+@receiver(m2m_changed, sender=Movie.countries.through)
+def _on_m2m_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action == 'post_clear' or (action in ('post_add', 'post_remove') and pk_set):
+            record_changes(Movie, [instance.pk])
+    elif action in ('post_add', 'post_remove') and pk_set:
+        # genre.movies.add(...): изменились фильмы из pk_set
+        record_changes(Movie, pk_set)
+    elif action == 'pre_clear':
+        # genre.movies.clear(): затронутые фильмы известны только до очистки
+        record_changes(Movie, instance.movies.values_list('pk', flat=True))
+
+
+def changes_since(since: int, limit: int) -> dict:
+    """
+    Изменения после версии since (не более limit записей журнала), сгруппированные по моделям.
+    Возвращает {'version', 'has_more', 'reset', 'upserts': {model: [ID]}, 'deleted': {model: [ID]}};
+    для каждого объекта учитывается последнее действие.
+    """
+    entries = list(
+        ChangeLog.objects.filter(id__gt=since).order_by('id')
+        .values_list('id', 'model', 'object_id', 'action')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    result = {
+        'version': entries[-1][0] if entries else max(since, current_version()),
+        'has_more': has_more,
+        'reset': False,
+        'upserts': {name: [] for name in MODEL_NAMES.values()},
+        'deleted': {name: [] for name in MODEL_NAMES.values()},
+    }
+    if any(action == ChangeLog.ACTION_RESET for _, _, _, action in entries):
+        result.update(reset=True, has_more=False, version=current_version())
+        return result
+
+    latest = {}
+    for _, model, object_id, action in entries:
+        latest.pop((model, object_id), None)
+        latest[(model, object_id)] = action
+    for (model, object_id), action in latest.items():
+        key = 'deleted' if action == ChangeLog.ACTION_DELETE else 'upserts'
+        result[key][model].append(object_id)
+    return result
@@ -0,0 +1,105 @@
+"""
+Денормализованные счётчики актёров: число фильмов и сумма голосов за них
+(популярность). Изменения состава через ORM обновляют счётчики затронутых
+актёров сигналами; пакетные записи (bulk_create, bulk_update) сигналов не шлют,
+поэтому вызывают actors_changed явно, как и повторный импорт, изменивший голоса
+фильма. При массовом обновлении рейтингов счётчики пересчитываются целиком
+(ranking.recompute_rankings). UPDATE сигналов не шлёт, поэтому актёры с
+изменившимися счётчиками записываются в журнал изменений явно.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import F, Func, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .changes import record_changes
+from .models import Actor, Movie, MovieCast
+
+_pending = ContextVar('actor_counters_pending', default=None)
+
+
+def actor_counter_expressions(movie_model, cast_model) -> dict:
+    """
+    Выражения для Actor.objects.update(**...) — подзапросы по фильмам актёра
+    (фильм с двумя ролями актёра считается один раз). Модели передаются
+    параметрами; миграция 0013 хранит свою копию выражений.
+    """
+    movies = movie_model.objects.filter(
+        pk__in=cast_model.objects.filter(actor_id=OuterRef(OuterRef('pk'))).values('movie_id')
+    ).order_by()
+    # Агрегат через Func, чтобы подзапрос не получил GROUP BY
+    count = movies.annotate(value=Func(F('pk'), function='COUNT')).values('value')
+    votes = movies.annotate(value=Func(F('vote_count'), function='SUM')).values('value')
+    return {
+        'movie_count': Coalesce(Subquery(count), Value(0)),
+        'total_votes': Coalesce(Subquery(votes), Value(0)),
+    }
+
+
+def update_actor_counters(actor_ids=None) -> int:
+    """
+    Пересчитывает счётчики актёров actor_ids (всех, если None) одним UPDATE;
+    строки с неизменившимися счётчиками не перезаписываются. Возвращает число обновлённых.
+    """
+    queryset = Actor.objects.all()
+    if actor_ids is not None:
+        actor_ids = [pk for pk in actor_ids if pk is not None]
+        if not actor_ids:
+            return 0
+        queryset = queryset.filter(pk__in=actor_ids)
+    expressions = actor_counter_expressions(Movie, MovieCast)
+    changed = queryset.exclude(**expressions)
+    # Счётчики отдаются в API актёра — клиенты /api/changes/ должны их перечитать
+    record_changes(Actor, list(changed.values_list('pk', flat=True)))
+    return changed.update(**expressions)
+
+
+@contextmanager
+def deferred_actor_counters():
+    """
+    Копит затронутых актёров внутри блока и обновляет их одним UPDATE на выходе.
+    Вложенный блок передаёт актёров внешнему; при исключении (откат) — отбрасывает.
+    """
+    parent = _pending.get()
+    pending = set()
+    token = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    if parent is not None:
+        parent.update(pending)
+    else:
+        update_actor_counters(pending)
+
+
+def actors_changed(actor_ids) -> None:
+    """Состав фильмов этих актёров изменился"""
+    pending = _pending.get()
+    if pending is not None:
+        pending.update(actor_ids)
+    else:
+        update_actor_counters(actor_ids)
+
+
+@receiver(pre_save, sender=MovieCast)
+def _remember_actor(sender, instance, raw=False, **kwargs):
+    # Роль могли передать другому актёру — его счётчики тоже изменятся
+    if not raw and instance.pk:
+        instance._previous_actor_id = (
+            MovieCast.objects.filter(pk=instance.pk).values_list('actor_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=MovieCast)
+def _on_cast_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        actors_changed({instance.actor_id, getattr(instance, '_previous_actor_id', None)})
+
+
+@receiver(post_delete, sender=MovieCast)
+def _on_cast_deleted(sender, instance, **kwargs):
+    actors_changed([instance.actor_id])
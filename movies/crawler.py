@@ -0,0 +1,123 @@
+"""
+Обход каталога Кинопоиска для наполнения базы: подборки, поиск по фильтрам
+или диапазон ID. Найденные фильмы сверяются с каталогом и импортируются
+пачками; после каждого шага позиция сохраняется в CrawlState, поэтому
+прерванный обход продолжается с того же места. Если API временно недоступно
+(цепь разомкнута, повторы исчерпаны), позиция не сдвигается и обход
+останавливается: повторный запуск проверит те же ID.
+"""
+import time
+from dataclasses import dataclass
+
+from .kinopoisk import KinopoiskService, KinopoiskUnavailableError
+from .models import CrawlState, Movie
+
+
+@dataclass
+class CrawlStepStats:
+    """Итог одного шага обхода (страница списка или отрезок диапазона ID)"""
+    position: int
+    discovered: int = 0
+    skipped: int = 0
+    imported: int = 0
+    not_found: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Импортировано фильмов в секунду"""
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+
+class KinopoiskCrawler:
+    """Пошаговый обход источника из CrawlState с импортом новых фильмов"""
+
+    def __init__(self, service: KinopoiskService, state: CrawlState, concurrency: int = None, step: int = 100):
+        self.service = service
+        self.state = state
+        self.concurrency = concurrency
+        # Размер отрезка для обхода диапазона ID
+        self.step_size = step
+
+    def _discover(self) -> tuple[list[int], int] | None:
+        """ID фильмов на текущей позиции и следующая позиция; None — обход закончен"""
+        state = self.state
+        if state.source == CrawlState.SOURCE_RANGE:
+            end = state.params['end']
+            if state.position > end:
+                return None
+            ids = list(range(state.position, min(state.position + self.step_size, end + 1)))
+            return ids, state.position + len(ids)
+
+        if state.total_pages is not None and state.position > state.total_pages:
+            return None
+        data = self.service.fetch_list_page(state.source, state.params, state.position)
+        state.total_pages = data.get('totalPages') or 0
+        ids = [item['kinopoiskId'] for item in data.get('items', []) if item.get('kinopoiskId')]
+        if not ids:
+            return None
+        return ids, state.position + 1
+
+    def step(self) -> CrawlStepStats | None:
+        """
+        Выполняет один шаг обхода; None — обход закончен.
+        KinopoiskUnavailableError — API недоступно, позиция осталась прежней.
+        """
+        state = self.state
+        if state.finished:
+            return None
+
+        started = time.perf_counter()
+        found = self._discover()
+        if found is None:
+            state.finished = True
+            state.save()
+            return None
+        ids, next_position = found
+
+        # Дедупликация с уже импортированными фильмами — одним запросом
+        ids = list(dict.fromkeys(ids))
+        existing = set(Movie.objects.filter(kinopoisk_id__in=ids).values_list('kinopoisk_id', flat=True))
+        new_ids = [film_id for film_id in ids if film_id not in existing]
+        results = self.service.import_many(new_ids, concurrency=self.concurrency) if new_ids else []
+
+        unavailable = [r for r in results if r.transient]
+        if unavailable:
+            # Импортированные уже в каталоге и при повторе шага будут пропущены
+            state.imported += sum(1 for r in results if r.ok)
+            state.save()
+            raise KinopoiskUnavailableError(
+                f"{len(unavailable)} из {len(results)} фильмов не загружены: {unavailable[0].error}"
+            )
+
+        stats = CrawlStepStats(
+            position=state.position,
+            discovered=len(ids),
+            skipped=len(ids) - len(new_ids),
+            imported=sum(1 for r in results if r.ok),
+            not_found=sum(1 for r in results if r.not_found),
+        )
+        stats.failed = len(results) - stats.imported - stats.not_found
+        stats.elapsed = time.perf_counter() - started
+
+        state.discovered += stats.discovered
+        state.skipped += stats.skipped
+        state.imported += stats.imported
+        state.not_found += stats.not_found
+        state.failed += stats.failed
+        state.position = next_position
+        if state.total_pages is not None and state.position > state.total_pages:
+            state.finished = True
+        state.save()
+        return stats
+
+    def run(self, max_steps: int = None):
+        """Генератор шагов обхода: до конца источника или max_steps шагов"""
+        steps = 0
+        while max_steps is None or steps < max_steps:
+            stats = self.step()
+            if stats is None:
+                return
+            steps += 1
+            yield stats
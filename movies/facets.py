@@ -0,0 +1,154 @@
+"""
+Счётчики для фильтров (фасеты): жанры, страны, годы, возрастной рейтинг
+и диапазоны рейтинга для текущего набора фильтров списка фильмов.
+Результат кэшируется по параметрам фильтра и версии журнала изменений,
+поэтому GROUP BY выполняется только после изменения каталога.
+
+Списки жанров и стран с числом фильмов запрашиваются при каждом запуске
+приложения — они хранятся в памяти процесса (ListCache) и сбрасываются
+сигналами; изменения из других процессов замечаются по версии журнала.
+"""
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, F, Value
+from django.db.models.functions import ExtractYear, Floor, Least
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .changes import current_version
+from .metrics import cache_lookup
+from .models import Movie, Genre, Country
+
+# Параметры, не влияющие на набор фильмов
+IGNORED_PARAMS = {'page', 'page_size', 'ordering', 'format'}
+
+
+def facets_cache_key(params, version: int) -> str:
+    items = sorted((key, sorted(params.getlist(key))) for key in params if key not in IGNORED_PARAMS)
+    digest = hashlib.sha1(json.dumps(items, ensure_ascii=False).encode('utf-8')).hexdigest()
+    return f'movie-facets:{version}:{digest}'
+
+
+def get_facets(queryset, params) -> dict:
+    """Фасеты для queryset (уже отфильтрованного по params) из кэша или через compute_facets"""
+    cache = caches[settings.MOVIE_FACETS_CACHE_ALIAS]
+    key = facets_cache_key(params, current_version())
+    facets = cache.get(key)
+    cache_lookup('facets', 'miss' if facets is None else 'hit')
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, settings.MOVIE_FACETS_CACHE_TTL)
+    return facets
+
+
+def compute_facets(queryset) -> dict:
+    """Агрегаты по фильмам из queryset: по одному GROUP BY на фасет"""
+    # Подзапрос по ID: JOIN-ы фильтров (жанр, актёр) не размножают строки в агрегатах
+    ids = queryset.order_by().values('pk')
+    movies = Movie.objects.filter(pk__in=ids).order_by()
+
+    genres = (
+        Movie.genres.through.objects.filter(movie_id__in=ids)
+        .values('genre_id', 'genre__name').annotate(count=Count('movie_id'))
+        .order_by('-count', 'genre__name')
+    )
+    countries = (
+        Movie.countries.through.objects.filter(movie_id__in=ids)
+        .values('country_id', 'country__name').annotate(count=Count('movie_id'))
+        .order_by('-count', 'country__name')
+    )
+    years = (
+        movies.annotate(year=ExtractYear('release_date'))
+        .values('year').annotate(count=Count('pk')).order_by('-year')
+    )
+    age_ratings = movies.values('age_rating').annotate(count=Count('pk')).order_by(F('age_rating').asc(nulls_last=True))
+    # Рейтинг 10 попадает в диапазон 9–10
+    ratings = (
+        movies.annotate(bucket=Least(Floor('rating'), Value(9.0)))
+        .values('bucket').annotate(count=Count('pk')).order_by('-bucket')
+    )
+
+    return {
+        'total': movies.count(),
+        'genres': [{'id': g['genre_id'], 'name': g['genre__name'], 'count': g['count']} for g in genres],
+        'countries': [{'id': c['country_id'], 'name': c['country__name'], 'count': c['count']} for c in countries],
+        'years': [{'value': y['year'], 'count': y['count']} for y in years],
+        'age_ratings': [{'value': a['age_rating'], 'count': a['count']} for a in age_ratings],
+        'ratings': [{'from': int(r['bucket']), 'to': int(r['bucket']) + 1, 'count': r['count']} for r in ratings],
+    }
+
+
+@dataclass
+class _Entry:
+    value: object
+    version: int
+    checked_at: float
+
+
+class ListCache:
+    """
+    Кэш небольших списков в памяти процесса. Сигналы этого процесса сбрасывают
+    его сразу; изменения, сделанные другими процессами (воркер импорта, команды),
+    обнаруживаются сверкой с версией журнала изменений не чаще раза в ttl секунд.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, compute):
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and now - entry.checked_at < self.ttl:
+            cache_lookup('catalog_lists', 'hit')
+            return entry.value
+        version = current_version()
+        if entry is not None and entry.version == version:
+            cache_lookup('catalog_lists', 'hit')
+            entry.checked_at = now
+            return entry.value
+        cache_lookup('catalog_lists', 'miss')
+        value = compute()
+        with self._lock:
+            self._entries[key] = _Entry(value, version, now)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+list_cache = ListCache(settings.CATALOG_LIST_CACHE_TTL)
+
+
+def genres_with_counts():
+    return Genre.objects.annotate(movie_count=Count('movies')).order_by('name')
+
+
+def countries_with_counts():
+    return Country.objects.annotate(movie_count=Count('movies')).order_by('name')
+
+
+@receiver(m2m_changed, sender=Movie.genres.through)
+@receiver(m2m_changed, sender=Movie.countries.through)
+def _on_links_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        list_cache.clear()
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Country)
+@receiver(post_delete, sender=Movie)
+def _on_catalog_changed(sender, raw=False, **kwargs):
+    # Удаление фильма удаляет его связи без m2m_changed
+    if not raw:
+        list_cache.clear()
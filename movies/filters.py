@@ -0,0 +1,115 @@
+"""
+Фильтры списка фильмов. Связи (жанры, страны, актёры) проверяются через
+EXISTS-подзапросы (полусоединения), а не JOIN: строки фильмов не размножаются,
+поэтому DISTINCT не нужен и пагинация идёт по индексу сортировки.
+Год фильтруется диапазоном дат, а не извлечением года, чтобы работал индекс.
+ID и год — целые числа: дробные и не помещающиеся в столбец значения дают 400.
+"""
+from datetime import date
+
+import django_filters
+from django import forms
+from django.db.models import Exists, OuterRef
+from django_filters.widgets import CSVWidget
+
+from .models import Movie, MovieCast
+
+# Наибольший ID (BigAutoField)
+MAX_ID = 2 ** 63 - 1
+
+
+class MultiValueCSVWidget(CSVWidget):
+    """Список значений через запятую и/или повтором параметра: ?genre=1,2 или ?genre=1&genre=2"""
+
+    def value_from_datadict(self, data, files, name):
+        values = data.getlist(name) if hasattr(data, 'getlist') else [data.get(name)]
+        values = [item for value in values if value for item in value.split(',') if item]
+        return values or None
+
+
+class IntegerFilter(django_filters.NumberFilter):
+    field_class = forms.IntegerField
+
+    def get_max_validator(self):
+        # Границы задаются min_value/max_value поля
+        return None
+
+
+class IdListFilter(django_filters.BaseInFilter, IntegerFilter):
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', MultiValueCSVWidget)
+        kwargs.setdefault('min_value', 1)
+        kwargs.setdefault('max_value', MAX_ID)
+        super().__init__(*args, **kwargs)
+
+
+class CharListFilter(django_filters.BaseInFilter, django_filters.CharFilter):
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', MultiValueCSVWidget)
+        super().__init__(*args, **kwargs)
+
+
+def _links_exist(through, column: str, values):
+    """EXISTS (связь фильма с любым из values)"""
+    return Exists(through.objects.filter(movie_id=OuterRef('pk'), **{f'{column}__in': values}))
+
+
+class MovieFilter(django_filters.FilterSet):
+    """Фильтры /api/movies/ (и /api/movies/facets/)"""
+    genre = IdListFilter(method='filter_any', help_text="ID жанров через запятую: любой из них")
+    genre_all = IdListFilter(method='filter_all', help_text="ID жанров через запятую: все сразу")
+    # Прежнее имя параметра (?genres=1&genres=2)
+    genres = IdListFilter(method='filter_any', help_text="То же, что genre")
+    country = IdListFilter(method='filter_any', help_text="ID стран через запятую: любая из них")
+    country_all = IdListFilter(method='filter_all', help_text="ID стран через запятую: все сразу")
+    actor = IntegerFilter(method='filter_actor', min_value=1, max_value=MAX_ID, help_text="ID актёра")
+    type = CharListFilter(field_name='type', help_text="Тип через запятую: FILM, TV_SERIES, ...")
+    year = IntegerFilter(method='filter_year', help_text="Год выхода")
+    year_min = IntegerFilter(method='filter_year', help_text="Год выхода не раньше")
+    year_max = IntegerFilter(method='filter_year', help_text="Год выхода не позже")
+    min_rating = django_filters.NumberFilter(field_name='rating', lookup_expr='gte', help_text="Минимальный рейтинг")
+    age_rating_min = django_filters.NumberFilter(field_name='age_rating', lookup_expr='gte', help_text="Возрастной рейтинг от")
+    age_rating_max = django_filters.NumberFilter(field_name='age_rating', lookup_expr='lte', help_text="Возрастной рейтинг до")
+    film_length_min = django_filters.NumberFilter(field_name='film_length', lookup_expr='gte', help_text="Длительность от, мин")
+    film_length_max = django_filters.NumberFilter(field_name='film_length', lookup_expr='lte', help_text="Длительность до, мин")
+
+    # Параметр → (таблица связей, столбец)
+    LINKS = {
+        'genre': (Movie.genres.through, 'genre_id'),
+        'genre_all': (Movie.genres.through, 'genre_id'),
+        'genres': (Movie.genres.through, 'genre_id'),
+        'country': (Movie.countries.through, 'country_id'),
+        'country_all': (Movie.countries.through, 'country_id'),
+    }
+
+    class Meta:
+        model = Movie
+        fields = []
+
+    def filter_any(self, queryset, name, value):
+        if not value:
+            return queryset
+        through, column = self.LINKS[name]
+        return queryset.filter(_links_exist(through, column, list(value)))
+
+    def filter_all(self, queryset, name, value):
+        through, column = self.LINKS[name]
+        for item in dict.fromkeys(value or ()):
+            queryset = queryset.filter(_links_exist(through, column, [item]))
+        return queryset
+
+    def filter_actor(self, queryset, name, value):
+        if value is None:
+            return queryset
+        return queryset.filter(Exists(MovieCast.objects.filter(movie_id=OuterRef('pk'), actor_id=value)))
+
+    def filter_year(self, queryset, name, value):
+        if value is None:
+            return queryset
+        if not date.min.year <= value <= date.max.year:
+            return queryset.none()
+        if name in ('year', 'year_min'):
+            queryset = queryset.filter(release_date__gte=date(value, 1, 1))
+        if name in ('year', 'year_max'):
+            queryset = queryset.filter(release_date__lte=date(value, 12, 31))
+        return queryset
@@ -0,0 +1,88 @@
+"""
+Долгоживущий event loop и пул HTTP-соединений на процесс.
+Все асинхронные запросы к внешним API выполняются в одном фоновом потоке,
+поэтому httpx.AsyncClient (и его keep-alive соединения) переживает отдельные
+импорты, а синхронный код не создаёт новый event loop на каждый вызов.
+"""
+import asyncio
+import atexit
+import concurrent.futures
+import threading
+from importlib.util import find_spec
+
+import httpx
+from django.conf import settings
+
+HTTP2_AVAILABLE = find_spec('h2') is not None
+
+
+class BackgroundLoop:
+    """Event loop в потоке-демоне; корутины запускаются из синхронного кода через run()"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+            return self._loop
+
+    @property
+    def started(self) -> bool:
+        return self._loop is not None and self._thread.is_alive()
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """Запускает корутину в фоновом loop, не дожидаясь результата"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("BackgroundLoop нельзя вызывать из самого фонового loop")
+        loop = self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def run(self, coro):
+        """Выполняет корутину в фоновом loop и ждёт результат"""
+        return self.submit(coro).result()
+
+
+loop = BackgroundLoop('kinopoisk-http')
+
+
+def make_client(transport: httpx.AsyncBaseTransport = None) -> httpx.AsyncClient:
+    """Создаёт клиент с пулом keep-alive соединений (HTTP/2, если установлен h2)"""
+    return httpx.AsyncClient(
+        transport=transport,
+        http2=HTTP2_AVAILABLE and settings.KINOPOISK_HTTP2,
+        limits=httpx.Limits(
+            max_connections=settings.KINOPOISK_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.KINOPOISK_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.KINOPOISK_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+_shared_client = None
+
+
+def get_shared_client() -> httpx.AsyncClient:
+    """Общий на процесс клиент; используется только внутри фонового loop"""
+    global _shared_client
+    if _shared_client is None or _shared_client.is_closed:
+        _shared_client = make_client()
+    return _shared_client
+
+
+def close_client(client: httpx.AsyncClient) -> None:
+    """Закрывает клиент в том loop, где открыты его соединения"""
+    if loop.started:
+        loop.run(client.aclose())
+
+
+@atexit.register
+def _close_shared_client():
+    if _shared_client is not None and not _shared_client.is_closed:
+        close_client(_shared_client)
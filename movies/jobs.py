@@ -0,0 +1,101 @@
+"""
+Очередь импорта с Кинопоиска на таблице ImportJob (без внешнего брокера).
+Админка ставит задачи в очередь, воркер (python manage.py run_import_worker)
+забирает их пачками и импортирует конкурентно через KinopoiskService.import_many.
+Задачи, не выполненные из-за временной недоступности API, возвращаются в очередь,
+пока не исчерпаны KINOPOISK_JOB_MAX_ATTEMPTS попыток.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .kinopoisk import KinopoiskService, KinopoiskImportError, KinopoiskUnavailableError
+from .models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+def enqueue_imports(items: list) -> list[ImportJob]:
+    """Ставит URL/ID в очередь импорта"""
+    jobs = [ImportJob(source=str(item)[:500]) for item in items]
+    return ImportJob.objects.bulk_create(jobs)
+
+
+def requeue_stale_jobs(timeout: float, max_attempts: int) -> int:
+    """
+    Возвращает в очередь задачи, зависшие в статусе «выполняется»
+    (например, воркер был остановлен), либо помечает их ошибкой,
+    если попытки исчерпаны.
+    """
+    stale = ImportJob.objects.filter(
+        status=ImportJob.STATUS_RUNNING,
+        started_at__lt=timezone.now() - timedelta(seconds=timeout),
+    )
+    failed = stale.filter(attempts__gte=max_attempts).update(
+        status=ImportJob.STATUS_FAILED,
+        error="Задача не завершилась за отведённое время",
+        finished_at=timezone.now(),
+    )
+    return failed + stale.update(status=ImportJob.STATUS_PENDING)
+
+
+def claim_jobs(limit: int) -> list[ImportJob]:
+    """
+    Забирает до limit задач из очереди (старые первыми) и помечает их выполняемыми.
+    На PostgreSQL строки блокируются с SKIP LOCKED, поэтому несколько воркеров
+    не получат одну и ту же задачу.
+    """
+    with transaction.atomic():
+        ids = list(
+            ImportJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ImportJob.STATUS_PENDING)
+            .order_by('created_at')
+            .values_list('pk', flat=True)[:limit]
+        )
+        ImportJob.objects.filter(pk__in=ids, status=ImportJob.STATUS_PENDING).update(
+            status=ImportJob.STATUS_RUNNING,
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+    return list(ImportJob.objects.filter(pk__in=ids, status=ImportJob.STATUS_RUNNING).order_by('created_at'))
+
+
+def run_jobs(jobs: list[ImportJob], service: KinopoiskService = None, concurrency: int = None,
+             max_attempts: int = None) -> int:
+    """
+    Выполняет задачи одним пакетным импортом и сохраняет результат каждой.
+    Временные ошибки (KinopoiskUnavailableError) возвращают задачу в очередь,
+    пока попыток меньше max_attempts; 404, ошибки разбора и исчерпанные
+    попытки помечают её ошибкой. Непредвиденная ошибка пакета (например, БД)
+    тоже считается временной. Возвращает число задач, вернувшихся в очередь.
+    """
+    max_attempts = max_attempts or settings.KINOPOISK_JOB_MAX_ATTEMPTS
+    try:
+        service = service or KinopoiskService()
+        results = service.import_many([job.source for job in jobs], concurrency=concurrency)
+    except KinopoiskImportError as e:
+        results = [None] * len(jobs)
+        error, transient = str(e), isinstance(e, KinopoiskUnavailableError)
+    except Exception as e:
+        logger.exception("Пакет импорта из %d задач завершился ошибкой", len(jobs))
+        results = [None] * len(jobs)
+        error, transient = f"{e.__class__.__name__}: {e}", True
+
+    now = timezone.now()
+    requeued = 0
+    for job, result in zip(jobs, results):
+        if result is not None and result.ok:
+            job.status, job.movie, job.error, job.finished_at = ImportJob.STATUS_DONE, result.movie, None, now
+            continue
+        if result is not None:
+            error, transient = result.error, result.transient
+        if transient and job.attempts < max_attempts:
+            job.status, job.error, job.finished_at = ImportJob.STATUS_PENDING, error, None
+            requeued += 1
+        else:
+            job.status, job.error, job.finished_at = ImportJob.STATUS_FAILED, error, now
+    ImportJob.objects.bulk_update(jobs, ['status', 'movie', 'error', 'finished_at'])
+    return requeued
@@ -4,13 +4,31 @@
 Теперь поддерживает асинхронные запросы для ускорения работы.
 """
 import re
+import time
 import asyncio
+import hashlib
+import logging
 import httpx
-from datetime import datetime
-from asgiref.sync import async_to_sync
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q, F
+from django.utils import timezone
 from .models import Genre, Actor, Movie, MovieCast, SiteSettings, Country
+from . import http_pool
+from .changes import batched_changes, record_changes
+from .counters import actors_changed, deferred_actor_counters
+from .metrics import KINOPOISK_LATENCY, KINOPOISK_REQUESTS, KINOPOISK_RETRIES, cache_lookup
+from .pipeline import ImportPipeline, PipelineStats
+from .ranking import refresh_genre_top, update_weighted_ratings
+from .similarity import mark_similar_stale
+from .throttling import TokenBucket, CircuitBreaker, backoff_delay, parse_retry_after
+
+logger = logging.getLogger(__name__)
 
 
 class KinopoiskImportError(Exception):
@@ -18,14 +36,105 @@ class KinopoiskImportError(Exception):
     pass
 
 
+class KinopoiskNotFoundError(KinopoiskImportError):
+    """Фильма с таким ID на Кинопоиске нет"""
+    pass
+
+
+class KinopoiskUnavailableError(KinopoiskImportError):
+    """
+    API временно недоступно: цепь разомкнута, повторы после 429/5xx/сетевых ошибок
+    исчерпаны или закончилась квота токена. Импорт стоит повторить позже.
+    """
+    pass
+
+
+@dataclass
+class ImportResult:
+    """Результат импорта одного элемента пакетного импорта"""
+    item: str
+    film_id: int | None = None
+    movie: Movie | None = None
+    error: str | None = None
+    not_found: bool = False
+    # Ошибка временная (KinopoiskUnavailableError): элемент стоит импортировать повторно
+    transient: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.movie is not None
+
+
+@dataclass
+class RefreshResult:
+    """Итог обновления рейтингов: изменённые фильмы, число неизменных и ошибки"""
+    updated: list = field(default_factory=list)
+    unchanged: int = 0
+    failed: list = field(default_factory=list)
+
+
+_rate_limiter = None
+_circuit_breaker = None
+
+
+def get_rate_limiter() -> TokenBucket:
+    """Общий на процесс лимитер запросов к API (квота — на токен, а не на импорт)"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = TokenBucket(settings.KINOPOISK_RATE_LIMIT)
+    return _rate_limiter
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """Общий на процесс circuit breaker для API"""
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        _circuit_breaker = CircuitBreaker(
+            settings.KINOPOISK_CIRCUIT_BREAKER_THRESHOLD,
+            settings.KINOPOISK_CIRCUIT_BREAKER_TIMEOUT,
+        )
+    return _circuit_breaker
+
+
 class KinopoiskService:
     """Сервис для работы с API Кинопоиска"""
     
     BASE_URL = "https://kinopoiskapiunofficial.tech/api/v2.2"
     
-    def __init__(self):
+    def __init__(
+        self,
+        api_token: str = None,
+        transport: httpx.AsyncBaseTransport = None,
+        base_url: str = None,
+        rate_limiter: TokenBucket = None,
+        circuit_breaker: CircuitBreaker = None,
+        cache=None,
+        use_cache: bool = True,
+        offline: bool = None,
+    ):
+        # transport позволяет подменить сеть (например, httpx.MockTransport в тестах)
+        self.transport = transport
+        self.base_url = base_url or self.BASE_URL
+        # Клиент текущей сессии; вне session() используется общий пул процесса
+        self._client = None
+        # Кэш ответов API: по умолчанию — дисковый кэш из settings.CACHES
+        if cache is None and use_cache and settings.KINOPOISK_CACHE_ALIAS:
+            cache = caches[settings.KINOPOISK_CACHE_ALIAS]
+        self.cache = cache if use_cache else None
+        self.cache_ttl = settings.KINOPOISK_CACHE_TTL
+        # В офлайн-режиме ответы берутся только из кэша, без обращения к API
+        self.offline = settings.KINOPOISK_CACHE_OFFLINE if offline is None else offline
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.circuit_breaker = circuit_breaker or get_circuit_breaker()
+        self.timeout = settings.KINOPOISK_TIMEOUT
+        self.max_retries = settings.KINOPOISK_MAX_RETRIES
+        self.backoff_base = settings.KINOPOISK_BACKOFF_BASE
+        self.backoff_max = settings.KINOPOISK_BACKOFF_MAX
+        # Время по стадиям последнего import_many
+        self.import_stats = PipelineStats()
+
         # Сначала пробуем получить токен из БД (настройки в админке)
-        self.api_token = SiteSettings.get_kinopoisk_token()
+        self.api_token = api_token or SiteSettings.get_kinopoisk_token()
         
         # Fallback на settings.py
         if not self.api_token:
@@ -56,102 +165,372 @@ class KinopoiskService:
             if match:
                 return int(match.group(1))
         raise KinopoiskImportError(f"Не удалось извлечь ID из URL: {url}")
-    
-    async def fetch_film_data(self, client: httpx.AsyncClient, film_id: int) -> dict:
-        """Асинхронно получает данные о фильме"""
-        url = f"{self.BASE_URL}/films/{film_id}"
-        response = await client.get(url, headers=self._get_headers(), timeout=15)
-        
+
+    @classmethod
+    def extract_id(cls, value) -> int:
+        """Извлекает ID фильма из URL Кинопоиска или строки с числовым ID"""
+        if isinstance(value, int):
+            return value
+        value = str(value).strip()
+        if value.isdigit():
+            return int(value)
+        return cls.extract_id_from_url(value)
+
+    @staticmethod
+    def parse_items(text: str) -> list[str]:
+        """
+        Разбивает текст (поле формы, файл) на список URL/ID.
+        Разделители — переводы строк, пробелы и запятые; строки с # пропускаются.
+        """
+        items = []
+        for line in text.splitlines():
+            line = line.split('#', 1)[0]
+            items.extend(part for part in re.split(r'[\s,;]+', line) if part)
+        return items
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Клиент для запросов: клиент сессии, собственный клиент при подменённом
+        транспорте или общий пул соединений процесса.
+        """
+        if self._client is None and self.transport is not None:
+            self._client = http_pool.make_client(self.transport)
+        return self._client or http_pool.get_shared_client()
+
+    @contextmanager
+    def session(self):
+        """
+        Отдельный пул соединений на время пакетной задачи.
+        Соединения переиспользуются всеми импортами внутри блока и закрываются на выходе.
+        """
+        previous, self._client = self._client, http_pool.make_client(self.transport)
+        try:
+            yield self
+        finally:
+            client, self._client = self._client, previous
+            http_pool.close_client(client)
+
+    async def _request(
+        self, client: httpx.AsyncClient, url: str, params: dict = None, headers: dict = None
+    ) -> httpx.Response:
+        """
+        GET запрос с учётом квоты и повторами.
+        429, 5xx и сетевые ошибки повторяются с экспоненциальной задержкой
+        (или по Retry-After); остальные ответы возвращаются вызывающему.
+        """
+        error = reason = None
+        delay = 0.0
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                KINOPOISK_RETRIES.labels(reason).inc()
+                await asyncio.sleep(delay)
+
+            if not self.circuit_breaker.allow():
+                raise KinopoiskUnavailableError("API Кинопоиска временно недоступен, попробуйте позже.")
+
+            recorded = False
+            try:
+                await self.rate_limiter.acquire()
+                started = time.perf_counter()
+                try:
+                    response = await client.get(
+                        url, headers={**self._get_headers(), **(headers or {})}, params=params, timeout=self.timeout
+                    )
+                except httpx.TransportError as e:
+                    KINOPOISK_REQUESTS.labels('error').inc()
+                    reason = 'transport'
+                    self.circuit_breaker.record_failure()
+                    recorded = True
+                    error = f"{e.__class__.__name__}: {e}" if str(e) else e.__class__.__name__
+                    delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                    continue
+                KINOPOISK_LATENCY.observe(time.perf_counter() - started)
+                KINOPOISK_REQUESTS.labels(str(response.status_code)).inc()
+
+                if response.status_code == 429 or response.status_code >= 500:
+                    error = f"HTTP {response.status_code}"
+                    reason = '429' if response.status_code == 429 else '5xx'
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    delay = retry_after if retry_after is not None else backoff_delay(
+                        attempt, self.backoff_base, self.backoff_max
+                    )
+                    if response.status_code == 429:
+                        # Квота общая — притормаживаем все запросы, а не только этот
+                        self.rate_limiter.pause(delay)
+                    else:
+                        self.circuit_breaker.record_failure()
+                        recorded = True
+                    continue
+
+                self.circuit_breaker.record_success()
+                recorded = True
+                return response
+            finally:
+                if not recorded:
+                    # Отмена (в том числе из fetch_all), 429 или неожиданная ошибка:
+                    # пробный запрос не должен навсегда оставить цепь полуоткрытой
+                    self.circuit_breaker.release()
+
+        raise KinopoiskUnavailableError(f"API недоступен после {self.max_retries + 1} попыток: {error}")
+
+    @staticmethod
+    def _cache_key(url: str, params: dict = None) -> str:
+        query = urlencode(sorted((params or {}).items()))
+        return 'kinopoisk:' + hashlib.sha1(f'{url}?{query}'.encode()).hexdigest()
+
+    async def _cached_request(
+        self, client: httpx.AsyncClient, endpoint: str, url: str, params: dict = None, refresh: bool = False
+    ) -> httpx.Response:
+        """
+        Запрос через кэш ответов.
+        Запись моложе TTL эндпоинта отдаётся без обращения к API, устаревшая
+        (или любая при refresh=True) перепроверяется по ETag, если API его прислал.
+        В офлайн-режиме отдаётся любая сохранённая запись.
+        Чтение и запись кэша (файлы на диске) идут в потоке, не блокируя event loop.
+        """
+        if self.cache is None:
+            return await self._request(client, url, params=params)
+
+        key = self._cache_key(url, params)
+        entry = await asyncio.to_thread(self.cache.get, key)
+        fresh = not refresh and entry is not None and time.time() - entry['fetched_at'] < self.cache_ttl[endpoint]
+        if entry is not None and (self.offline or fresh):
+            cache_lookup('kinopoisk', 'hit')
+            return httpx.Response(200, json=entry['data'])
+        if self.offline:
+            raise KinopoiskImportError(f"Ответ {url} не сохранён в кэше (офлайн-режим)")
+
+        headers = {'If-None-Match': entry['etag']} if entry and entry.get('etag') else None
+        response = await self._request(client, url, params=params, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            cache_lookup('kinopoisk', 'revalidated')
+            entry['fetched_at'] = time.time()
+        elif response.status_code == 200:
+            cache_lookup('kinopoisk', 'miss')
+            entry = {
+                'data': response.json(),
+                'etag': response.headers.get('ETag'),
+                'fetched_at': time.time(),
+            }
+        else:
+            return response
+
+        await asyncio.to_thread(self.cache.set, key, entry, settings.KINOPOISK_CACHE_RETENTION)
+        return httpx.Response(200, json=entry['data'])
+
+    @staticmethod
+    def _check_response(response: httpx.Response) -> None:
+        """Проверяет код ответа API"""
         if response.status_code == 401:
             raise KinopoiskImportError("Неверный API токен.")
-        elif response.status_code == 404:
-            raise KinopoiskImportError(f"Фильм с ID {film_id} не найден.")
+        elif response.status_code == 402:
+            raise KinopoiskUnavailableError("Исчерпан лимит запросов для API токена.")
         elif response.status_code != 200:
             raise KinopoiskImportError(f"API вернул ошибку: {response.status_code}")
+
+    async def fetch_film_data(self, client: httpx.AsyncClient, film_id: int, refresh: bool = False) -> dict:
+        """Асинхронно получает данные о фильме (refresh=True — в обход свежести кэша)"""
+        url = f"{self.base_url}/films/{film_id}"
+        response = await self._cached_request(client, 'film', url, refresh=refresh)
+        
+        if response.status_code == 404:
+            raise KinopoiskNotFoundError(f"Фильм с ID {film_id} не найден.")
+        self._check_response(response)
             
         return response.json()
     
     async def fetch_film_staff(self, client: httpx.AsyncClient, film_id: int) -> list:
         """Асинхронно получает актёрский состав"""
-        url = f"{self.BASE_URL.replace('v2.2', 'v1')}/staff"
+        url = f"{self.base_url.replace('v2.2', 'v1')}/staff"
         params = {"filmId": film_id}
-        try:
-            response = await client.get(url, headers=self._get_headers(), params=params, timeout=15)
-            if response.status_code == 200:
-                return response.json()
-        except Exception:
-            pass
-        return []
+        response = await self._cached_request(client, 'staff', url, params=params)
+        if response.status_code == 404:
+            return []
+        self._check_response(response)
+        return response.json()
 
     async def fetch_film_videos(self, client: httpx.AsyncClient, film_id: int) -> dict:
-        """Асинхронно получает видео (трейлеры/тизеры)"""
-        url = f"{self.BASE_URL}/films/{film_id}/videos"
+        """
+        Асинхронно получает видео (трейлеры/тизеры).
+        Трейлер не обязателен: если API так и не ответил, фильм импортируется без него.
+        """
+        url = f"{self.base_url}/films/{film_id}/videos"
         try:
-            response = await client.get(url, headers=self._get_headers(), timeout=15)
-            if response.status_code == 200:
-                return response.json()
-        except Exception:
-            pass
-        return {}
+            response = await self._cached_request(client, 'videos', url)
+            if response.status_code == 404:
+                return {}
+            self._check_response(response)
+        except KinopoiskImportError as e:
+            logger.warning("Не удалось получить видео для фильма %s: %s", film_id, e)
+            return {}
+        return response.json()
+
+    async def fetch_collection_page(self, client: httpx.AsyncClient, collection: str, page: int) -> dict:
+        """Страница подборки Кинопоиска (TOP_250_MOVIES, TOP_POPULAR_ALL и т.д.)"""
+        url = f"{self.base_url}/films/collections"
+        response = await self._cached_request(client, 'list', url, params={'type': collection, 'page': page})
+        self._check_response(response)
+        return response.json()
+
+    async def fetch_search_page(self, client: httpx.AsyncClient, filters: dict, page: int) -> dict:
+        """Страница поиска по фильтрам (/films?genres=&countries=&yearFrom=...)"""
+        url = f"{self.base_url}/films"
+        response = await self._cached_request(client, 'list', url, params={**filters, 'page': page})
+        self._check_response(response)
+        return response.json()
+
+    def fetch_list_page(self, source: str, params: dict, page: int) -> dict:
+        """Синхронная обёртка: страница подборки (source='collection') или поиска ('filter')"""
+        if source == 'collection':
+            coro = self.fetch_collection_page(self._get_client(), params['type'], page)
+        else:
+            coro = self.fetch_search_page(self._get_client(), params, page)
+        return http_pool.loop.run(coro)
+
+    async def fetch_all(self, client: httpx.AsyncClient, film_id: int) -> tuple:
+        """
+        Параллельно получает фильм, актёрский состав и видео.
+        При ошибке одного запроса остальные отменяются, а не продолжают повторы в фоне.
+        Пока цепь не замкнута, сначала загружается фильм: он и будет пробным запросом,
+        а состав и видео, отклонённые параллельно, не отменят его.
+        """
+        if self.circuit_breaker.state != CircuitBreaker.CLOSED:
+            film_data = await self.fetch_film_data(client, film_id)
+            staff_data, videos_data = await asyncio.gather(
+                self.fetch_film_staff(client, film_id), self.fetch_film_videos(client, film_id)
+            )
+            return film_data, staff_data, videos_data
+        tasks = [
+            asyncio.ensure_future(self.fetch_film_data(client, film_id)),
+            asyncio.ensure_future(self.fetch_film_staff(client, film_id)),
+            asyncio.ensure_future(self.fetch_film_videos(client, film_id)),
+        ]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    @staticmethod
+    def _get_or_create_by_name(model, names: list[str]) -> list:
+        """
+        Получает объекты справочника (жанры, страны) по именам одним запросом,
+        недостающие создаёт одним bulk_create. Порядок имён сохраняется.
+        """
+        names = list(dict.fromkeys(name for name in names if name))
+        if not names:
+            return []
+
+        objects = {obj.name: obj for obj in model.objects.filter(name__in=names)}
+        missing = [model(name=name) for name in names if name not in objects]
+        if missing:
+            model.objects.bulk_create(missing)
+            if any(obj.pk is None for obj in missing):
+                # Бэкенд не возвращает PK из bulk_create — перечитываем
+                missing = model.objects.filter(name__in=[obj.name for obj in missing])
+            objects.update((obj.name, obj) for obj in missing)
+            record_changes(model, [obj.pk for obj in missing])
+        return [objects[name] for name in names]
 
     def _get_or_create_genres(self, genres_data: list) -> list:
         """Создаёт или получает жанры"""
-        genres = []
-        for genre_info in genres_data:
-            genre_name = genre_info.get('genre', '').strip()
-            if genre_name:
-                genre, _ = Genre.objects.get_or_create(name=genre_name.capitalize())
-                genres.append(genre)
-        return genres
+        return self._get_or_create_by_name(
+            Genre, [info.get('genre', '').strip().capitalize() for info in genres_data]
+        )
 
     def _get_or_create_countries(self, countries_data: list) -> list:
         """Создаёт или получает страны"""
-        countries = []
-        for country_info in countries_data:
-            name = country_info.get('country', '').strip()
-            if name:
-                country, _ = Country.objects.get_or_create(name=name)
-                countries.append(country)
-        return countries
+        return self._get_or_create_by_name(
+            Country, [info.get('country', '').strip() for info in countries_data]
+        )
     
-    def _get_or_create_actor(self, actor_data: dict) -> Actor | None:
-        """Создаёт или получает актёра"""
-        kinopoisk_id = actor_data.get('staffId')  # Используем ID если есть
-        name = actor_data.get('nameRu') or actor_data.get('nameEn')
-        
-        if not name and not kinopoisk_id:
-            return None
+    def _get_or_create_actors(self, actors_data: list) -> list[Actor | None]:
+        """
+        Создаёт или получает актёров пачкой: один запрос на поиск по staffId и
+        именам, один bulk_create для новых и один bulk_update для изменённых.
+        Возвращает список той же длины, что actors_data (None — пропущенные записи).
+        """
+        entries = []
+        for actor_data in actors_data:
+            name = (actor_data.get('nameRu') or actor_data.get('nameEn') or '').strip()
+            entries.append((actor_data.get('staffId'), name, actor_data.get('posterUrl')))
 
-        # Пытаемся найти по ID
-        actor = None
-        if kinopoisk_id:
-            actor = Actor.objects.filter(kinopoisk_id=kinopoisk_id).first()
-        
-        # Если не нашли по ID, ищем по имени
-        if not actor and name:
-            actor = Actor.objects.filter(name__iexact=name.strip()).first()
-            # Если нашли по имени, проставим ID
-            if actor and kinopoisk_id and not actor.kinopoisk_id:
-                actor.kinopoisk_id = kinopoisk_id
-                actor.save()
-
-        # Если так и не нашли - создаём
-        if not actor:
-            poster_url = actor_data.get('posterUrl')
-            actor = Actor.objects.create(
-                name=name.strip() if name else "Неизвестный актёр",
-                kinopoisk_id=kinopoisk_id,
-                profile_path=poster_url
-            )
-        else:
-            # Обновляем фото если нет
-            if not actor.profile_path and not actor.profile_image:
-                poster_url = actor_data.get('posterUrl')
-                if poster_url:
-                    actor.profile_path = poster_url
-                    actor.save()
-                    
-        return actor
+        kinopoisk_ids = {kinopoisk_id for kinopoisk_id, _, _ in entries if kinopoisk_id}
+        names = {name for _, name, _ in entries if name}
+        if not kinopoisk_ids and not names:
+            return [None] * len(entries)
+
+        query = Q(kinopoisk_id__in=kinopoisk_ids)
+        for name in names:
+            query |= Q(name__iexact=name)
+
+        by_id, by_name = {}, {}
+        for actor in Actor.objects.filter(query).order_by('pk'):
+            if actor.kinopoisk_id:
+                by_id[actor.kinopoisk_id] = actor
+            by_name.setdefault(actor.name.lower(), actor)
+
+        actors, to_create, to_update = [], [], {}
+        for kinopoisk_id, name, poster_url in entries:
+            if not name and not kinopoisk_id:
+                actors.append(None)
+                continue
+
+            # Сначала ищем по ID, затем по имени
+            actor = by_id.get(kinopoisk_id) if kinopoisk_id else None
+            if not actor and name:
+                actor = by_name.get(name.lower())
+                # Если нашли по имени, проставим ID
+                if actor and kinopoisk_id and not actor.kinopoisk_id:
+                    actor.kinopoisk_id = kinopoisk_id
+                    by_id[kinopoisk_id] = actor
+                    if actor.pk:
+                        to_update[actor.pk] = actor
+
+            if not actor:
+                actor = Actor(
+                    name=name or "Неизвестный актёр",
+                    kinopoisk_id=kinopoisk_id,
+                    profile_path=poster_url,
+                )
+                to_create.append(actor)
+                if kinopoisk_id:
+                    by_id[kinopoisk_id] = actor
+                by_name.setdefault(actor.name.lower(), actor)
+            elif not actor.profile_path and not actor.profile_image and poster_url:
+                # Обновляем фото если нет
+                actor.profile_path = poster_url
+                if actor.pk:
+                    to_update[actor.pk] = actor
+            actors.append(actor)
+
+        if to_update:
+            Actor.objects.bulk_update(to_update.values(), ['kinopoisk_id', 'profile_path'])
+            record_changes(Actor, to_update)
+
+        if to_create:
+            # ignore_conflicts: актёра с тем же staffId мог создать параллельный импорт
+            Actor.objects.bulk_create(to_create, ignore_conflicts=True)
+            created = Actor.objects.filter(
+                Q(kinopoisk_id__in=[a.kinopoisk_id for a in to_create if a.kinopoisk_id])
+                | Q(kinopoisk_id__isnull=True, name__in=[a.name for a in to_create if not a.kinopoisk_id])
+            ).order_by('pk')
+            created_by_id, created_by_name = {}, {}
+            created = list(created)
+            record_changes(Actor, [actor.pk for actor in created])
+            for actor in created:
+                if actor.kinopoisk_id:
+                    created_by_id[actor.kinopoisk_id] = actor
+                else:
+                    created_by_name[actor.name] = actor
+            actors = [
+                (created_by_id.get(a.kinopoisk_id) if a.kinopoisk_id else created_by_name.get(a.name))
+                if a is not None and a.pk is None else a
+                for a in actors
+            ]
+
+        return actors
 
     def _parse_age_limit(self, age_str: str | None) -> int | None:
         if not age_str:
@@ -161,6 +540,13 @@ class KinopoiskService:
             return int(match.group())
         return None
 
+    @staticmethod
+    def _parse_rating(film_data: dict) -> tuple[float, int]:
+        """Рейтинг и число голосов: Кинопоиск, а если его нет — IMDb"""
+        rating = float(film_data.get('ratingKinopoisk') or film_data.get('ratingImdb') or 0.0)
+        vote_count = int(film_data.get('ratingKinopoiskVoteCount') or film_data.get('ratingImdbVoteCount') or 0)
+        return rating, vote_count
+
     def parse_date(self, film_data: dict) -> datetime.date:
         year = film_data.get('year')
         try:
@@ -174,36 +560,15 @@ class KinopoiskService:
             return datetime(int(year), 1, 1).date()
         return datetime.now().date()
 
-    async def _import_from_url_async(self, url: str) -> Movie:
-        """Асинхронная реализация импорта"""
-        film_id = self.extract_id_from_url(url)
-        
-        async with httpx.AsyncClient() as client:
-            # Параллельный запуск запросов
-            film_task = self.fetch_film_data(client, film_id)
-            staff_task = self.fetch_film_staff(client, film_id)
-            
-            film_data, staff_data = await asyncio.gather(film_task, staff_task)
-
-        # Обработка данных (синхронная часть, работа с БД)
-        return await async_to_sync(self._save_movie_data)(film_id, film_data, staff_data)
-
-    async def _save_movie_data(self, film_id: int, film_data: dict, staff_data: list) -> Movie:
-        """Сохранение данных в БД (вызывается из асинхронной функции)"""
-        # Эта функция должна быть обычной синхронной, но async_to_sync ждет awaitable?
-        # Нет, async_to_sync превращает async в sync.
-        # Внутри async функции нельзя вызывать Django ORM без sync_to_async_adapter, или просто вынести в sync функцию.
-        # Лучше я сделаю этот метод синхронным и буду вызывать его, но Python async function can't just call sync code directly without blocking loop?
-        # В данном случае, мы запускаем loop через async_to_sync в public методе.
-        # Значит, внутри _import_from_url_async (которая бежит в loop) я не могу делать блокирующие вызовы ORM напрямую безопасно.
-        # Поэтому лучше всю логику сохранения вынести в отдельный синхронный метод и вызвать его через sync_to_async? 
-        # Или, раз уж мы используем async_to_sync на верхнем уровне, то loop блокируется? 
-        # Нет, async_to_sync запускает loop.
-        # Проще всего: получить данные асинхронно, а сохранять синхронно ПОСЛЕ завершения async блока.
-        return self._process_and_save(film_id, film_data, staff_data)
-
+    @transaction.atomic
+    @batched_changes()
+    @deferred_actor_counters()
     def _process_and_save(self, film_id: int, film_data: dict, staff_data: list, videos_data: dict = None) -> Movie:
-        """Синхронная обработка и сохранение"""
+        """
+        Синхронная обработка и сохранение.
+        Весь фильм сохраняется в одной транзакции фиксированным числом запросов,
+        не зависящим от размера актёрского состава.
+        """
         
         title = film_data.get('nameRu') or film_data.get('nameOriginal') or film_data.get('nameEn')
         if not title:
@@ -211,11 +576,13 @@ class KinopoiskService:
 
         release_date = self.parse_date(film_data)
         
+        rating, vote_count = self._parse_rating(film_data)
+
         # Подготовка полей
         defaults = {
             'overview': film_data.get('description') or film_data.get('shortDescription') or '',
-            'rating': float(film_data.get('ratingKinopoisk') or film_data.get('ratingImdb') or 0.0),
-            'vote_count': int(film_data.get('ratingKinopoiskVoteCount') or film_data.get('ratingImdbVoteCount') or 0),
+            'rating': rating,
+            'vote_count': vote_count,
             'poster_path': film_data.get('posterUrl'),
             'backdrop_path': film_data.get('coverUrl'),
             'imdb_id': film_data.get('imdbId'),
@@ -224,6 +591,7 @@ class KinopoiskService:
             'film_length': film_data.get('filmLength'),
             'age_rating': self._parse_age_limit(film_data.get('ratingAgeLimits')),
             'type': film_data.get('type'),
+            'refreshed_at': timezone.now(),
         }
 
         # Извлекаем трейлер
@@ -237,22 +605,28 @@ class KinopoiskService:
             if 'trailer_url' not in defaults and videos_data['items']:
                 defaults['trailer_url'] = videos_data['items'][0].get('url')
 
-        # Логика поиска дубликатов:
+        # Логика поиска дубликатов (одним запросом):
         # 1. По kinopoisk_id
-        movie = Movie.objects.filter(kinopoisk_id=film_id).first()
-        
         # 2. По названию и году (если нет kinopoisk_id)
+        candidates = list(Movie.objects.filter(
+            Q(kinopoisk_id=film_id) | Q(title__iexact=title, release_date__year=release_date.year)
+        ))
+        movie = next((m for m in candidates if m.kinopoisk_id == film_id), None)
         if not movie:
-            movie = Movie.objects.filter(title__iexact=title, release_date__year=release_date.year).first()
-            if movie:
-                # Нашли дубль -> привязываем ID
-                movie.kinopoisk_id = film_id
+            movie = next((m for m in candidates if m.kinopoisk_id is None), None)
+        changed_fields = []
+        if movie and movie.kinopoisk_id != film_id:
+            # Нашли дубль -> привязываем ID
+            movie.kinopoisk_id = film_id
+            changed_fields.append('kinopoisk_id')
         
         if movie:
-            # Обновляем
+            # Обновляем только изменившиеся поля
             for key, value in defaults.items():
-                setattr(movie, key, value)
-            movie.save()
+                if getattr(movie, key) != value:
+                    setattr(movie, key, value)
+                    changed_fields.append(key)
+            movie.save(update_fields=changed_fields)
         else:
             # Создаём
             defaults['kinopoisk_id'] = film_id
@@ -270,12 +644,9 @@ class KinopoiskService:
         # Актёры
         actors_data = [s for s in staff_data if s.get('professionKey') == 'ACTOR'][:20]
         
-        # Обновляем каст полностью
-        MovieCast.objects.filter(movie=movie).delete()
-        
         movie_casts = []
-        for order, actor_data in enumerate(actors_data):
-            actor = self._get_or_create_actor(actor_data)
+        actors = self._get_or_create_actors(actors_data)
+        for order, (actor_data, actor) in enumerate(zip(actors_data, actors)):
             if actor:
                 character = actor_data.get('description') or 'Неизвестная роль'
                 movie_casts.append(MovieCast(
@@ -285,32 +656,226 @@ class KinopoiskService:
                     order=order
                 ))
         
-        if movie_casts:
-            MovieCast.objects.bulk_create(movie_casts)
+        self._sync_cast(movie, movie_casts)
+        if 'vote_count' in changed_fields:
+            # Голоса фильма входят в популярность всех его актёров
+            actors_changed([item.actor_id for item in movie_casts])
 
         return movie
 
+    @staticmethod
+    def _sync_cast(movie: Movie, cast: list[MovieCast]) -> None:
+        """
+        Приводит актёрский состав фильма к cast минимальным числом изменений.
+        Строки сопоставляются по актёру: у совпавших обновляются роль и порядок,
+        лишние удаляются, недостающие создаются. Неизменный состав не пишется вовсе.
+        """
+        existing = {}
+        for row in MovieCast.objects.filter(movie=movie).order_by('order', 'pk'):
+            existing.setdefault(row.actor_id, []).append(row)
+
+        to_create, to_update = [], []
+        for item in cast:
+            rows = existing.get(item.actor_id)
+            if not rows:
+                to_create.append(item)
+                continue
+            row = rows.pop(0)
+            if (row.character, row.order) != (item.character, item.order):
+                row.character, row.order = item.character, item.order
+                to_update.append(row)
+
+        to_delete = [row.pk for rows in existing.values() for row in rows]
+        if to_delete:
+            MovieCast.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            MovieCast.objects.bulk_update(to_update, ['character', 'order'])
+        if to_create:
+            MovieCast.objects.bulk_create(to_create)
+        if to_delete or to_update or to_create:
+            record_changes(Movie, [movie.pk])
+        if to_delete or to_create:
+            # Удалённые роли учтены сигналом post_delete
+            actors_changed([item.actor_id for item in to_create])
+
     def import_from_url(self, url: str) -> Movie:
         """
         Публичный метод импорта (синхронная обертка).
-        Запускает event loop для выполнения асинхронных запросов.
+        Запросы выполняются в фоновом event loop процесса через общий пул соединений.
         """
         film_id = self.extract_id_from_url(url)
         
         # 1. Получаем данные асинхронно
-        async def fetch_all():
-            async with httpx.AsyncClient() as client:
-                film_task = self.fetch_film_data(client, film_id)
-                staff_task = self.fetch_film_staff(client, film_id)
-                videos_task = self.fetch_film_videos(client, film_id)
-                return await asyncio.gather(film_task, staff_task, videos_task)
-
         try:
-           film_data, staff_data, videos_data = async_to_sync(fetch_all)()
+            film_data, staff_data, videos_data = http_pool.loop.run(self.fetch_all(self._get_client(), film_id))
         except Exception as e:
-            # Если async_to_sync не сработает (например внутри другого loop),
-            # можно попробовать asyncio.run, но async_to_sync надежнее для Django.
-             raise KinopoiskImportError(f"Ошибка получения данных: {e}")
+            raise KinopoiskImportError(f"Ошибка получения данных: {e}")
 
         # 2. Сохраняем синхронно (чтобы не блокировать подключение к БД в async контексте без нужды)
-        return self._process_and_save(film_id, film_data, staff_data, videos_data)
+        movie = self._process_and_save(film_id, film_data, staff_data, videos_data)
+        self._update_derived([movie.pk])
+        return movie
+
+    async def _fetch_many(self, film_ids: list[int], concurrency: int, fetch=None) -> list:
+        """
+        Загружает данные для множества фильмов через один общий клиент.
+        fetch(client, film_id) — что загружать (по умолчанию fetch_all).
+        Одновременно выполняется не более concurrency загрузок;
+        ошибки возвращаются вместо результата, а не прерывают пакет.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        client = self._get_client()
+        fetch = fetch or self.fetch_all
+
+        async def fetch_one(film_id):
+            async with semaphore:
+                return await fetch(client, film_id)
+
+        return await asyncio.gather(
+            *(fetch_one(film_id) for film_id in film_ids),
+            return_exceptions=True,
+        )
+
+    def _save_batch(self, batch: list) -> None:
+        """
+        Сохраняет пачку загруженных фильмов в одной транзакции.
+        Каждый фильм сохраняется в своей точке сохранения, чтобы ошибка
+        одного не откатывала остальные.
+        """
+        with transaction.atomic(), batched_changes(), deferred_actor_counters():
+            for film_id, data, results in batch:
+                try:
+                    with transaction.atomic():
+                        movie = self._process_and_save(film_id, *data)
+                except Exception as e:
+                    for result in results:
+                        result.error = str(e)
+                else:
+                    for result in results:
+                        result.movie = movie
+
+    def import_many(self, items: list, concurrency: int = None, batch_size: int = None) -> list[ImportResult]:
+        """
+        Пакетный импорт: принимает список URL и/или ID Кинопоиска.
+        Загрузка и сохранение идут конвейером (см. pipeline.ImportPipeline):
+        пока одна пачка из batch_size фильмов пишется в БД, следующие уже загружаются.
+        Возвращает ImportResult для каждого элемента; время по стадиям — в self.import_stats.
+        """
+        concurrency = concurrency or settings.KINOPOISK_IMPORT_CONCURRENCY
+        batch_size = batch_size or settings.KINOPOISK_IMPORT_BATCH_SIZE
+
+        results = []
+        by_film_id = {}
+        for item in items:
+            result = ImportResult(item=str(item))
+            results.append(result)
+            try:
+                result.film_id = self.extract_id(item)
+            except KinopoiskImportError as e:
+                result.error = str(e)
+                continue
+            # Дубликаты загружаем один раз
+            by_film_id.setdefault(result.film_id, []).append(result)
+
+        film_ids = list(by_film_id)
+        if not film_ids:
+            return results
+
+        client = self._get_client()
+
+        def write(batch):
+            fetched = []
+            for film_id, data in batch:
+                if isinstance(data, BaseException):
+                    for result in by_film_id[film_id]:
+                        result.error = str(data) or data.__class__.__name__
+                        result.not_found = isinstance(data, KinopoiskNotFoundError)
+                        result.transient = isinstance(data, KinopoiskUnavailableError)
+                else:
+                    fetched.append((film_id, data, by_film_id[film_id]))
+            if fetched:
+                self._save_batch(fetched)
+
+        pipeline = ImportPipeline(
+            fetch=lambda film_id: self.fetch_all(client, film_id),
+            write=write,
+            concurrency=concurrency,
+            batch_size=batch_size,
+            queue_size=settings.KINOPOISK_IMPORT_QUEUE_SIZE,
+        )
+        self.import_stats = pipeline.run(film_ids)
+        logger.info("Импорт с Кинопоиска: %s", self.import_stats)
+        self._update_derived({result.movie.pk for result in results if result.movie})
+        return results
+
+    @staticmethod
+    def _update_derived(movie_ids) -> None:
+        """
+        Обновляет взвешенный рейтинг импортированных фильмов и лидеров их жанров,
+        помечает фильмы для пересчёта похожих; ошибка здесь не отменяет уже сохранённый импорт
+        """
+        if not movie_ids:
+            return
+        try:
+            update_weighted_ratings(movie_ids)
+            refresh_genre_top(movie_ids)
+            mark_similar_stale(movie_ids)
+        except Exception:
+            logger.exception("Не удалось обновить рейтинг и похожие фильмы для %s", sorted(movie_ids))
+
+    @staticmethod
+    def movies_to_refresh(max_age: timedelta, popular_max_age: timedelta, popular_votes: int):
+        """
+        Фильмы с kinopoisk_id, чьи рейтинги устарели. Популярные (vote_count >= popular_votes)
+        устаревают быстрее. Первыми идут ни разу не обновлённые и самые давние,
+        при равенстве — более популярные.
+        """
+        now = timezone.now()
+        return Movie.objects.filter(kinopoisk_id__isnull=False).filter(
+            Q(refreshed_at__isnull=True)
+            | Q(refreshed_at__lt=now - max_age)
+            | Q(vote_count__gte=popular_votes, refreshed_at__lt=now - popular_max_age)
+        ).order_by(F('refreshed_at').asc(nulls_first=True), '-vote_count')
+
+    def refresh_ratings(self, movies: list[Movie], concurrency: int = None) -> RefreshResult:
+        """
+        Обновляет рейтинг и число голосов фильмов, запрашивая только /films/{id}.
+        Изменившиеся фильмы сохраняются одним bulk_update, у остальных только
+        проставляется refreshed_at. Актёры и жанры не трогаются.
+        """
+        concurrency = concurrency or settings.KINOPOISK_IMPORT_CONCURRENCY
+        result = RefreshResult()
+        movies = [movie for movie in movies if movie.kinopoisk_id]
+        if not movies:
+            return result
+
+        async def fetch_film(client, film_id):
+            return await self.fetch_film_data(client, film_id, refresh=True)
+
+        fetched = http_pool.loop.run(
+            self._fetch_many([movie.kinopoisk_id for movie in movies], concurrency, fetch=fetch_film)
+        )
+
+        now = timezone.now()
+        changed, unchanged = [], []
+        for movie, film_data in zip(movies, fetched):
+            if isinstance(film_data, BaseException):
+                result.failed.append((movie, str(film_data) or film_data.__class__.__name__))
+                continue
+            rating, vote_count = self._parse_rating(film_data)
+            if (rating, vote_count) != (movie.rating, movie.vote_count):
+                movie.rating, movie.vote_count, movie.refreshed_at = rating, vote_count, now
+                changed.append(movie)
+            else:
+                unchanged.append(movie.pk)
+
+        with transaction.atomic():
+            if changed:
+                Movie.objects.bulk_update(changed, ['rating', 'vote_count', 'refreshed_at'])
+                record_changes(Movie, [movie.pk for movie in changed])
+            if unchanged:
+                Movie.objects.filter(pk__in=unchanged).update(refreshed_at=now)
+
+        result.updated = changed
+        result.unchanged = len(unchanged)
+        return result
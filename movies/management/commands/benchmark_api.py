@@ -0,0 +1,285 @@
+"""
+Management command для нагрузочного замера API каталога
+Поднимает ASGI-приложение из movie_backend/asgi.py в процессе (httpx.ASGITransport)
+или обращается к запущенному серверу (--url) и прогоняет смесь запросов: листание,
+фильтры, поиск, карточки фильмов и страницы актёров — на каждом уровне конкурентности.
+Последовательность запросов задаётся --seed, поэтому прогоны сравнимы между коммитами.
+Результат (p50/p95/p99, запросов/с) пишется в JSON; --baseline сравнивает с прошлым прогоном.
+
+В процессе синхронные view Django выполняются в одном потоке, так что конкурентность
+показывает очередь к нему; параллелизм воркеров меряется через --url
+(например, gunicorn movie_backend.asgi -k uvicorn.workers.UvicornWorker -w 4).
+Запуск: python manage.py benchmark_api --scale 20000 --concurrency 1,10,50 --requests 1000
+"""
+import asyncio
+import json
+import random
+import subprocess
+import time
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import quote
+
+import httpx
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from movies.models import Movie, Genre, Country, Actor, SimilarMovie
+
+# Доли сценариев в смеси по умолчанию
+DEFAULT_MIX = {'browse': 30, 'filter': 25, 'search': 10, 'detail': 25, 'actor': 10}
+ORDERINGS = ['', '-rating', '-weighted_rating', '-vote_count', 'title']
+PAGE_SIZE = 20
+
+
+class RequestMix:
+    """Детерминированный генератор URL по сценариям на выборке ID из базы"""
+
+    def __init__(self, weights: dict, seed: int):
+        self.weights = weights
+        self.rng = random.Random(seed)
+        self.movies = list(Movie.objects.order_by('pk').values_list('pk', flat=True))
+        self.genres = list(Genre.objects.order_by('pk').values_list('pk', flat=True))
+        self.countries = list(Country.objects.order_by('pk').values_list('pk', flat=True))
+        # Чаще открывают популярных актёров
+        self.actors = list(Actor.objects.order_by('-total_votes', 'pk').values_list('pk', flat=True)[:2000])
+        if not self.movies:
+            raise CommandError("Каталог пуст: заполните его (populate_movies или --scale)")
+        titles = Movie.objects.filter(pk__in=self.rng.sample(self.movies, min(200, len(self.movies))))
+        words = {word.strip('.,:!?«»"').lower() for title in titles.values_list('title', flat=True) for word in title.split()}
+        self.words = sorted(quote(word) for word in words if len(word) >= 4 and word.isalpha()) or ['фильм']
+        self.pages = max(1, min(50, -(-len(self.movies) // PAGE_SIZE)))
+
+    def urls(self, count: int) -> list[tuple[str, str]]:
+        """count пар (сценарий, URL)"""
+        names = list(self.weights)
+        picks = self.rng.choices(names, weights=[self.weights[name] for name in names], k=count)
+        return [(name, getattr(self, name)()) for name in picks]
+
+    def _ordering(self) -> str:
+        ordering = self.rng.choice(ORDERINGS)
+        return f'&ordering={ordering}' if ordering else ''
+
+    def browse(self) -> str:
+        # Первые страницы открывают чаще дальних
+        page = 1 + int(self.pages * self.rng.random() ** 3)
+        return self.rng.choice([
+            f'/api/movies/?page={page}{self._ordering()}',
+            f'/api/movies/?page={page}{self._ordering()}',
+            '/api/genres/',
+            f'/api/genres/{self.rng.choice(self.genres)}/top/' if self.genres else '/api/genres/',
+        ])
+
+    def filter(self) -> str:
+        params = []
+        if self.genres and self.rng.random() < 0.7:
+            params.append(f'genre={",".join(map(str, self.rng.sample(self.genres, self.rng.choice((1, 1, 2)))))}')
+        if self.countries and self.rng.random() < 0.3:
+            params.append(f'country={self.rng.choice(self.countries)}')
+        if self.rng.random() < 0.4:
+            start = self.rng.randrange(1950, 2021, 10)
+            params.append(f'year_min={start}&year_max={start + 9}')
+        if self.rng.random() < 0.3:
+            params.append(f'min_rating={self.rng.choice((6, 7, 8))}')
+        query = '&'.join(params) or 'type=FILM'
+        # Вместе со страницей фронтенд запрашивает счётчики фильтров
+        if self.rng.random() < 0.3:
+            return f'/api/movies/facets/?{query}'
+        return f'/api/movies/?{query}{self._ordering()}'
+
+    def search(self) -> str:
+        word = self.rng.choice(self.words)
+        if self.rng.random() < 0.5:
+            return f'/api/movies/?search={word}'
+        return f'/api/movies/search/?q={word}'
+
+    def detail(self) -> str:
+        movie = self.rng.choice(self.movies)
+        return self.rng.choice([f'/api/movies/{movie}/', f'/api/movies/{movie}/', f'/api/movies/{movie}/cast/',
+                                f'/api/movies/{movie}/similar/'])
+
+    def actor(self) -> str:
+        if not self.actors:
+            return '/api/actors/'
+        actor = self.actors[int(len(self.actors) * self.rng.random() ** 2)]
+        return self.rng.choice([f'/api/actors/{actor}/', f'/api/actors/{actor}/movies/',
+                                '/api/actors/?ordering=-total_votes'])
+
+
+def summarize(latencies) -> dict:
+    """Перцентили задержки в миллисекундах"""
+    if not latencies:
+        return {'count': 0}
+    values = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'count': len(values),
+        'mean_ms': round(float(values.mean()), 2),
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'max_ms': round(float(values.max()), 2),
+    }
+
+
+def parse_mix(value: str) -> dict:
+    """'browse=30,detail=20' → {'browse': 30, 'detail': 20}"""
+    mix = {}
+    for item in filter(None, value.split(',')):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_MIX:
+            raise CommandError(f"Неизвестный сценарий {name!r}, доступны: {', '.join(DEFAULT_MIX)}")
+        try:
+            mix[name] = float(weight) if weight else DEFAULT_MIX[name]
+        except ValueError:
+            raise CommandError(f"Вес сценария {name!r} должен быть числом")
+    if not mix or sum(mix.values()) <= 0:
+        raise CommandError("Смесь запросов пуста")
+    return mix
+
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный замер API: задержки p50/p95/p99 и запросов/с на уровнях конкурентности'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Адрес запущенного сервера (по умолчанию — ASGI-приложение в процессе)')
+        parser.add_argument('--concurrency', default='1,10,50', help='Уровни конкурентности через запятую')
+        parser.add_argument('--requests', type=int, default=500, help='Запросов на каждом уровне')
+        parser.add_argument('--warmup', type=int, default=50, help='Запросов на прогрев перед замером')
+        parser.add_argument('--mix', default='', help='Смесь сценариев, например browse=30,search=10 '
+                                                       f'(по умолчанию {DEFAULT_MIX})')
+        parser.add_argument('--seed', type=int, default=0, help='Seed последовательности запросов')
+        parser.add_argument('--scale', type=int, default=0,
+                            help='Сначала догенерировать синтетический каталог до N фильмов (populate_movies)')
+        parser.add_argument('--output', help='JSON с результатами (по умолчанию data/benchmarks/api-<время>.json)')
+        parser.add_argument('--baseline', help='JSON прошлого прогона для сравнения')
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',') if level]
+        except ValueError:
+            raise CommandError("--concurrency: ожидаются целые числа через запятую")
+        if not levels or min(levels) < 1 or options['requests'] < 1:
+            raise CommandError("Нужны положительные --concurrency и --requests")
+        mix_weights = parse_mix(options['mix']) if options['mix'] else dict(DEFAULT_MIX)
+        baseline = self.load_baseline(options['baseline'])
+
+        if options['scale']:
+            call_command('populate_movies', scale=options['scale'], stdout=self.stdout)
+            if not SimilarMovie.objects.exists():
+                call_command('build_similar_movies', stdout=self.stdout)
+
+        mix = RequestMix(mix_weights, options['seed'])
+        report = {
+            'meta': {
+                'started_at': timezone.now().isoformat(),
+                'commit': git_commit(),
+                'target': options['url'] or 'asgi',
+                'database': connection.vendor,
+                'movies': len(mix.movies),
+                'actors': Actor.objects.count(),
+                'requests_per_level': options['requests'],
+                'seed': options['seed'],
+                'mix': mix_weights,
+            },
+            'levels': [],
+        }
+        warmup = mix.urls(options['warmup'])
+        plans = [(level, mix.urls(options['requests'])) for level in levels]
+        # Цикл событий — в отдельном потоке, синхронные view — в текущем (async_to_sync)
+        report['levels'] = async_to_sync(self.run)(options['url'], warmup, plans)
+
+        for result in report['levels']:
+            self.print_level(result, baseline.get(result['concurrency']))
+        output = Path(options['output'] or settings.BASE_DIR / 'data' / 'benchmarks'
+                      / f"api-{timezone.now():%Y%m%d-%H%M%S}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        self.stdout.write(self.style.SUCCESS(f"✅ Результаты: {output}"))
+
+    async def run(self, url, warmup, plans) -> list[dict]:
+        if url:
+            client = httpx.AsyncClient(base_url=url, timeout=60,
+                                       limits=httpx.Limits(max_connections=max(level for level, _ in plans)))
+        else:
+            from movie_backend.asgi import application
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=application),
+                                       base_url='http://localhost', timeout=60)
+        async with client:
+            await self.drive(client, warmup, 1)
+            return [await self.measure(client, urls, level) for level, urls in plans]
+
+    @staticmethod
+    async def drive(client, urls, concurrency: int) -> list[tuple[str, float, int]]:
+        """Выполняет запросы concurrency воркерами; возвращает (сценарий, задержка, статус)"""
+        pending = iter(urls)
+        samples = []
+
+        async def worker():
+            for scenario, url in pending:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = 0
+                samples.append((scenario, time.perf_counter() - started, status))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return samples
+
+    async def measure(self, client, urls, concurrency: int) -> dict:
+        started = time.perf_counter()
+        samples = await self.drive(client, urls, concurrency)
+        elapsed = time.perf_counter() - started
+        by_scenario = defaultdict(list)
+        for scenario, latency, _ in samples:
+            by_scenario[scenario].append(latency)
+        return {
+            'concurrency': concurrency,
+            'requests': len(samples),
+            'errors': sum(1 for _, _, status in samples if not 200 <= status < 400),
+            'elapsed_s': round(elapsed, 3),
+            'rps': round(len(samples) / elapsed, 1) if elapsed else None,
+            'latency': summarize([latency for _, latency, _ in samples]),
+            'scenarios': {name: summarize(values) for name, values in sorted(by_scenario.items())},
+        }
+
+    def print_level(self, result: dict, previous: dict | None):
+        latency = result['latency']
+        line = (
+            f"c={result['concurrency']:<4} {result['rps']:>8} запр/с  "
+            f"p50 {latency['p50_ms']:.1f}  p95 {latency['p95_ms']:.1f}  p99 {latency['p99_ms']:.1f} мс  "
+            f"ошибок {result['errors']}"
+        )
+        if previous:
+            line += (f"  (было {previous['rps']} запр/с, p95 {previous['latency']['p95_ms']:.1f} мс; "
+                     f"{(result['rps'] / previous['rps'] - 1) * 100:+.0f}% запр/с)")
+        self.stdout.write(line)
+        for name, stats in result['scenarios'].items():
+            self.stdout.write(f"    {name:<7} {stats['count']:>6}  p50 {stats['p50_ms']:.1f}  p95 {stats['p95_ms']:.1f} мс")
+
+    @staticmethod
+    def load_baseline(path) -> dict:
+        """Уровни прошлого прогона по конкурентности"""
+        if not path:
+            return {}
+        try:
+            data = json.loads(Path(path).read_text(encoding='utf-8'))
+            return {level['concurrency']: level for level in data['levels']}
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            raise CommandError(f"Не удалось прочитать --baseline {path}: {exc}")
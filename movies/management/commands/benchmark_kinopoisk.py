@@ -0,0 +1,67 @@
+"""
+Management command для замера скорости импорта с Кинопоиска
+Поднимает локальный фейковый API и сравнивает импорт с новым клиентом на каждый фильм
+и с общим пулом соединений. Все изменения в БД откатываются.
+Запуск: python manage.py benchmark_kinopoisk --count 200 --concurrency 10
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from movies.kinopoisk import KinopoiskService
+from movies.testing import FakeKinopoiskAPI, serve_fake_api
+from movies.throttling import TokenBucket, CircuitBreaker
+
+
+class Command(BaseCommand):
+    help = 'Замеряет число импортов в секунду против локального фейкового API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100, help='Число фильмов в каждом сценарии')
+        parser.add_argument('--concurrency', type=int, default=10, help='Конкурентность для import_many')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        server, base_url = serve_fake_api(FakeKinopoiskAPI())
+        service = KinopoiskService(
+            api_token='benchmark',
+            base_url=base_url,
+            # Квоту и кэш отключаем: меряем только сеть и БД
+            rate_limiter=TokenBucket(10 ** 9),
+            circuit_breaker=CircuitBreaker(10 ** 9, 0),
+            use_cache=False,
+        )
+
+        def client_per_film(ids):
+            for film_id in ids:
+                with service.session():
+                    service.import_from_url(f'https://www.kinopoisk.ru/film/{film_id}/')
+
+        def pooled_sequential(ids):
+            for film_id in ids:
+                service.import_from_url(f'https://www.kinopoisk.ru/film/{film_id}/')
+
+        def pooled_bulk(ids):
+            service.import_many(ids, concurrency=options['concurrency'])
+
+        scenarios = [
+            ('Новый клиент на каждый фильм', client_per_film),
+            ('Общий пул, последовательно', pooled_sequential),
+            ('Общий пул, import_many', pooled_bulk),
+        ]
+
+        try:
+            with transaction.atomic():
+                for index, (name, run) in enumerate(scenarios):
+                    # Для каждого сценария — свои ID, чтобы везде были вставки, а не обновления
+                    ids = list(range(index * 1_000_000 + 1, index * 1_000_000 + count + 1))
+                    started = time.perf_counter()
+                    run(ids)
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(f"{name}: {count / elapsed:.1f} импортов/с ({elapsed:.2f} с)")
+                    if run is pooled_bulk:
+                        self.stdout.write(f"  по стадиям: {service.import_stats}")
+                transaction.set_rollback(True)
+        finally:
+            server.shutdown()
@@ -0,0 +1,30 @@
+"""
+Management command для построения индекса похожих фильмов (movies/similarity.py)
+После импорта новых фильмов индекс обновляется инкрементально; полный пересчёт
+нужен после первого развёртывания или populate_movies (import_catalog пересчитывает сам).
+С --stale обновляются только фильмы, помеченные импортом (для cron без воркера).
+Запуск: python manage.py build_similar_movies [--top-k 20] [--stale]
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from movies.similarity import rebuild_similar, refresh_stale_similar
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает похожие фильмы (top-K соседей) для всего каталога'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=settings.SIMILAR_MOVIES_TOP_K,
+                            help='Сколько похожих фильмов хранить на фильм')
+        parser.add_argument('--block-size', type=int, default=200,
+                            help='Фильмов в одном блоке умножения матриц (ограничивает память)')
+        parser.add_argument('--stale', action='store_true',
+                            help='Только фильмы, импортированные после последнего пересчёта')
+
+    def handle(self, *args, **options):
+        if options['stale']:
+            count = refresh_stale_similar(k=options['top_k'])
+        else:
+            count = rebuild_similar(k=options['top_k'], block_size=options['block_size'])
+        self.stdout.write(self.style.SUCCESS(f'Готово: {count} записей'))
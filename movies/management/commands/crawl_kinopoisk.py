@@ -0,0 +1,114 @@
+"""
+Management command для массового наполнения каталога с Кинопоиска
+Обходит подборку, поиск по фильтрам или диапазон ID и импортирует новые фильмы.
+Позиция сохраняется после каждого шага: повторный запуск с тем же именем продолжает обход.
+Запуск: python manage.py crawl_kinopoisk top250 --collection TOP_250_MOVIES
+        python manage.py crawl_kinopoisk dramas --filter genres=2 --filter yearFrom=2000
+        python manage.py crawl_kinopoisk ids --id-range 1-500000 --step 200
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.crawler import KinopoiskCrawler
+from movies.kinopoisk import KinopoiskService, KinopoiskImportError
+from movies.models import CrawlState
+from movies.similarity import refresh_stale_similar
+
+
+class Command(BaseCommand):
+    help = 'Обходит каталог Кинопоиска и импортирует найденные фильмы с сохранением позиции'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Имя обхода (по нему обход продолжается после остановки)')
+        source = parser.add_mutually_exclusive_group()
+        source.add_argument('--collection', help='Тип подборки, например TOP_250_MOVIES')
+        source.add_argument('--filter', action='append', metavar='KEY=VALUE',
+                            help='Параметр поиска /films (можно указать несколько раз)')
+        source.add_argument('--id-range', metavar='START-END', help='Диапазон ID фильмов')
+        parser.add_argument('--step', type=int, default=100, help='Сколько ID проверять за шаг (для --id-range)')
+        parser.add_argument('--max-steps', type=int, help='Остановиться после N шагов')
+        parser.add_argument('--concurrency', type=int, help='Число одновременно загружаемых фильмов')
+        parser.add_argument('--reset', action='store_true', help='Начать обход заново')
+
+    def handle(self, *args, **options):
+        state = self.get_state(options)
+        if state.finished:
+            self.stdout.write(self.style.WARNING(f"Обход «{state.name}» уже завершён (--reset, чтобы начать заново)"))
+            return
+
+        try:
+            service = KinopoiskService()
+        except KinopoiskImportError as e:
+            raise CommandError(str(e))
+
+        crawler = KinopoiskCrawler(service, state, concurrency=options['concurrency'], step=options['step'])
+        imported = 0
+        started = time.perf_counter()
+        try:
+            for stats in crawler.run(max_steps=options['max_steps']):
+                imported += stats.imported
+                self.stdout.write(
+                    f"[{stats.position}] найдено: {stats.discovered}, уже в каталоге: {stats.skipped}, "
+                    f"импортировано: {stats.imported}, нет на Кинопоиске: {stats.not_found}, "
+                    f"ошибок: {stats.failed} ({stats.rate:.1f} фильмов/с)"
+                )
+        except KinopoiskImportError as e:
+            raise CommandError(f"Обход остановлен на позиции {state.position}: {e}")
+        finally:
+            refresh_stale_similar()
+
+        elapsed = time.perf_counter() - started
+        status = "завершён" if state.finished else f"остановлен на позиции {state.position}"
+        self.stdout.write(self.style.SUCCESS(
+            f"Обход «{state.name}» {status}. Импортировано за запуск: {imported} "
+            f"({imported / elapsed if elapsed else 0:.1f} фильмов/с); всего: {state.imported}, "
+            f"нет на Кинопоиске: {state.not_found}, ошибок: {state.failed}"
+        ))
+
+    def get_state(self, options) -> CrawlState:
+        """Находит сохранённый обход по имени или создаёт новый из параметров"""
+        source, params, position = self.parse_source(options)
+        state = CrawlState.objects.filter(name=options['name']).first()
+
+        if state is None:
+            if source is None:
+                raise CommandError("Для нового обхода укажите --collection, --filter или --id-range")
+            return CrawlState.objects.create(name=options['name'], source=source, params=params, position=position)
+
+        if source is not None and (source, params) != (state.source, state.params):
+            if not options['reset']:
+                raise CommandError(f"Обход «{state.name}» уже существует с другими параметрами (--reset, чтобы заменить)")
+            state.source, state.params = source, params
+        if options['reset']:
+            state.position = position if source is not None else self.start_position(state)
+            state.total_pages = None
+            state.finished = False
+            state.discovered = state.skipped = state.imported = state.not_found = state.failed = 0
+            state.save()
+        return state
+
+    def parse_source(self, options) -> tuple[str | None, dict, int]:
+        if options['collection']:
+            return CrawlState.SOURCE_COLLECTION, {'type': options['collection']}, 1
+        if options['filter']:
+            params = {}
+            for item in options['filter']:
+                key, sep, value = item.partition('=')
+                if not sep or not key:
+                    raise CommandError(f"Неверный фильтр «{item}», ожидается KEY=VALUE")
+                params[key] = value
+            return CrawlState.SOURCE_FILTER, params, 1
+        if options['id_range']:
+            try:
+                start, end = (int(value) for value in options['id_range'].split('-'))
+            except ValueError:
+                raise CommandError("Диапазон ID указывается как START-END, например 1-1000")
+            if start < 1 or end < start:
+                raise CommandError("Неверный диапазон ID")
+            return CrawlState.SOURCE_RANGE, {'start': start, 'end': end}, start
+        return None, {}, 1
+
+    @staticmethod
+    def start_position(state: CrawlState) -> int:
+        return state.params.get('start', 1) if state.source == CrawlState.SOURCE_RANGE else 1
@@ -0,0 +1,59 @@
+"""
+Management command для пакетного импорта фильмов с Кинопоиска
+Запуск: python manage.py import_kinopoisk 435 https://www.kinopoisk.ru/film/326/ --file ids.txt
+"""
+from django.core.management.base import BaseCommand, CommandError
+from movies.kinopoisk import KinopoiskService, KinopoiskImportError
+from movies.similarity import refresh_stale_similar
+
+
+class Command(BaseCommand):
+    help = 'Импортирует фильмы с Кинопоиска по списку URL/ID или из файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument('items', nargs='*', help='URL или ID фильмов на Кинопоиске')
+        parser.add_argument('--file', help='Файл со списком URL/ID (по одному в строке)')
+        parser.add_argument('--concurrency', type=int, help='Число одновременно загружаемых фильмов')
+        parser.add_argument('--batch-size', type=int, help='Число фильмов в одной транзакции')
+        parser.add_argument('--no-cache', action='store_true', help='Не использовать кэш ответов API')
+        parser.add_argument('--offline', action='store_true', help='Брать ответы только из кэша, без сети')
+
+    def handle(self, *args, **options):
+        items = list(options['items'])
+        if options['file']:
+            try:
+                with open(options['file'], encoding='utf-8') as f:
+                    items.extend(KinopoiskService.parse_items(f.read()))
+            except OSError as e:
+                raise CommandError(f"Не удалось прочитать файл: {e}")
+
+        if not items:
+            raise CommandError("Укажите URL/ID фильмов или --file")
+
+        try:
+            service = KinopoiskService(
+                use_cache=not options['no_cache'],
+                offline=options['offline'] or None,
+            )
+            results = service.import_many(
+                items,
+                concurrency=options['concurrency'],
+                batch_size=options['batch_size'],
+            )
+        except KinopoiskImportError as e:
+            raise CommandError(str(e))
+        refresh_stale_similar()
+
+        failed = 0
+        for result in results:
+            if result.ok:
+                self.stdout.write(f"✓ {result.item}: {result.movie.title}")
+            else:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"✗ {result.item}: {result.error}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\nИмпортировано: {len(results) - failed}, с ошибками: {failed}"
+        ))
+        if options['verbosity'] > 1:
+            self.stdout.write(f"Конвейер: {service.import_stats}")
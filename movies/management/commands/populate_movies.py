@@ -1,206 +1,346 @@
 """
 Management command для заполнения базы данных тестовыми фильмами
-Запуск: python manage.py populate_movies
+Все записи создаются пачками (bulk_create) в одной транзакции; если данные
+уже на месте, команда завершается после нескольких SELECT без записи в БД.
+С --scale N дополнительно генерирует синтетический каталог из N фильмов
+(актёры, жанры, страны, роли) для нагрузочного тестирования.
+Запуск: python manage.py populate_movies [--scale 100000]
 """
-from datetime import date
+import random
+import time
+from datetime import date, timedelta
+
 from django.core.management.base import BaseCommand
-from movies.models import Genre, Actor, Movie, MovieCast
+from django.db import transaction
+
+from movies.models import Genre, Actor, Country, Movie, MovieCast
+from movies.changes import record_changes
+from movies.ranking import recompute_rankings
+from movies.snapshot import load_rows
+
+# База URL для статики
+POSTER_BASE = '/static/movies/posters/'
+BACKDROP_BASE = '/static/movies/backdrops/'
+ACTOR_BASE = '/static/movies/actors/'
+
+GENRES = [
+    'Боевик', 'Фантастика', 'Триллер', 'Драма', 'Приключения',
+    'Криминал', 'Комедия', 'Мелодрама', 'Ужасы', 'Исторический'
+]
+
+ACTORS = [
+    ('Леонардо ДиКаприо', f'{ACTOR_BASE}dicaprio.png'),
+    ('Кристиан Бэйл', f'{ACTOR_BASE}bale.png'),
+    ('Мэттью МакКонахи', f'{ACTOR_BASE}mcconaughey.png'),
+    ('Киану Ривз', f'{ACTOR_BASE}reeves.png'),
+    ('Рассел Кроу', f'{ACTOR_BASE}crowe.png'),
+    ('Том Хэнкс', f'{ACTOR_BASE}hanks.png'),
+    ('Брэд Питт', f'{ACTOR_BASE}pitt.png'),
+    ('Морган Фриман', f'{ACTOR_BASE}freeman.png'),
+    ('Энн Хэтэуэй', f'{ACTOR_BASE}hathaway.png'),
+    ('Хоакин Феникс', f'{ACTOR_BASE}phoenix.png'),
+]
+
+MOVIES = [
+    {
+        'title': 'Начало',
+        'overview': 'Кобб — талантливый вор, лучший в опасном искусстве извлечения: кражи ценных секретов из глубин подсознания во время сна.',
+        'poster_path': f'{POSTER_BASE}inception.png',
+        'backdrop_path': f'{BACKDROP_BASE}inception.png',
+        'rating': 8.8,
+        'release_date': date(2010, 7, 16),
+        'vote_count': 34521,
+        'genres': ['Фантастика', 'Боевик', 'Триллер'],
+        'cast': [('Леонардо ДиКаприо', 'Кобб', 0)]
+    },
+    {
+        'title': 'Тёмный рыцарь',
+        'overview': 'Бэтмен поднимает ставки в войне с криминалом. С помощью лейтенанта Гордона и прокурора Харви Дента он намерен очистить улицы Готэма.',
+        'poster_path': f'{POSTER_BASE}dark_knight.png',
+        'backdrop_path': None,
+        'rating': 9.0,
+        'release_date': date(2008, 7, 18),
+        'vote_count': 30891,
+        'genres': ['Боевик', 'Криминал', 'Драма'],
+        'cast': [('Кристиан Бэйл', 'Брюс Уэйн / Бэтмен', 0), ('Морган Фриман', 'Люциус Фокс', 1)]
+    },
+    {
+        'title': 'Интерстеллар',
+        'overview': 'Когда засуха, пыльные бури и вымирание растений приводят человечество к продовольственному кризису, команда исследователей отправляется через червоточину.',
+        'poster_path': f'{POSTER_BASE}interstellar.png',
+        'backdrop_path': None,
+        'rating': 8.7,
+        'release_date': date(2014, 11, 7),
+        'vote_count': 32456,
+        'genres': ['Фантастика', 'Драма', 'Приключения'],
+        'cast': [('Мэттью МакКонахи', 'Купер', 0), ('Энн Хэтэуэй', 'Амелия Бренд', 1)]
+    },
+    {
+        'title': 'Матрица',
+        'overview': 'Хакер Нео узнаёт, что его мир — виртуальная реальность, созданная машинами для порабощения людей. Ему предстоит стать избранным.',
+        'poster_path': f'{POSTER_BASE}matrix.png',
+        'backdrop_path': None,
+        'rating': 8.7,
+        'release_date': date(1999, 3, 31),
+        'vote_count': 24567,
+        'genres': ['Фантастика', 'Боевик'],
+        'cast': [('Киану Ривз', 'Нео', 0)]
+    },
+    {
+        'title': 'Гладиатор',
+        'overview': 'Генерал Максимус, преданный императором, становится рабом и гладиатором. Его единственная цель — месть.',
+        'poster_path': f'{POSTER_BASE}gladiator.png',
+        'backdrop_path': None,
+        'rating': 8.5,
+        'release_date': date(2000, 5, 5),
+        'vote_count': 16789,
+        'genres': ['Боевик', 'Драма', 'Исторический'],
+        'cast': [('Рассел Кроу', 'Максимус', 0), ('Хоакин Феникс', 'Коммод', 1)]
+    },
+    {
+        'title': 'Форрест Гамп',
+        'overview': 'Сидя на скамейке, Форрест Гамп рассказывает случайным встречным историю своей необыкновенной жизни.',
+        'poster_path': f'{POSTER_BASE}forrest_gump.png',
+        'backdrop_path': None,
+        'rating': 8.8,
+        'release_date': date(1994, 7, 6),
+        'vote_count': 25678,
+        'genres': ['Драма', 'Мелодрама', 'Комедия'],
+        'cast': [('Том Хэнкс', 'Форрест Гамп', 0)]
+    },
+    {
+        'title': 'Бойцовский клуб',
+        'overview': 'Офисный работник страдает от бессонницы. Случайная встреча с продавцом мыла меняет его жизнь навсегда.',
+        'poster_path': f'{POSTER_BASE}fight_club.png',
+        'backdrop_path': None,
+        'rating': 8.8,
+        'release_date': date(1999, 10, 15),
+        'vote_count': 27890,
+        'genres': ['Драма', 'Триллер'],
+        'cast': [('Брэд Питт', 'Тайлер Дёрден', 0)]
+    },
+    {
+        'title': 'Джокер',
+        'overview': 'Готэм, начало 1980-х. Комик Артур Флек живёт с больной матерью. Однажды он оказывается втянут в череду трагических событий.',
+        'poster_path': f'{POSTER_BASE}joker.png',
+        'backdrop_path': None,
+        'rating': 8.4,
+        'release_date': date(2019, 10, 4),
+        'vote_count': 23456,
+        'genres': ['Криминал', 'Драма', 'Триллер'],
+        'cast': [('Хоакин Феникс', 'Артур Флек / Джокер', 0)]
+    },
+    {
+        'title': 'Побег из Шоушенка',
+        'overview': 'Бухгалтер Энди Дюфрейн обвинён в убийстве собственной жены и её любовника. Несмотря на невиновность, он приговорён к пожизненному заключению.',
+        'poster_path': f'{POSTER_BASE}shawshank.png',
+        'backdrop_path': None,
+        'rating': 9.3,
+        'release_date': date(1994, 9, 23),
+        'vote_count': 25789,
+        'genres': ['Драма', 'Криминал'],
+        'cast': [('Том Хэнкс', 'Энди Дюфрейн', 0), ('Морган Фриман', 'Ред', 1)]
+    },
+    {
+        'title': 'Леон',
+        'overview': 'Профессиональный убийца Леон берёт под опеку 12-летнюю Матильду, семью которой убили коррумпированные полицейские.',
+        'poster_path': f'{POSTER_BASE}leon.png',
+        'backdrop_path': None,
+        'rating': 8.5,
+        'release_date': date(1994, 9, 14),
+        'vote_count': 12345,
+        'genres': ['Боевик', 'Криминал', 'Драма'],
+        'cast': []
+    },
+]
+
+COUNTRIES = [
+    'США', 'Россия', 'Великобритания', 'Франция', 'Германия', 'Италия', 'Испания',
+    'Япония', 'Южная Корея', 'Китай', 'Индия', 'Канада', 'Австралия', 'Швеция', 'Мексика',
+]
+
+# Префиксы названий синтетических записей: по ним считается уже сгенерированное
+SYNTHETIC_MOVIE = 'Синтетический фильм #'
+SYNTHETIC_ACTOR = 'Синтетический актёр #'
 
 
 class Command(BaseCommand):
     help = 'Заполняет базу данных тестовыми фильмами, жанрами и актёрами'
 
-    def handle(self, *args, **options):
-        # База URL для статики
-        POSTER_BASE = '/static/movies/posters/'
-        BACKDROP_BASE = '/static/movies/backdrops/'
-        ACTOR_BASE = '/static/movies/actors/'
-
-        # Создаём жанры
-        genres_data = [
-            'Боевик', 'Фантастика', 'Триллер', 'Драма', 'Приключения',
-            'Криминал', 'Комедия', 'Мелодрама', 'Ужасы', 'Исторический'
-        ]
-
-        genres = {}
-        for name in genres_data:
-            genre, _ = Genre.objects.get_or_create(name=name)
-            genres[name] = genre
-            self.stdout.write(f"Жанр: {name}")
-
-        # Создаём актёров с фото
-        actors_data = [
-            ('Леонардо ДиКаприо', f'{ACTOR_BASE}dicaprio.png'),
-            ('Кристиан Бэйл', f'{ACTOR_BASE}bale.png'),
-            ('Мэттью МакКонахи', f'{ACTOR_BASE}mcconaughey.png'),
-            ('Киану Ривз', f'{ACTOR_BASE}reeves.png'),
-            ('Рассел Кроу', f'{ACTOR_BASE}crowe.png'),
-            ('Том Хэнкс', f'{ACTOR_BASE}hanks.png'),
-            ('Брэд Питт', f'{ACTOR_BASE}pitt.png'),
-            ('Морган Фриман', f'{ACTOR_BASE}freeman.png'),
-            ('Энн Хэтэуэй', f'{ACTOR_BASE}hathaway.png'),
-            ('Хоакин Феникс', f'{ACTOR_BASE}phoenix.png'),
-        ]
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=0,
+                            help='Сгенерировать синтетический каталог из N фильмов')
+        parser.add_argument('--cast-per-movie', type=int, default=10,
+                            help='Ролей на синтетический фильм')
+        parser.add_argument('--actors', type=int,
+                            help='Число синтетических актёров (по умолчанию N / 5)')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Фильмов в одной транзакции при генерации')
+        parser.add_argument('--seed', type=int, default=0, help='Seed генератора случайных чисел')
 
-        actors = {}
-        for name, profile_path in actors_data:
-            actor, created = Actor.objects.get_or_create(
-                name=name,
-                defaults={'profile_path': profile_path}
-            )
-            if not created and actor.profile_path != profile_path:
-                actor.profile_path = profile_path
-                actor.save()
-            actors[name] = actor
-            self.stdout.write(f"Актёр: {name}")
-
-        # Создаём фильмы
-        movies_data = [
-            {
-                'title': 'Начало',
-                'overview': 'Кобб — талантливый вор, лучший в опасном искусстве извлечения: кражи ценных секретов из глубин подсознания во время сна.',
-                'poster_path': f'{POSTER_BASE}inception.png',
-                'backdrop_path': f'{BACKDROP_BASE}inception.png',
-                'rating': 8.8,
-                'release_date': date(2010, 7, 16),
-                'vote_count': 34521,
-                'genres': ['Фантастика', 'Боевик', 'Триллер'],
-                'cast': [('Леонардо ДиКаприо', 'Кобб', 0)]
-            },
-            {
-                'title': 'Тёмный рыцарь',
-                'overview': 'Бэтмен поднимает ставки в войне с криминалом. С помощью лейтенанта Гордона и прокурора Харви Дента он намерен очистить улицы Готэма.',
-                'poster_path': f'{POSTER_BASE}dark_knight.png',
-                'backdrop_path': None,
-                'rating': 9.0,
-                'release_date': date(2008, 7, 18),
-                'vote_count': 30891,
-                'genres': ['Боевик', 'Криминал', 'Драма'],
-                'cast': [('Кристиан Бэйл', 'Брюс Уэйн / Бэтмен', 0), ('Морган Фриман', 'Люциус Фокс', 1)]
-            },
-            {
-                'title': 'Интерстеллар',
-                'overview': 'Когда засуха, пыльные бури и вымирание растений приводят человечество к продовольственному кризису, команда исследователей отправляется через червоточину.',
-                'poster_path': f'{POSTER_BASE}interstellar.png',
-                'backdrop_path': None,
-                'rating': 8.7,
-                'release_date': date(2014, 11, 7),
-                'vote_count': 32456,
-                'genres': ['Фантастика', 'Драма', 'Приключения'],
-                'cast': [('Мэттью МакКонахи', 'Купер', 0), ('Энн Хэтэуэй', 'Амелия Бренд', 1)]
-            },
-            {
-                'title': 'Матрица',
-                'overview': 'Хакер Нео узнаёт, что его мир — виртуальная реальность, созданная машинами для порабощения людей. Ему предстоит стать избранным.',
-                'poster_path': f'{POSTER_BASE}matrix.png',
-                'backdrop_path': None,
-                'rating': 8.7,
-                'release_date': date(1999, 3, 31),
-                'vote_count': 24567,
-                'genres': ['Фантастика', 'Боевик'],
-                'cast': [('Киану Ривз', 'Нео', 0)]
-            },
-            {
-                'title': 'Гладиатор',
-                'overview': 'Генерал Максимус, преданный императором, становится рабом и гладиатором. Его единственная цель — месть.',
-                'poster_path': f'{POSTER_BASE}gladiator.png',
-                'backdrop_path': None,
-                'rating': 8.5,
-                'release_date': date(2000, 5, 5),
-                'vote_count': 16789,
-                'genres': ['Боевик', 'Драма', 'Исторический'],
-                'cast': [('Рассел Кроу', 'Максимус', 0), ('Хоакин Феникс', 'Коммод', 1)]
-            },
-            {
-                'title': 'Форрест Гамп',
-                'overview': 'Сидя на скамейке, Форрест Гамп рассказывает случайным встречным историю своей необыкновенной жизни.',
-                'poster_path': f'{POSTER_BASE}forrest_gump.png',
-                'backdrop_path': None,
-                'rating': 8.8,
-                'release_date': date(1994, 7, 6),
-                'vote_count': 25678,
-                'genres': ['Драма', 'Мелодрама', 'Комедия'],
-                'cast': [('Том Хэнкс', 'Форрест Гамп', 0)]
-            },
-            {
-                'title': 'Бойцовский клуб',
-                'overview': 'Офисный работник страдает от бессонницы. Случайная встреча с продавцом мыла меняет его жизнь навсегда.',
-                'poster_path': f'{POSTER_BASE}fight_club.png',
-                'backdrop_path': None,
-                'rating': 8.8,
-                'release_date': date(1999, 10, 15),
-                'vote_count': 27890,
-                'genres': ['Драма', 'Триллер'],
-                'cast': [('Брэд Питт', 'Тайлер Дёрден', 0)]
-            },
-            {
-                'title': 'Джокер',
-                'overview': 'Готэм, начало 1980-х. Комик Артур Флек живёт с больной матерью. Однажды он оказывается втянут в череду трагических событий.',
-                'poster_path': f'{POSTER_BASE}joker.png',
-                'backdrop_path': None,
-                'rating': 8.4,
-                'release_date': date(2019, 10, 4),
-                'vote_count': 23456,
-                'genres': ['Криминал', 'Драма', 'Триллер'],
-                'cast': [('Хоакин Феникс', 'Артур Флек / Джокер', 0)]
-            },
-            {
-                'title': 'Побег из Шоушенка',
-                'overview': 'Бухгалтер Энди Дюфрейн обвинён в убийстве собственной жены и её любовника. Несмотря на невиновность, он приговорён к пожизненному заключению.',
-                'poster_path': f'{POSTER_BASE}shawshank.png',
-                'backdrop_path': None,
-                'rating': 9.3,
-                'release_date': date(1994, 9, 23),
-                'vote_count': 25789,
-                'genres': ['Драма', 'Криминал'],
-                'cast': [('Том Хэнкс', 'Энди Дюфрейн', 0), ('Морган Фриман', 'Ред', 1)]
-            },
-            {
-                'title': 'Леон',
-                'overview': 'Профессиональный убийца Леон берёт под опеку 12-летнюю Матильду, семью которой убили коррумпированные полицейские.',
-                'poster_path': f'{POSTER_BASE}leon.png',
-                'backdrop_path': None,
-                'rating': 8.5,
-                'release_date': date(1994, 9, 14),
-                'vote_count': 12345,
-                'genres': ['Боевик', 'Криминал', 'Драма'],
-                'cast': []
-            },
-        ]
+    def handle(self, *args, **options):
+        changed = self.populate_seed()
+        if options['scale']:
+            changed = self.populate_synthetic(options) or changed
+        if changed:
+            updated, entries = recompute_rankings()
+            self.stdout.write(f"Взвешенный рейтинг: обновлено {updated}, лидеров жанров {entries}")
 
-        for movie_data in movies_data:
-            movie, created = Movie.objects.get_or_create(
-                title=movie_data['title'],
-                defaults={
-                    'overview': movie_data['overview'],
-                    'poster_path': movie_data['poster_path'],
-                    'backdrop_path': movie_data['backdrop_path'],
-                    'rating': movie_data['rating'],
-                    'release_date': movie_data['release_date'],
-                    'vote_count': movie_data['vote_count'],
-                }
-            )
-            
-            # Обновляем пути если фильм уже существует
-            if not created:
-                movie.poster_path = movie_data['poster_path']
-                movie.backdrop_path = movie_data['backdrop_path']
-                movie.save()
-            
-            for genre_name in movie_data['genres']:
-                movie.genres.add(genres[genre_name])
-            
-            for actor_name, character, order in movie_data['cast']:
-                MovieCast.objects.get_or_create(
-                    movie=movie,
-                    actor=actors[actor_name],
-                    defaults={'character': character, 'order': order}
-                )
-            
-            status = "создан" if created else "обновлён"
-            self.stdout.write(f"Фильм: {movie.title} - {status}")
-
-        self.stdout.write(self.style.SUCCESS(f"\n✅ База данных заполнена!"))
         self.stdout.write(f"Жанров: {Genre.objects.count()}")
         self.stdout.write(f"Актёров: {Actor.objects.count()}")
         self.stdout.write(f"Фильмов: {Movie.objects.count()}")
+
+    def populate_seed(self) -> bool:
+        """Создаёт/обновляет демонстрационные фильмы; ничего не пишет, если они уже на месте (возвращает False)"""
+        genres = dict(Genre.objects.filter(name__in=GENRES).values_list('name', 'pk'))
+        new_genres = [Genre(name=name) for name in GENRES if name not in genres]
+
+        actors = {actor.name: actor for actor in Actor.objects.filter(name__in=[name for name, _ in ACTORS])}
+        new_actors = [Actor(name=name, profile_path=path) for name, path in ACTORS if name not in actors]
+        changed_actors = []
+        for name, path in ACTORS:
+            actor = actors.get(name)
+            if actor is not None and actor.profile_path != path:
+                actor.profile_path = path
+                changed_actors.append(actor)
+
+        movies = {movie.title: movie for movie in Movie.objects.filter(title__in=[m['title'] for m in MOVIES])}
+        new_movies = [
+            Movie(**{key: value for key, value in data.items() if key not in ('genres', 'cast')})
+            for data in MOVIES if data['title'] not in movies
+        ]
+        # У существующих фильмов обновляем только пути к картинкам
+        changed_movies = []
+        for data in MOVIES:
+            movie = movies.get(data['title'])
+            if movie is not None and (movie.poster_path, movie.backdrop_path) != (data['poster_path'], data['backdrop_path']):
+                movie.poster_path, movie.backdrop_path = data['poster_path'], data['backdrop_path']
+                changed_movies.append(movie)
+
+        movie_ids = [movie.pk for movie in movies.values()]
+        genre_links = set(Movie.genres.through.objects.filter(movie_id__in=movie_ids).values_list('movie_id', 'genre_id'))
+        cast_links = set(MovieCast.objects.filter(movie_id__in=movie_ids).values_list('movie_id', 'actor_id'))
+        links_present = not new_movies and all(
+            (movies[data['title']].pk, genres.get(name)) in genre_links for data in MOVIES for name in data['genres']
+        ) and all(
+            (movies[data['title']].pk, actors[name].pk) in cast_links
+            for data in MOVIES for name, _, _ in data['cast'] if name in actors
+        )
+
+        if not (new_genres or new_actors or changed_actors or new_movies or changed_movies) and links_present:
+            self.stdout.write("Демонстрационные данные уже загружены")
+            return False
+
+        with transaction.atomic():
+            for genre in Genre.objects.bulk_create(new_genres):
+                genres[genre.name] = genre.pk
+            for actor in Actor.objects.bulk_create(new_actors):
+                actors[actor.name] = actor
+            Actor.objects.bulk_update(changed_actors, ['profile_path'])
+            for movie in Movie.objects.bulk_create(new_movies):
+                movies[movie.title] = movie
+            Movie.objects.bulk_update(changed_movies, ['poster_path', 'backdrop_path'])
+
+            new_genre_links = [
+                Movie.genres.through(movie_id=movies[data['title']].pk, genre_id=genres[name])
+                for data in MOVIES for name in data['genres']
+                if (movies[data['title']].pk, genres[name]) not in genre_links
+            ]
+            Movie.genres.through.objects.bulk_create(new_genre_links, ignore_conflicts=True)
+            new_cast = [
+                MovieCast(movie=movies[data['title']], actor=actors[name], character=character, order=order)
+                for data in MOVIES for name, character, order in data['cast']
+                if (movies[data['title']].pk, actors[name].pk) not in cast_links
+            ]
+            MovieCast.objects.bulk_create(new_cast)
+
+            record_changes(Genre, [genre.pk for genre in new_genres])
+            record_changes(Actor, [actor.pk for actor in new_actors + changed_actors])
+            record_changes(Movie, [movie.pk for movie in new_movies + changed_movies]
+                           + [link.movie_id for link in new_genre_links + new_cast])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Демонстрационные данные: фильмов создано {len(new_movies)}, обновлено {len(changed_movies)}; "
+            f"актёров создано {len(new_actors)}, обновлено {len(changed_actors)}; жанров создано {len(new_genres)}"
+        ))
+        return True
+
+    def populate_synthetic(self, options) -> int:
+        """
+        Догенерирует синтетический каталог до options['scale'] фильмов; возвращает число созданных.
+        Каждая пачка пишется в своей транзакции, поэтому прерванную генерацию
+        можно продолжить повторным запуском с тем же --scale.
+        """
+        started = time.perf_counter()
+        rng = random.Random(options['seed'])
+        genre_ids = list(Genre.objects.values_list('pk', flat=True))
+        country_ids = self.ensure_countries()
+        actor_ids = self.ensure_synthetic_actors(options['actors'] or max(options['scale'] // 5, 100), rng)
+        cast_per_movie = min(options['cast_per_movie'], len(actor_ids))
+
+        existing = Movie.objects.filter(title__startswith=SYNTHETIC_MOVIE).count()
+        created = cast_rows = 0
+        for start in range(existing, options['scale'], options['batch_size']):
+            end = min(start + options['batch_size'], options['scale'])
+            with transaction.atomic():
+                movies = Movie.objects.bulk_create([self.make_movie(i, rng) for i in range(start, end)])
+
+                genre_links, country_links, cast = [], [], []
+                for movie in movies:
+                    for genre_id in rng.sample(genre_ids, rng.randint(1, min(3, len(genre_ids)))):
+                        genre_links.append((movie.pk, genre_id))
+                    for country_id in rng.sample(country_ids, rng.choice((1, 1, 1, 2))):
+                        country_links.append((movie.pk, country_id))
+                    for order, actor_id in enumerate(self.pick_actors(actor_ids, cast_per_movie, rng)):
+                        cast.append((movie.pk, actor_id, f'Роль {order + 1}', order))
+
+                # Связей в ~15 раз больше, чем фильмов: пишем их без построения моделей (COPY на PostgreSQL)
+                load_rows(Movie.genres.through, ['movie', 'genre'], genre_links)
+                load_rows(Movie.countries.through, ['movie', 'country'], country_links)
+                load_rows(MovieCast, ['movie', 'actor', 'character', 'order'], cast)
+                record_changes(Movie, [movie.pk for movie in movies])
+
+            created += len(movies)
+            cast_rows += len(cast)
+            self.stdout.write(f"Синтетических фильмов: {end} из {options['scale']}")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Синтетический каталог: создано фильмов {created}, ролей {cast_rows} за {elapsed:.1f} с"
+        ))
+        return created
+
+    def ensure_countries(self) -> list[int]:
+        existing = set(Country.objects.filter(name__in=COUNTRIES).values_list('name', flat=True))
+        created = Country.objects.bulk_create([Country(name=name) for name in COUNTRIES if name not in existing])
+        record_changes(Country, [country.pk for country in created])
+        return list(Country.objects.filter(name__in=COUNTRIES).values_list('pk', flat=True))
+
+    def ensure_synthetic_actors(self, count: int, rng: random.Random) -> list[int]:
+        existing = Actor.objects.filter(name__startswith=SYNTHETIC_ACTOR).count()
+        created = Actor.objects.bulk_create(
+            [Actor(name=f'{SYNTHETIC_ACTOR}{i + 1}') for i in range(existing, count)],
+            batch_size=5000,
+        )
+        record_changes(Actor, [actor.pk for actor in created])
+        return list(Actor.objects.filter(name__startswith=SYNTHETIC_ACTOR).order_by('pk').values_list('pk', flat=True))
+
+    @staticmethod
+    def make_movie(index: int, rng: random.Random) -> Movie:
+        return Movie(
+            title=f'{SYNTHETIC_MOVIE}{index + 1}',
+            overview=f'Описание синтетического фильма {index + 1}',
+            rating=round(min(10.0, max(1.0, rng.gauss(6.5, 1.2))), 1),
+            vote_count=int(rng.lognormvariate(7, 2)),
+            release_date=date(1920, 1, 1) + timedelta(days=rng.randrange(105 * 365)),
+            film_length=rng.randint(70, 180),
+            type='FILM',
+        )
+
+    @staticmethod
+    def pick_actors(actor_ids: list[int], count: int, rng: random.Random) -> list[int]:
+        """Актёры для фильма: популярные (в начале списка) снимаются чаще"""
+        picked = {}
+        while len(picked) < count:
+            picked[actor_ids[int(len(actor_ids) * rng.random() ** 2)]] = None
+        return list(picked)
@@ -0,0 +1,19 @@
+"""
+Management command для пересчёта взвешенного рейтинга и лидеров жанров (movies/ranking.py)
+refresh_ratings запускает пересчёт сам; вручную — после populate_movies, import_catalog
+или изменения WEIGHTED_RATING_MIN_VOTES.
+Запуск: python manage.py recompute_rankings
+"""
+from django.core.management.base import BaseCommand
+
+from movies.ranking import recompute_rankings
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает взвешенный рейтинг фильмов и лидеров жанров'
+
+    def handle(self, *args, **options):
+        updated, entries = recompute_rankings()
+        self.stdout.write(self.style.SUCCESS(
+            f"Обновлён взвешенный рейтинг: {updated}, лидеров жанров: {entries}"
+        ))
@@ -0,0 +1,77 @@
+"""
+Management command для обновления рейтингов фильмов с Кинопоиска
+Запрашивает только данные фильма и сохраняет изменившиеся рейтинги и число голосов,
+затем пересчитывает взвешенный рейтинг и лидеров жанров.
+Запуск: python manage.py refresh_ratings [--limit 1000] [--every 3600]
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from movies.kinopoisk import KinopoiskService, KinopoiskImportError
+from movies.ranking import recompute_rankings
+
+
+class Command(BaseCommand):
+    help = 'Обновляет рейтинги и число голосов импортированных фильмов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help='Максимум фильмов за запуск')
+        parser.add_argument('--batch-size', type=int, default=100, help='Фильмов в одной пачке')
+        parser.add_argument('--concurrency', type=int, help='Число одновременных запросов')
+        parser.add_argument('--max-age-hours', type=float, default=7 * 24,
+                            help='Через сколько часов данные фильма считаются устаревшими')
+        parser.add_argument('--popular-max-age-hours', type=float, default=24,
+                            help='То же для популярных фильмов')
+        parser.add_argument('--popular-votes', type=int, default=10000,
+                            help='С какого числа голосов фильм считается популярным')
+        parser.add_argument('--every', type=float, help='Повторять каждые N секунд')
+
+    def handle(self, *args, **options):
+        while True:
+            self.refresh(options)
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+            close_old_connections()
+
+    def refresh(self, options):
+        try:
+            service = KinopoiskService()
+        except KinopoiskImportError as e:
+            raise CommandError(str(e))
+
+        queryset = service.movies_to_refresh(
+            max_age=timedelta(hours=options['max_age_hours']),
+            popular_max_age=timedelta(hours=options['popular_max_age_hours']),
+            popular_votes=options['popular_votes'],
+        ).only('id', 'title', 'kinopoisk_id', 'rating', 'vote_count', 'refreshed_at')
+
+        limit = options['limit']
+        checked = updated = 0
+        failed_ids = []
+        started = time.perf_counter()
+        while limit is None or checked < limit:
+            size = options['batch_size'] if limit is None else min(options['batch_size'], limit - checked)
+            movies = list(queryset.exclude(pk__in=failed_ids)[:size])
+            if not movies:
+                break
+
+            result = service.refresh_ratings(movies, concurrency=options['concurrency'])
+            checked += len(movies)
+            updated += len(result.updated)
+            for movie, error in result.failed:
+                failed_ids.append(movie.pk)
+                self.stdout.write(self.style.ERROR(f"✗ {movie.title} ({movie.kinopoisk_id}): {error}"))
+
+        if updated:
+            # Средний рейтинг каталога сдвинулся — пересчитываем всех одним UPDATE
+            recompute_rankings()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Проверено: {checked}, обновлено: {updated}, с ошибками: {len(failed_ids)} "
+            f"({elapsed:.1f} с)"
+        ))
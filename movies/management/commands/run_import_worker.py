@@ -0,0 +1,77 @@
+"""
+Management command — воркер очереди импорта с Кинопоиска
+Забирает задачи ImportJob пачками и импортирует их конкурентно.
+Если API временно недоступно, ждёт, пока цепь не перейдёт к пробному запросу.
+Когда очередь пустеет, пересчитывает похожие фильмы для импортированных.
+Запуск: python manage.py run_import_worker [--once]
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from movies.jobs import claim_jobs, requeue_stale_jobs, run_jobs
+from movies.kinopoisk import get_circuit_breaker
+from movies.models import ImportJob
+from movies.similarity import refresh_stale_similar
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задачи импорта с Кинопоиска из очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Число задач, забираемых за раз')
+        parser.add_argument('--concurrency', type=int, help='Число одновременно загружаемых фильмов')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Пауза при пустой очереди, с')
+        parser.add_argument('--once', action='store_true', help='Выйти, когда очередь опустеет')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or settings.KINOPOISK_IMPORT_BATCH_SIZE
+        self.stdout.write("Воркер импорта запущен")
+
+        while True:
+            try:
+                empty = self.step(batch_size, options)
+            except Exception as e:
+                if options['once']:
+                    raise
+                # Сбой БД и т.п. не останавливает воркер: задачи вернёт requeue_stale_jobs
+                logger.exception("Ошибка воркера импорта")
+                self.stderr.write(self.style.ERROR(f"Ошибка: {e.__class__.__name__}: {e}"))
+                empty = True
+            if empty:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS("Очередь пуста"))
+
+    def step(self, batch_size: int, options) -> bool:
+        """Одна пачка задач; True — очередь пуста"""
+        close_old_connections()
+        requeue_stale_jobs(settings.KINOPOISK_JOB_TIMEOUT, settings.KINOPOISK_JOB_MAX_ATTEMPTS)
+
+        jobs = claim_jobs(batch_size)
+        if not jobs:
+            refresh_stale_similar()
+            return True
+
+        requeued = run_jobs(jobs, concurrency=options['concurrency'])
+        for job in jobs:
+            if job.status == ImportJob.STATUS_DONE:
+                self.stdout.write(f"✓ {job.source}: {job.movie.title}")
+            elif job.status == ImportJob.STATUS_PENDING:
+                self.stdout.write(self.style.WARNING(f"↻ {job.source}: {job.error}"))
+            else:
+                self.stdout.write(self.style.ERROR(f"✗ {job.source}: {job.error}"))
+
+        if requeued:
+            # Пока цепь разомкнута, запросы всё равно будут отклонены
+            delay = max(get_circuit_breaker().retry_after(), options['poll_interval'])
+            self.stdout.write(self.style.WARNING(f"API недоступно, пауза {delay:.0f} с"))
+            time.sleep(delay)
+        return False
@@ -0,0 +1,116 @@
+"""
+Метрики Prometheus на /metrics: задержка и число запросов к БД для каждого
+view и действия DRF, обращения к кэшам (доля попаданий — hit / (hit + miss)),
+запросы клиента Кинопоиска (коды ответов, повторы, задержка) и время compress_image.
+
+Под несколькими воркерами (gunicorn -w, uvicorn --workers) задайте каталог
+PROMETHEUS_MULTIPROC_DIR (пустой при старте): каждый процесс пишет значения
+в свои файлы, а /metrics суммирует их по всем процессам.
+"""
+import hmac
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+REQUEST_LATENCY = Histogram(
+    'catalog_http_request_duration_seconds', 'Время ответа API до начала отдачи тела',
+    ['view', 'method', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUEST_QUERIES = Histogram(
+    'catalog_http_request_db_queries', 'Запросов к БД на запрос API',
+    ['view'],
+    buckets=(0, 1, 2, 3, 4, 5, 7, 10, 15, 20, 30, 50, 100),
+)
+CACHE_REQUESTS = Counter('catalog_cache_requests', 'Обращения к кэшам', ['cache', 'result'])
+KINOPOISK_REQUESTS = Counter('kinopoisk_requests', 'Запросы к API Кинопоиска по коду ответа', ['status'])
+KINOPOISK_RETRIES = Counter('kinopoisk_retries', 'Повторы запросов к API Кинопоиска по причине', ['reason'])
+KINOPOISK_LATENCY = Histogram(
+    'kinopoisk_request_duration_seconds', 'Время ответа API Кинопоиска',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+IMAGE_COMPRESSION = Histogram(
+    'catalog_image_compress_duration_seconds', 'Время сжатия изображения (compress_image)',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+
+def cache_lookup(cache: str, result: str) -> None:
+    """result — hit, miss или revalidated (перепроверка по ETag)"""
+    CACHE_REQUESTS.labels(cache, result).inc()
+
+
+def registry():
+    """Реестр для выдачи: в многопроцессном режиме — сумма файлов всех воркеров"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        collected = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collected)
+        return collected
+    return REGISTRY
+
+
+def metrics_view(request):
+    """GET /metrics в текстовом формате Prometheus (с METRICS_TOKEN — по Bearer-токену)"""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    token = settings.METRICS_TOKEN
+    if token and not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return HttpResponse(status=401)
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+def view_label(view_func) -> str | None:
+    """MovieViewSet.list, MovieViewSet.cast, CatalogExportView.get; None — не учитывать"""
+    if view_func is metrics_view:
+        return None
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    return view_class.__name__
+
+
+class MetricsMiddleware:
+    """Задержка и число запросов к БД на запрос, с меткой view и действия"""
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        if not settings.METRICS_TOKEN and not settings.DEBUG:
+            raise ImproperlyConfigured("METRICS_ENABLED без DEBUG требует METRICS_TOKEN: иначе /metrics открыт всем")
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(None)
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(count_query))
+            response = self.get_response(request)
+        view = getattr(request, '_metrics_view', None)
+        if view is not None:
+            REQUEST_LATENCY.labels(view, request.method, f'{response.status_code // 100}xx').observe(
+                time.perf_counter() - started
+            )
+            REQUEST_QUERIES.labels(view).observe(len(queries))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        label = view_label(view_func)
+        if label is not None:
+            # Действие ViewSet по HTTP-методу (as_view({'get': 'list'})), у APIView — сам метод
+            actions = getattr(view_func, 'actions', None) or {}
+            label = f'{label}.{actions.get(request.method.lower(), request.method.lower())}'
+        request._metrics_view = label
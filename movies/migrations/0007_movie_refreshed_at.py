@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0006_importjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="refreshed_at",
+            field=models.DateTimeField(
+                blank=True,
+                db_index=True,
+                null=True,
+                verbose_name="Данные Кинопоиска обновлены",
+            ),
+        ),
+    ]
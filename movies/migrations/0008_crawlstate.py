@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0007_movie_refreshed_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CrawlState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        max_length=100, unique=True, verbose_name="Название"
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[
+                            ("collection", "Подборка"),
+                            ("filter", "Поиск по фильтрам"),
+                            ("range", "Диапазон ID"),
+                        ],
+                        max_length=20,
+                        verbose_name="Источник",
+                    ),
+                ),
+                (
+                    "params",
+                    models.JSONField(
+                        blank=True, default=dict, verbose_name="Параметры"
+                    ),
+                ),
+                ("position", models.IntegerField(default=1, verbose_name="Позиция")),
+                (
+                    "total_pages",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="Всего страниц"
+                    ),
+                ),
+                (
+                    "finished",
+                    models.BooleanField(default=False, verbose_name="Завершён"),
+                ),
+                ("discovered", models.IntegerField(default=0, verbose_name="Найдено")),
+                (
+                    "skipped",
+                    models.IntegerField(default=0, verbose_name="Уже в каталоге"),
+                ),
+                (
+                    "imported",
+                    models.IntegerField(default=0, verbose_name="Импортировано"),
+                ),
+                (
+                    "not_found",
+                    models.IntegerField(default=0, verbose_name="Нет на Кинопоиске"),
+                ),
+                ("failed", models.IntegerField(default=0, verbose_name="Ошибок")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Создан"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Обновлён"),
+                ),
+            ],
+            options={
+                "verbose_name": "Обход Кинопоиска",
+                "verbose_name_plural": "Обходы Кинопоиска",
+                "ordering": ["-updated_at"],
+            },
+        ),
+    ]
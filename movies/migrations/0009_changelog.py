@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0008_crawlstate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeLog",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "model",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("movie", "Фильм"),
+                            ("actor", "Актёр"),
+                            ("genre", "Жанр"),
+                            ("country", "Страна"),
+                        ],
+                        max_length=20,
+                        verbose_name="Модель",
+                    ),
+                ),
+                (
+                    "object_id",
+                    models.IntegerField(
+                        blank=True, null=True, verbose_name="ID объекта"
+                    ),
+                ),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("upsert", "Создан или изменён"),
+                            ("delete", "Удалён"),
+                            ("reset", "Каталог заменён"),
+                        ],
+                        max_length=10,
+                        verbose_name="Действие",
+                    ),
+                ),
+                (
+                    "changed_at",
+                    models.DateTimeField(
+                        auto_now_add=True, db_index=True, verbose_name="Время изменения"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Изменение каталога",
+                "verbose_name_plural": "Журнал изменений",
+                "ordering": ["id"],
+            },
+        ),
+    ]
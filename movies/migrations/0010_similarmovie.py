@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0009_changelog"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimilarMovie",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.FloatField(verbose_name="Сходство")),
+                ("rank", models.PositiveSmallIntegerField(verbose_name="Место")),
+                (
+                    "movie",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similar_entries",
+                        to="movies.movie",
+                        verbose_name="Фильм",
+                    ),
+                ),
+                (
+                    "similar",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="movies.movie",
+                        verbose_name="Похожий фильм",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Похожий фильм",
+                "verbose_name_plural": "Похожие фильмы",
+                "ordering": ["movie", "rank"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("movie", "rank"), name="movies_similarmovie_rank_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
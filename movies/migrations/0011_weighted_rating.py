@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Avg, ExpressionWrapper, F, FloatField, Q, Value
+from django.db.models.functions import Cast
+
+
+def weighted_rating_expression(mean, min_votes):
+    # Копия movies.ranking.weighted_rating_expression на момент миграции
+    votes = Cast("vote_count", FloatField())
+    return ExpressionWrapper(
+        (votes * F("rating") + Value(float(min_votes * mean)))
+        / (votes + Value(float(min_votes))),
+        output_field=FloatField(),
+    )
+
+
+def fill_weighted_rating(apps, schema_editor):
+    Movie = apps.get_model("movies", "Movie")
+    mean = (
+        Movie.objects.aggregate(mean=Avg("rating", filter=Q(vote_count__gt=0)))["mean"]
+        or 0.0
+    )
+    Movie.objects.update(
+        weighted_rating=weighted_rating_expression(
+            mean, settings.WEIGHTED_RATING_MIN_VOTES
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0010_similarmovie"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="weighted_rating",
+            field=models.FloatField(
+                db_index=True, default=0.0, verbose_name="Взвешенный рейтинг"
+            ),
+        ),
+        migrations.CreateModel(
+            name="GenreTopMovie",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rank", models.PositiveSmallIntegerField(verbose_name="Место")),
+                (
+                    "genre",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="top_entries",
+                        to="movies.genre",
+                        verbose_name="Жанр",
+                    ),
+                ),
+                (
+                    "movie",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="movies.movie",
+                        verbose_name="Фильм",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Лидер жанра",
+                "verbose_name_plural": "Лидеры жанров",
+                "ordering": ["genre", "rank"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("genre", "rank"), name="movies_genretopmovie_rank_uniq"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_weighted_rating, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0011_weighted_rating"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="moviecast",
+            index=models.Index(
+                fields=["actor", "movie"], name="movies_moviecast_actor_idx"
+            ),
+        ),
+    ]
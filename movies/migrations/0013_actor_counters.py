@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:26
+
+from django.db import migrations, models
+from django.db.models import F, Func, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def actor_counter_expressions(movie_model, cast_model):
+    # Копия movies.counters.actor_counter_expressions на момент миграции
+    movies = movie_model.objects.filter(
+        pk__in=cast_model.objects.filter(actor_id=OuterRef(OuterRef("pk"))).values(
+            "movie_id"
+        )
+    ).order_by()
+    count = movies.annotate(value=Func(F("pk"), function="COUNT")).values("value")
+    votes = movies.annotate(value=Func(F("vote_count"), function="SUM")).values("value")
+    return {
+        "movie_count": Coalesce(Subquery(count), Value(0)),
+        "total_votes": Coalesce(Subquery(votes), Value(0)),
+    }
+
+
+def fill_actor_counters(apps, schema_editor):
+    Actor = apps.get_model("movies", "Actor")
+    Actor.objects.update(
+        **actor_counter_expressions(
+            apps.get_model("movies", "Movie"), apps.get_model("movies", "MovieCast")
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0012_moviecast_actor_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="actor",
+            name="movie_count",
+            field=models.IntegerField(db_index=True, default=0, verbose_name="Фильмов"),
+        ),
+        migrations.AddField(
+            model_name="actor",
+            name="total_votes",
+            field=models.BigIntegerField(
+                db_index=True, default=0, verbose_name="Голосов за фильмы"
+            ),
+        ),
+        migrations.RunPython(fill_actor_counters, migrations.RunPython.noop),
+    ]
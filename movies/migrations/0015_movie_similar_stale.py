@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0014_movie_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="similar_stale",
+            field=models.BooleanField(
+                db_index=True, default=False, verbose_name="Похожие фильмы устарели"
+            ),
+        ),
+    ]
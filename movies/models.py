@@ -3,6 +3,9 @@ from django.core.files.base import ContentFile
 from PIL import Image
 from io import BytesIO
 import os
+import time
+
+from .metrics import IMAGE_COMPRESSION
 
 
 def compress_image(image_field, max_size_mb=5, max_resolution=2048):
@@ -14,6 +17,7 @@ def compress_image(image_field, max_size_mb=5, max_resolution=2048):
     if not image_field:
         return image_field
     
+    started = time.perf_counter()
     img = Image.open(image_field)
     
     # Конвертируем в RGB если нужно (для JPEG)
@@ -44,7 +48,9 @@ def compress_image(image_field, max_size_mb=5, max_resolution=2048):
     # Меняем расширение на .jpg
     name = os.path.splitext(image_field.name)[0] + '.jpg'
     
-    return ContentFile(buffer.read(), name=name)
+    compressed = ContentFile(buffer.read(), name=name)
+    IMAGE_COMPRESSION.observe(time.perf_counter() - started)
+    return compressed
 
 
 class Genre(models.Model):
@@ -95,6 +101,9 @@ class Actor(models.Model):
         null=True, 
         verbose_name="Кинопоиск ID"
     )
+    # Счётчики по фильмам актёра (см. movies/counters.py)
+    movie_count = models.IntegerField(default=0, db_index=True, verbose_name="Фильмов")
+    total_votes = models.BigIntegerField(default=0, db_index=True, verbose_name="Голосов за фильмы")
 
     class Meta:
         verbose_name = "Актёр"
@@ -105,8 +114,8 @@ class Actor(models.Model):
         return self.name
 
     def save(self, *args, **kwargs):
-        # Сжимаем изображение при сохранении
-        if self.profile_image:
+        # Сжимаем только что загруженное изображение (уже сохранённое не пережимаем)
+        if self.profile_image and not self.profile_image._committed:
             self.profile_image = compress_image(self.profile_image)
         super().save(*args, **kwargs)
 
@@ -148,6 +157,8 @@ class Movie(models.Model):
     rating = models.FloatField(default=0.0, verbose_name="Рейтинг")
     release_date = models.DateField(verbose_name="Дата выхода")
     vote_count = models.IntegerField(default=0, verbose_name="Количество голосов")
+    # Байесовская оценка по rating и vote_count (см. movies/ranking.py)
+    weighted_rating = models.FloatField(default=0.0, db_index=True, verbose_name="Взвешенный рейтинг")
     genres = models.ManyToManyField(Genre, related_name='movies', verbose_name="Жанры")
     
     # Новые поля
@@ -170,20 +181,36 @@ class Movie(models.Model):
     )
     countries = models.ManyToManyField(Country, related_name='movies', verbose_name="Страны", blank=True)
     trailer_url = models.URLField(blank=True, null=True, verbose_name="Ссылка на трейлер")
+    refreshed_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        db_index=True,
+        verbose_name="Данные Кинопоиска обновлены"
+    )
+    # Фильм импортирован после построения индекса похожих (similarity.refresh_stale_similar)
+    similar_stale = models.BooleanField(default=False, db_index=True, verbose_name="Похожие фильмы устарели")
 
     class Meta:
         verbose_name = "Фильм"
         verbose_name_plural = "Фильмы"
         ordering = ['-release_date']
+        indexes = [
+            # Сортировка по умолчанию и диапазоны годов (filters.MovieFilter)
+            models.Index(fields=['release_date'], name='movies_movie_release_idx'),
+            models.Index(fields=['rating'], name='movies_movie_rating_idx'),
+            models.Index(fields=['type'], name='movies_movie_type_idx'),
+            models.Index(fields=['age_rating'], name='movies_movie_age_rating_idx'),
+            models.Index(fields=['film_length'], name='movies_movie_length_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
     def save(self, *args, **kwargs):
-        # Сжимаем изображения при сохранении
-        if self.poster_image:
+        # Сжимаем только что загруженные изображения (уже сохранённые не пережимаем)
+        if self.poster_image and not self.poster_image._committed:
             self.poster_image = compress_image(self.poster_image)
-        if self.backdrop_image:
+        if self.backdrop_image and not self.backdrop_image._committed:
             self.backdrop_image = compress_image(self.backdrop_image)
         super().save(*args, **kwargs)
 
@@ -220,6 +247,10 @@ class MovieCast(models.Model):
         verbose_name = "Роль"
         verbose_name_plural = "Актёрский состав"
         ordering = ['order']
+        indexes = [
+            # Фильмография актёра: WHERE actor_id = ? с переходом к фильмам
+            models.Index(fields=['actor', 'movie'], name='movies_moviecast_actor_idx'),
+        ]
 
     def __str__(self):
         return f"{self.actor.name} как {self.character}"
@@ -247,6 +278,189 @@ class MovieSource(models.Model):
         return f"{self.name} ({self.movie.title})"
 
 
+class ImportJob(models.Model):
+    """Задача импорта фильма с Кинопоиска (очередь для воркера run_import_worker)"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Импортирован'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+    FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED)
+
+    source = models.CharField(max_length=500, verbose_name="URL или ID")
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+        verbose_name="Статус"
+    )
+    movie = models.ForeignKey(
+        Movie,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='import_jobs',
+        verbose_name="Фильм"
+    )
+    error = models.TextField(blank=True, null=True, verbose_name="Ошибка")
+    attempts = models.IntegerField(default=0, verbose_name="Попыток")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создана")
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name="Начата")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="Завершена")
+
+    class Meta:
+        verbose_name = "Задача импорта"
+        verbose_name_plural = "Задачи импорта"
+        ordering = ['-created_at']
+        indexes = [
+            # Выборка очереди воркером: WHERE status = 'pending' ORDER BY created_at
+            models.Index(fields=['status', 'created_at'], name='movies_importjob_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.source} ({self.get_status_display()})"
+
+
+class CrawlState(models.Model):
+    """Состояние обхода каталога Кинопоиска: позволяет продолжить обход после остановки"""
+    SOURCE_COLLECTION = 'collection'
+    SOURCE_FILTER = 'filter'
+    SOURCE_RANGE = 'range'
+    SOURCE_CHOICES = [
+        (SOURCE_COLLECTION, 'Подборка'),
+        (SOURCE_FILTER, 'Поиск по фильтрам'),
+        (SOURCE_RANGE, 'Диапазон ID'),
+    ]
+
+    name = models.CharField(max_length=100, unique=True, verbose_name="Название")
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, verbose_name="Источник")
+    params = models.JSONField(default=dict, blank=True, verbose_name="Параметры")
+    # Номер следующей страницы (подборка, фильтры) или следующий ID (диапазон)
+    position = models.IntegerField(default=1, verbose_name="Позиция")
+    total_pages = models.IntegerField(blank=True, null=True, verbose_name="Всего страниц")
+    finished = models.BooleanField(default=False, verbose_name="Завершён")
+    discovered = models.IntegerField(default=0, verbose_name="Найдено")
+    skipped = models.IntegerField(default=0, verbose_name="Уже в каталоге")
+    imported = models.IntegerField(default=0, verbose_name="Импортировано")
+    not_found = models.IntegerField(default=0, verbose_name="Нет на Кинопоиске")
+    failed = models.IntegerField(default=0, verbose_name="Ошибок")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создан")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлён")
+
+    class Meta:
+        verbose_name = "Обход Кинопоиска"
+        verbose_name_plural = "Обходы Кинопоиска"
+        ordering = ['-updated_at']
+
+    def __str__(self):
+        return self.name
+
+
+class ChangeLog(models.Model):
+    """
+    Журнал изменений каталога для дельта-синхронизации (/api/changes/).
+    ID растёт монотонно и служит версией: клиент запрашивает изменения после
+    последней полученной версии.
+    """
+    ACTION_UPSERT = 'upsert'
+    ACTION_DELETE = 'delete'
+    # Каталог заменён целиком (import_catalog) — клиенту нужна полная синхронизация
+    ACTION_RESET = 'reset'
+    ACTION_CHOICES = [
+        (ACTION_UPSERT, 'Создан или изменён'),
+        (ACTION_DELETE, 'Удалён'),
+        (ACTION_RESET, 'Каталог заменён'),
+    ]
+
+    MODEL_MOVIE = 'movie'
+    MODEL_ACTOR = 'actor'
+    MODEL_GENRE = 'genre'
+    MODEL_COUNTRY = 'country'
+    MODEL_CHOICES = [
+        (MODEL_MOVIE, 'Фильм'),
+        (MODEL_ACTOR, 'Актёр'),
+        (MODEL_GENRE, 'Жанр'),
+        (MODEL_COUNTRY, 'Страна'),
+    ]
+
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES, blank=True, verbose_name="Модель")
+    object_id = models.IntegerField(blank=True, null=True, verbose_name="ID объекта")
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, verbose_name="Действие")
+    changed_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Время изменения")
+
+    class Meta:
+        verbose_name = "Изменение каталога"
+        verbose_name_plural = "Журнал изменений"
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.pk} {self.model} {self.object_id} ({self.get_action_display()})"
+
+
+class SimilarMovie(models.Model):
+    """Предрассчитанные похожие фильмы (см. movies/similarity.py): top-K соседей на фильм"""
+    movie = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='similar_entries',
+        verbose_name="Фильм"
+    )
+    similar = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Похожий фильм"
+    )
+    score = models.FloatField(verbose_name="Сходство")
+    rank = models.PositiveSmallIntegerField(verbose_name="Место")
+
+    class Meta:
+        verbose_name = "Похожий фильм"
+        verbose_name_plural = "Похожие фильмы"
+        ordering = ['movie', 'rank']
+        constraints = [
+            # Выдача /api/movies/{id}/similar/ — сканирование индекса по (movie, rank)
+            models.UniqueConstraint(fields=['movie', 'rank'], name='movies_similarmovie_rank_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.movie_id} → {self.similar_id} ({self.score:.3f})"
+
+
+class GenreTopMovie(models.Model):
+    """Лидеры жанра по взвешенному рейтингу (пересчитывается в movies/ranking.py)"""
+    genre = models.ForeignKey(
+        Genre,
+        on_delete=models.CASCADE,
+        related_name='top_entries',
+        verbose_name="Жанр"
+    )
+    movie = models.ForeignKey(
+        Movie,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Фильм"
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name="Место")
+
+    class Meta:
+        verbose_name = "Лидер жанра"
+        verbose_name_plural = "Лидеры жанров"
+        ordering = ['genre', 'rank']
+        constraints = [
+            # Выдача /api/genres/{id}/top/ — сканирование индекса по (genre, rank)
+            models.UniqueConstraint(fields=['genre', 'rank'], name='movies_genretopmovie_rank_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.genre_id} #{self.rank}: {self.movie_id}"
+
+
 from solo.models import SingletonModel
 
 class SiteSettings(SingletonModel):
@@ -0,0 +1,136 @@
+"""
+Конвейер импорта: загрузка из сети и запись в БД идут одновременно.
+Стадия загрузки работает в фоновом event loop (http_pool.loop) и кладёт
+результаты в ограниченную очередь; писатель в вызывающем потоке забирает
+их и сохраняет пачками. Когда очередь заполнена, загрузка приостанавливается
+(обратное давление), поэтому память не растёт, если БД не успевает.
+"""
+import asyncio
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+from . import http_pool
+
+_DONE = object()
+
+
+@dataclass
+class PipelineStats:
+    """Время по стадиям конвейера, в секундах"""
+    fetched: int = 0
+    batches: int = 0
+    # Суммарное время загрузок (по всем одновременным запросам)
+    fetch_time: float = 0.0
+    # Время работы писателя с БД
+    write_time: float = 0.0
+    # Писатель ждал данных из сети — узкое место в загрузке
+    write_wait: float = 0.0
+    # Загрузка ждала места в очереди — узкое место в БД
+    backpressure_wait: float = 0.0
+    elapsed: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Элементов в секунду"""
+        return self.fetched / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.fetched} за {self.elapsed:.2f} с ({self.rate:.1f}/с): "
+            f"загрузка {self.fetch_time:.2f} с, запись {self.write_time:.2f} с в {self.batches} пачках, "
+            f"ожидание сети {self.write_wait:.2f} с, ожидание БД {self.backpressure_wait:.2f} с"
+        )
+
+
+class ImportPipeline:
+    """
+    fetch(key) — корутина загрузки, выполняется в фоновом loop;
+    write(batch) — сохранение списка пар (key, данные или исключение)
+    в вызывающем потоке. Ошибки загрузки передаются писателю, а не прерывают конвейер.
+    """
+
+    def __init__(self, fetch, write, concurrency: int, batch_size: int, queue_size: int = None):
+        self.fetch = fetch
+        self.write = write
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.queue_size = queue_size or 2 * self.batch_size
+        self.stats = PipelineStats()
+
+    def run(self, keys: list) -> PipelineStats:
+        self.stats = PipelineStats()
+        started = time.perf_counter()
+        items = queue.Queue(maxsize=self.queue_size)
+        stopped = threading.Event()
+        producer = http_pool.loop.submit(self._produce(keys, items, stopped))
+        try:
+            self._consume(items)
+        finally:
+            # Писатель упал — останавливаем загрузку, чтобы она не ждала места в очереди
+            stopped.set()
+            producer.result()
+        self.stats.elapsed = time.perf_counter() - started
+        return self.stats
+
+    async def _produce(self, keys: list, items: queue.Queue, stopped: threading.Event) -> None:
+        pending = iter(keys)
+
+        async def worker():
+            for key in pending:
+                if stopped.is_set():
+                    return
+                fetch_started = time.perf_counter()
+                try:
+                    data = await self.fetch(key)
+                except Exception as e:
+                    data = e
+                self.stats.fetch_time += time.perf_counter() - fetch_started
+                await self._put(items, (key, data), stopped)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        finally:
+            await self._put(items, _DONE, stopped)
+
+    async def _put(self, items: queue.Queue, item, stopped: threading.Event) -> None:
+        try:
+            items.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        wait_started = time.perf_counter()
+        await asyncio.to_thread(self._put_blocking, items, item, stopped)
+        self.stats.backpressure_wait += time.perf_counter() - wait_started
+
+    @staticmethod
+    def _put_blocking(items: queue.Queue, item, stopped: threading.Event) -> None:
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _consume(self, items: queue.Queue) -> None:
+        batch = []
+        while True:
+            wait_started = time.perf_counter()
+            item = items.get()
+            self.stats.write_wait += time.perf_counter() - wait_started
+            if item is _DONE:
+                break
+            self.stats.fetched += 1
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch: list) -> None:
+        write_started = time.perf_counter()
+        self.write(batch)
+        self.stats.write_time += time.perf_counter() - write_started
+        self.stats.batches += 1
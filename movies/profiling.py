@@ -0,0 +1,220 @@
+"""
+Профилирование запросов API (включается REQUEST_PROFILING). На каждый запрос
+считаются общее время, время и число запросов к БД, повторяющиеся запросы
+(один SQL несколько раз — признак N+1), время сериализации и размер ответа.
+Итог отдаётся в заголовке Server-Timing (виден во вкладке Network браузера)
+и пишется JSON-строкой в лог movies.profiling: доля запросов по выборке,
+а медленные и с повторами — всегда. С заголовком X-Profile: <токен> запрос
+выполняется под профайлером и дамп сохраняется в REQUEST_PROFILING_DIR.
+
+Выключенный middleware бросает MiddlewareNotUsed и не попадает в цепочку.
+Запросы к БД при чтении потокового ответа (выгрузка каталога) уже не учитываются.
+"""
+import cProfile
+import hmac
+import json
+import logging
+import random
+import re
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from importlib.util import find_spec
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+_current = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """Замеры одного запроса"""
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.queries = Counter()
+        self.stages = defaultdict(float)
+        self._active = set()
+
+    def record_query(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            # SQL с плейсхолдерами: одинаковый для разных параметров
+            self.queries[sql] += 1
+
+    @contextmanager
+    def stage(self, name: str):
+        # Вложенный замер того же этапа (сериализатор внутри сериализатора) не считается дважды
+        if name in self._active:
+            yield
+            return
+        self._active.add(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - started
+            self._active.discard(name)
+
+    @property
+    def query_count(self) -> int:
+        return sum(self.queries.values())
+
+    def duplicates(self, threshold: int) -> list[tuple[str, int]]:
+        """SQL, выполненные не меньше threshold раз, по убыванию числа повторов"""
+        return [(sql, count) for sql, count in self.queries.most_common() if count >= threshold]
+
+
+@contextmanager
+def timed(stage: str):
+    """Засекает этап текущего запроса (вне профилируемого запроса ничего не делает)"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    with profile.stage(stage):
+        yield
+
+
+def install_serializer_timing() -> None:
+    """Учитывать BaseSerializer.data как этап serialize (в том числе N+1 внутри сериализаторов)"""
+    from rest_framework.serializers import BaseSerializer
+
+    original = BaseSerializer.data.fget
+    if getattr(original, 'profiled', False):
+        return
+
+    def data(self):
+        with timed('serialize'):
+            return original(self)
+
+    data.profiled = True
+    BaseSerializer.data = property(data)
+
+
+class RequestProfilingMiddleware:
+    header = 'HTTP_X_PROFILE'
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        if settings.REQUEST_PROFILER not in PROFILERS:
+            raise ImproperlyConfigured(f"REQUEST_PROFILER: ожидается одно из {', '.join(PROFILERS)}")
+        if settings.REQUEST_PROFILER == 'pyinstrument' and find_spec('pyinstrument') is None:
+            raise ImproperlyConfigured("Для REQUEST_PROFILER=pyinstrument установите пакет pyinstrument")
+        self.get_response = get_response
+        install_serializer_timing()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        profiler = self.make_profiler(request)
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                # Обёртка ставится на объект соединения потока, само соединение не открывается
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(profile.record_query))
+                if profiler is not None:
+                    profiler.start()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler is not None:
+                        profiler.stop()
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+
+        duplicates = profile.duplicates(settings.REQUEST_PROFILING_DUPLICATE_THRESHOLD)
+        response['Server-Timing'] = self.server_timing(profile, total, duplicates)
+        if profiler is not None:
+            response['X-Profile-File'] = profiler.dump(request).name
+        self.log(request, response, profile, total, duplicates)
+        return response
+
+    def make_profiler(self, request):
+        token = settings.REQUEST_PROFILING_TOKEN
+        value = request.META.get(self.header)
+        if not token or not value or not hmac.compare_digest(value.encode(), token.encode()):
+            return None
+        return Profiler(settings.REQUEST_PROFILER)
+
+    @staticmethod
+    def server_timing(profile: RequestProfile, total: float, duplicates) -> str:
+        queries = f'{profile.query_count} queries'
+        if duplicates:
+            queries += f' ({sum(count for _, count in duplicates)} repeated)'
+        metrics = [f'total;dur={total * 1000:.1f}', f'db;dur={profile.db_time * 1000:.1f};desc="{queries}"']
+        metrics += [f'{name};dur={duration * 1000:.1f}' for name, duration in sorted(profile.stages.items())]
+        return ', '.join(metrics)
+
+    @staticmethod
+    def log(request, response, profile: RequestProfile, total: float, duplicates):
+        slow = total * 1000 >= settings.REQUEST_PROFILING_SLOW_MS
+        if not (slow or duplicates or random.random() < settings.REQUEST_PROFILING_SAMPLE_RATE):
+            return
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(profile.db_time * 1000, 2),
+            'queries': profile.query_count,
+            'stages_ms': {name: round(duration * 1000, 2) for name, duration in profile.stages.items()},
+            'response_bytes': None if response.streaming else len(response.content),
+            'duplicates': [{'sql': sql[:300], 'count': count} for sql, count in duplicates],
+        }
+        level = logging.WARNING if slow or duplicates else logging.INFO
+        logger.log(level, json.dumps(record, ensure_ascii=False))
+
+
+class Profiler:
+    """cProfile (.prof, смотреть snakeviz/pstats) или pyinstrument (.html)"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        if kind == 'pyinstrument':
+            from pyinstrument import Profiler as PyinstrumentProfiler
+            self._profiler = PyinstrumentProfiler()
+        else:
+            self._profiler = cProfile.Profile()
+
+    def start(self):
+        if self.kind == 'pyinstrument':
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self):
+        if self.kind == 'pyinstrument':
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def dump(self, request) -> Path:
+        directory = Path(settings.REQUEST_PROFILING_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r'[^\w-]+', '-', request.path).strip('-')[:80] or 'root'
+        suffix = 'html' if self.kind == 'pyinstrument' else 'prof'
+        path = directory / f"{timezone.now():%Y%m%d-%H%M%S}-{request.method}-{slug}-{uuid.uuid4().hex[:6]}.{suffix}"
+        if self.kind == 'pyinstrument':
+            path.write_text(self._profiler.output_html(), encoding='utf-8')
+        else:
+            self._profiler.dump_stats(path)
+        return path
@@ -0,0 +1,107 @@
+"""
+Взвешенный рейтинг (байесовское среднее, как в топе IMDb) и лидеры жанров.
+WR = (v · R + m · C) / (v + m), где R — рейтинг фильма, v — число голосов,
+m — «порог доверия» (WEIGHTED_RATING_MIN_VOTES), C — средний рейтинг каталога.
+У фильма с тремя голосами оценка близка к C, у классики с десятками тысяч — к R.
+"""
+import logging
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, ExpressionWrapper, F, FloatField, Q, Value
+from django.db.models.functions import Cast
+
+from .counters import update_actor_counters
+from .models import Movie, GenreTopMovie
+from .snapshot import load_rows
+
+logger = logging.getLogger(__name__)
+
+
+def weighted_rating_expression(mean: float, min_votes: int):
+    """SQL-выражение WR для UPDATE (не зависит от модели; миграция 0011 хранит свою копию)"""
+    votes = Cast('vote_count', FloatField())
+    return ExpressionWrapper(
+        (votes * F('rating') + Value(float(min_votes * mean))) / (votes + Value(float(min_votes))),
+        output_field=FloatField(),
+    )
+
+
+def mean_rating() -> float:
+    """C — средний рейтинг фильмов, у которых есть голоса"""
+    return Movie.objects.aggregate(mean=Avg('rating', filter=Q(vote_count__gt=0)))['mean'] or 0.0
+
+
+def update_weighted_ratings(movie_ids=None) -> int:
+    """
+    Пересчитывает weighted_rating одним UPDATE (всех фильмов или movie_ids);
+    строки с неизменившимся значением не перезаписываются. Возвращает число обновлённых.
+    """
+    expression = weighted_rating_expression(mean_rating(), settings.WEIGHTED_RATING_MIN_VOTES)
+    queryset = Movie.objects.all()
+    if movie_ids is not None:
+        queryset = queryset.filter(pk__in=list(movie_ids))
+    return queryset.exclude(weighted_rating=expression).update(weighted_rating=expression)
+
+
+def rebuild_genre_top(size: int = None, genre_ids=None) -> int:
+    """
+    Пересобирает лидеров жанров (всех или genre_ids): top-size фильмов с голосами
+    в каждом жанре. Связи читаются одним запросом, сортировка и отбор по жанрам — в NumPy.
+    """
+    size = size or settings.GENRE_TOP_SIZE
+    links = Movie.genres.through.objects.filter(movie__vote_count__gt=0)
+    entries = GenreTopMovie.objects.all()
+    if genre_ids is not None:
+        genre_ids = list(genre_ids)
+        links = links.filter(genre_id__in=genre_ids)
+        entries = entries.filter(genre_id__in=genre_ids)
+    links = np.array(
+        list(links.values_list('genre_id', 'movie_id', 'movie__weighted_rating')),
+        dtype=np.float64,
+    ).reshape(-1, 3)
+    genres, movies, scores = links[:, 0].astype(np.int64), links[:, 1].astype(np.int64), links[:, 2]
+
+    # По жанру, внутри — по убыванию оценки, при равенстве — по ID фильма
+    order = np.lexsort((movies, -scores, genres))
+    genres, movies = genres[order], movies[order]
+    starts = np.flatnonzero(np.r_[True, genres[1:] != genres[:-1]])
+    ranks = np.arange(len(genres)) - np.repeat(starts, np.diff(np.r_[starts, len(genres)])) + 1
+    keep = ranks <= size
+
+    rows = list(zip(genres[keep].tolist(), movies[keep].tolist(), ranks[keep].tolist()))
+    with transaction.atomic():
+        entries.delete()
+        load_rows(GenreTopMovie, ['genre', 'movie', 'rank'], rows)
+    return len(rows)
+
+
+def refresh_genre_top(movie_ids) -> int:
+    """
+    Пересобирает лидеров жанров, которые могли измениться из-за импорта movie_ids:
+    жанров этих фильмов и тех, где фильмы уже в списке (жанр могли убрать)
+    """
+    movie_ids = list(movie_ids)
+    genre_ids = set(Movie.genres.through.objects.filter(movie_id__in=movie_ids).values_list('genre_id', flat=True))
+    genre_ids.update(GenreTopMovie.objects.filter(movie_id__in=movie_ids).values_list('genre_id', flat=True))
+    if not genre_ids:
+        return 0
+    return rebuild_genre_top(genre_ids=genre_ids)
+
+
+def recompute_rankings() -> tuple[int, int]:
+    """
+    Полный пересчёт: взвешенный рейтинг всех фильмов, лидеры жанров
+    и счётчики актёров (сумма голосов зависит от рейтингов фильмов)
+    """
+    started = time.perf_counter()
+    updated = update_weighted_ratings()
+    entries = rebuild_genre_top()
+    actors = update_actor_counters()
+    logger.info(
+        "Взвешенный рейтинг: обновлено %d фильмов, лидеров жанров %d, счётчики %d актёров за %.2f с",
+        updated, entries, actors, time.perf_counter() - started,
+    )
+    return updated, entries
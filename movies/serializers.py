@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Movie, Genre, Actor, MovieCast, Country, MovieSource
+from .models import Movie, Genre, Actor, MovieCast, Country, MovieSource, SimilarMovie
 
 
 class GenreSerializer(serializers.ModelSerializer):
@@ -16,6 +16,22 @@ class CountrySerializer(serializers.ModelSerializer):
         fields = ['id', 'name']
 
 
+class GenreCountSerializer(GenreSerializer):
+    """Жанр с числом фильмов (список /api/genres/)"""
+    movie_count = serializers.IntegerField(read_only=True)
+
+    class Meta(GenreSerializer.Meta):
+        fields = GenreSerializer.Meta.fields + ['movie_count']
+
+
+class CountryCountSerializer(CountrySerializer):
+    """Страна с числом фильмов (список /api/countries/)"""
+    movie_count = serializers.IntegerField(read_only=True)
+
+    class Meta(CountrySerializer.Meta):
+        fields = CountrySerializer.Meta.fields + ['movie_count']
+
+
 class MovieSourceSerializer(serializers.ModelSerializer):
     """Сериализатор для источников"""
     class Meta:
@@ -29,7 +45,7 @@ class ActorSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Actor
-        fields = ['id', 'name', 'profile_path', 'kinopoisk_id']
+        fields = ['id', 'name', 'profile_path', 'kinopoisk_id', 'movie_count', 'total_votes']
 
     def get_profile_path(self, obj):
         return obj.get_profile_url()
@@ -66,7 +82,8 @@ class MovieListSerializer(serializers.ModelSerializer):
         ]
 
     def get_genre_ids(self, obj):
-        return list(obj.genres.values_list('id', flat=True))
+        # .all() берёт жанры из prefetch_related, если они загружены заранее
+        return [genre.id for genre in obj.genres.all()]
 
     def get_poster_path(self, obj):
         return obj.get_poster_url()
@@ -75,6 +92,15 @@ class MovieListSerializer(serializers.ModelSerializer):
         return obj.get_backdrop_url()
 
 
+class FilmographySerializer(MovieListSerializer):
+    """Фильм в фильмографии актёра: поля списка фильмов и роль (character, order берутся из MovieCast)"""
+    character = serializers.CharField(read_only=True)
+    order = serializers.IntegerField(read_only=True)
+
+    class Meta(MovieListSerializer.Meta):
+        fields = MovieListSerializer.Meta.fields + ['character', 'order']
+
+
 class MovieDetailSerializer(serializers.ModelSerializer):
     """Сериализатор для деталей фильма"""
     genres = GenreSerializer(many=True, read_only=True)
@@ -94,9 +120,8 @@ class MovieDetailSerializer(serializers.ModelSerializer):
         ]
 
     def get_cast(self, obj):
-        # Получаем cast отсортированный по order
-        cast = MovieCast.objects.filter(movie=obj).select_related('actor').order_by('order')
-        return MovieCastSerializer(cast, many=True).data
+        # .all() берёт состав из prefetch_related (MovieViewSet.get_queryset), порядок — Meta.ordering
+        return MovieCastSerializer(obj.cast.all(), many=True).data
 
     def get_poster_path(self, obj):
         return obj.get_poster_url()
@@ -104,3 +129,64 @@ class MovieDetailSerializer(serializers.ModelSerializer):
     def get_backdrop_path(self, obj):
         return obj.get_backdrop_url()
 
+
+class SimilarMovieSerializer(serializers.ModelSerializer):
+    """Похожий фильм с оценкой сходства"""
+    movie = MovieListSerializer(source='similar', read_only=True)
+
+    class Meta:
+        model = SimilarMovie
+        fields = ['movie', 'score']
+
+
+class DeletedIdsSerializer(serializers.Serializer):
+    """ID удалённых объектов по типам (для документации /api/changes/)"""
+    movies = serializers.ListField(child=serializers.IntegerField())
+    actors = serializers.ListField(child=serializers.IntegerField())
+    genres = serializers.ListField(child=serializers.IntegerField())
+    countries = serializers.ListField(child=serializers.IntegerField())
+
+
+class ChangesSerializer(serializers.Serializer):
+    """Ответ /api/changes/ (для документации)"""
+    version = serializers.IntegerField()
+    has_more = serializers.BooleanField()
+    reset = serializers.BooleanField()
+    movies = MovieListSerializer(many=True)
+    actors = ActorSerializer(many=True)
+    genres = GenreSerializer(many=True)
+    countries = CountrySerializer(many=True)
+    deleted = DeletedIdsSerializer()
+
+
+class NamedFacetSerializer(serializers.Serializer):
+    """Значение фасета со ссылкой на объект (жанр, страна)"""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class ValueFacetSerializer(serializers.Serializer):
+    """Значение фасета по полю фильма (год, возрастной рейтинг)"""
+    value = serializers.IntegerField(allow_null=True)
+    count = serializers.IntegerField()
+
+
+class RatingFacetSerializer(serializers.Serializer):
+    """Диапазон рейтинга [from, to)"""
+    count = serializers.IntegerField()
+
+    def get_fields(self):
+        # from — ключевое слово Python, атрибутом класса поле не объявить
+        fields = super().get_fields()
+        return {'from': serializers.IntegerField(), 'to': serializers.IntegerField(), **fields}
+
+
+class MovieFacetsSerializer(serializers.Serializer):
+    """Ответ /api/movies/facets/ (для документации)"""
+    total = serializers.IntegerField()
+    genres = NamedFacetSerializer(many=True)
+    countries = NamedFacetSerializer(many=True)
+    years = ValueFacetSerializer(many=True)
+    age_ratings = ValueFacetSerializer(many=True)
+    ratings = RatingFacetSerializer(many=True)
@@ -0,0 +1,175 @@
+"""
+Индекс похожих фильмов. Каждый фильм — разреженный вектор признаков
+(жанры, страны, первые актёры состава) с весами IDF: общий редкий актёр
+значит больше общего жанра «драма». Сходство — косинус векторов плюс
+близость рейтингов; top-K соседей на фильм хранится в SimilarMovie,
+поэтому выдача — одно чтение по индексу (movie, rank).
+
+Загрузка матрицы признаков — основная цена обновления, поэтому импорт
+только помечает фильмы (Movie.similar_stale), а пересчёт идёт пачкой:
+воркер очереди, когда она опустеет, команды импорта по завершении или
+build_similar_movies --stale по расписанию.
+"""
+import logging
+import time
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db import transaction
+
+from .models import Movie, MovieCast, SimilarMovie
+from .snapshot import load_rows
+
+logger = logging.getLogger(__name__)
+
+# Веса групп признаков
+GENRE_WEIGHT = 1.0
+COUNTRY_WEIGHT = 0.5
+CAST_WEIGHT = 1.5
+# Вклад близости рейтингов (учитывается только при общих признаках)
+RATING_WEIGHT = 0.2
+# Сколько первых актёров состава учитывать (эпизодические роли только шумят)
+CAST_DEPTH = 15
+
+
+class FeatureMatrix:
+    """Векторы признаков всех фильмов: строка i соответствует фильму ids[i]"""
+
+    def __init__(self, ids: np.ndarray, ratings: np.ndarray, vectors: sparse.csr_matrix):
+        self.ids = ids
+        self.ratings = ratings
+        self.vectors = vectors
+        self._transposed = None
+
+    @classmethod
+    def load(cls) -> 'FeatureMatrix':
+        rows = list(Movie.objects.order_by('pk').values_list('pk', 'rating'))
+        ids = np.array([pk for pk, _ in rows], dtype=np.int64)
+        ratings = np.array([rating for _, rating in rows], dtype=np.float64)
+        groups = [
+            (Movie.genres.through.objects.values_list('movie_id', 'genre_id'), GENRE_WEIGHT),
+            (Movie.countries.through.objects.values_list('movie_id', 'country_id'), COUNTRY_WEIGHT),
+            (MovieCast.objects.filter(order__lt=CAST_DEPTH).values_list('movie_id', 'actor_id'), CAST_WEIGHT),
+        ]
+        blocks = [cls._group_matrix(ids, pairs, weight) for pairs, weight in groups]
+        vectors = sparse.hstack(blocks, format='csr') if blocks else sparse.csr_matrix((len(ids), 0))
+        # Нормировка строк: скалярное произведение становится косинусом
+        norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+        scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        return cls(ids, ratings, (sparse.diags(scale) @ vectors).tocsr())
+
+    @staticmethod
+    def _group_matrix(ids: np.ndarray, pairs, weight: float) -> sparse.csr_matrix:
+        pairs = np.array(list(pairs), dtype=np.int64).reshape(-1, 2)
+        values, columns = np.unique(pairs[:, 1], return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(pairs)), (np.searchsorted(ids, pairs[:, 0]), columns)),
+            shape=(len(ids), len(values)),
+        )
+        # Актёр с двумя ролями в фильме — один признак
+        matrix.sum_duplicates()
+        matrix.data[:] = 1.0
+        document_frequency = np.diff(matrix.tocsc().indptr)
+        idf = np.log((1 + len(ids)) / (1 + document_frequency)) + 1
+        # Признак только одного фильма ни с чем не совпадает, но увеличил бы норму
+        # вектора и занизил косинус — например, актёры, сыгравшие в одном фильме каталога
+        idf[document_frequency < 2] = 0
+        return matrix @ sparse.diags(idf * weight)
+
+    def rows(self, movie_ids) -> np.ndarray:
+        """Номера строк для ID фильмов (отсутствующие пропускаются)"""
+        movie_ids = np.asarray(sorted(movie_ids), dtype=np.int64)
+        positions = np.searchsorted(self.ids, movie_ids)
+        positions = positions[positions < len(self.ids)]
+        return positions[np.isin(self.ids[positions], movie_ids)]
+
+    def neighbours(self, rows, k: int, block_size: int = 200):
+        """
+        top-K соседей для строк rows: пары (строка, строки соседей, оценки),
+        соседи по убыванию оценки. Произведение считается блоками по block_size строк,
+        чтобы ограничить память (строка жанра «драма» пересекается с половиной каталога).
+        """
+        if self._transposed is None:
+            self._transposed = self.vectors.T.tocsr()
+        rows = np.asarray(rows)
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            products = (self.vectors[block] @ self._transposed).tocsr()
+            for i, row in enumerate(block):
+                lo, hi = products.indptr[i], products.indptr[i + 1]
+                columns, cosine = products.indices[lo:hi], products.data[lo:hi]
+                keep = columns != row
+                columns, cosine = columns[keep], cosine[keep]
+                scores = cosine + RATING_WEIGHT * (1 - np.abs(self.ratings[columns] - self.ratings[row]) / 10)
+                if len(columns) > k:
+                    top = np.argpartition(-scores, k - 1)[:k]
+                    columns, scores = columns[top], scores[top]
+                # При равной оценке — меньший ID, чтобы порядок был стабильным
+                order = np.lexsort((self.ids[columns], -scores))
+                yield row, columns[order], scores[order]
+
+
+def _write(features: FeatureMatrix, rows, k: int, block_size: int) -> int:
+    records = []
+    for row, columns, scores in features.neighbours(rows, k, block_size):
+        movie_id = int(features.ids[row])
+        records.extend(
+            (movie_id, int(features.ids[column]), float(score), rank)
+            for rank, (column, score) in enumerate(zip(columns, scores), start=1)
+        )
+    load_rows(SimilarMovie, ['movie', 'similar', 'score', 'rank'], records)
+    return len(records)
+
+
+def rebuild_similar(k: int = None, block_size: int = 200) -> int:
+    """Полный пересчёт индекса; возвращает число записей"""
+    k = k or settings.SIMILAR_MOVIES_TOP_K
+    started = time.perf_counter()
+    features = FeatureMatrix.load()
+    with transaction.atomic():
+        SimilarMovie.objects.all().delete()
+        count = _write(features, np.arange(len(features.ids)), k, block_size)
+        Movie.objects.filter(similar_stale=True).update(similar_stale=False)
+    logger.info(
+        "Индекс похожих фильмов: %d фильмов, %d записей за %.2f с",
+        len(features.ids), count, time.perf_counter() - started,
+    )
+    return count
+
+
+def refresh_similar(movie_ids, k: int = None) -> int:
+    """
+    Инкрементальное обновление после импорта: пересчитываются соседи
+    самих фильмов, их новых соседей (новый фильм мог войти в их top-K)
+    и фильмов, у которых они уже были в списке (признаки могли измениться).
+    Если индекс ещё не построен (rebuild_similar), ничего не делает.
+    """
+    movie_ids = set(movie_ids)
+    if not movie_ids or not SimilarMovie.objects.exists():
+        return 0
+    k = k or settings.SIMILAR_MOVIES_TOP_K
+    features = FeatureMatrix.load()
+    affected = set(movie_ids)
+    for _, columns, _ in features.neighbours(features.rows(movie_ids), k):
+        affected.update(int(pk) for pk in features.ids[columns])
+    affected.update(SimilarMovie.objects.filter(similar_id__in=movie_ids).values_list('movie_id', flat=True))
+
+    with transaction.atomic():
+        SimilarMovie.objects.filter(movie_id__in=affected).delete()
+        return _write(features, features.rows(affected), k, block_size=200)
+
+
+def mark_similar_stale(movie_ids) -> int:
+    """Помечает фильмы для пересчёта соседей (вместо refresh_similar на каждый импорт)"""
+    return Movie.objects.filter(pk__in=list(movie_ids), similar_stale=False).update(similar_stale=True)
+
+
+def refresh_stale_similar(k: int = None) -> int:
+    """Обновляет индекс для всех помеченных фильмов одной загрузкой матрицы"""
+    movie_ids = list(Movie.objects.filter(similar_stale=True).values_list('pk', flat=True))
+    if not movie_ids:
+        return 0
+    count = refresh_similar(movie_ids, k)
+    Movie.objects.filter(pk__in=movie_ids).update(similar_stale=False)
+    return count
@@ -0,0 +1,282 @@
+"""
+Снимки каталога: выгрузка и загрузка фильмов, жанров, стран, актёров, ролей
+и источников между окружениями.
+Каждая таблица пишется в свой файл (NDJSON или Parquet) потоково, через
+.iterator(chunk_size), поэтому память не зависит от размера каталога.
+Загрузка идёт пачками: COPY на PostgreSQL, executemany на остальных СУБД.
+"""
+import io
+import json
+from datetime import date, time
+from importlib.util import find_spec
+from pathlib import Path
+
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from .changes import record_reset, tracking_suspended
+from .models import Genre, Country, Actor, Movie, MovieCast, MovieSource, ImportJob, SimilarMovie, GenreTopMovie
+
+FORMATS = ('ndjson', 'parquet')
+MANIFEST = 'manifest.json'
+
+# Порядок важен: при загрузке таблица идёт после всех, на которые ссылается
+TABLES = [
+    ('genre', Genre),
+    ('country', Country),
+    ('actor', Actor),
+    ('movie', Movie),
+    ('movie_genres', Movie.genres.through),
+    ('movie_countries', Movie.countries.through),
+    ('movie_cast', MovieCast),
+    ('movie_source', MovieSource),
+]
+# Производные таблицы: не выгружаются, после загрузки пересчитываются
+# (recompute_rankings, rebuild_similar — команда import_catalog)
+DERIVED_TABLES = [SimilarMovie, GenreTopMovie]
+
+
+class CatalogSnapshotError(Exception):
+    """Ошибка выгрузки или загрузки снимка каталога"""
+    pass
+
+
+class SnapshotJSONEncoder(DjangoJSONEncoder):
+    """Даты и время — без потери микросекунд (DjangoJSONEncoder округляет до миллисекунд)"""
+
+    def default(self, o):
+        if isinstance(o, (date, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def table_fields(model) -> list[models.Field]:
+    return [field for field in model._meta.concrete_fields]
+
+
+def insert_rows(model, fields: list[str], rows: list[tuple]) -> None:
+    """Вставка кортежей одним executemany, минуя создание объектов и компиляцию ORM"""
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})', rows)
+
+
+def _copy_value(value) -> str:
+    """Значение в текстовом формате COPY"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_rows(model, fields: list[str], rows: list[tuple]) -> None:
+    """Вставка кортежей через COPY FROM STDIN (только PostgreSQL)"""
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f'COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN', buffer)
+
+
+def load_rows(model, fields: list[str], rows: list[tuple]) -> None:
+    """Пакетная вставка: COPY на PostgreSQL, executemany на остальных СУБД"""
+    if connection.vendor == 'postgresql':
+        copy_rows(model, fields, rows)
+    else:
+        insert_rows(model, fields, rows)
+
+
+def export_catalog(directory, fmt: str = 'ndjson', chunk_size: int = 2000) -> dict[str, int]:
+    """Выгружает каталог в directory (файл на таблицу + manifest.json); возвращает число строк по таблицам"""
+    if fmt not in FORMATS:
+        raise CatalogSnapshotError(f"Неизвестный формат «{fmt}», доступны: {', '.join(FORMATS)}")
+    writer = _write_parquet if fmt == 'parquet' else _write_ndjson
+    if fmt == 'parquet':
+        _require_pyarrow()
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    counts = {}
+    for name, model in TABLES:
+        fields = table_fields(model)
+        rows = model.objects.order_by('pk').values_list(*(f.attname for f in fields)).iterator(chunk_size=chunk_size)
+        counts[name] = writer(directory / f'{name}.{fmt}', fields, rows, chunk_size)
+
+    manifest = {'format': fmt, 'created_at': timezone.now().isoformat(), 'tables': counts}
+    (directory / MANIFEST).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding='utf-8')
+    return counts
+
+
+def import_catalog(directory, batch_size: int = 5000, replace: bool = False) -> dict[str, int]:
+    """
+    Загружает снимок из directory в одной транзакции. Первичные ключи
+    сохраняются, поэтому целевые таблицы должны быть пустыми (replace=True
+    предварительно удаляет текущий каталог). Возвращает число строк по таблицам.
+    """
+    directory = Path(directory)
+    try:
+        manifest = json.loads((directory / MANIFEST).read_text(encoding='utf-8'))
+    except (OSError, ValueError) as e:
+        raise CatalogSnapshotError(f"Не удалось прочитать {MANIFEST}: {e}")
+    fmt = manifest.get('format')
+    if fmt not in FORMATS:
+        raise CatalogSnapshotError(f"Неизвестный формат снимка «{fmt}»")
+    reader = _read_parquet if fmt == 'parquet' else _read_ndjson
+    if fmt == 'parquet':
+        _require_pyarrow()
+
+    counts = {}
+    with transaction.atomic():
+        if replace:
+            clear_catalog()
+        elif any(model.objects.exists() for _, model in TABLES):
+            raise CatalogSnapshotError("Каталог не пуст: загрузка возможна только в пустую БД (или с --replace)")
+
+        db = transaction.get_connection()
+        for name, model in TABLES:
+            path = directory / f'{name}.{fmt}'
+            if not path.exists():
+                counts[name] = 0
+                continue
+            fields = table_fields(model)
+            by_name = {field.attname: field for field in fields}
+            count = 0
+            for records in reader(path, batch_size):
+                if not count:
+                    unknown = set(records[0]) - set(by_name)
+                    if unknown:
+                        raise CatalogSnapshotError(f"{path.name}: неизвестные поля {', '.join(sorted(unknown))}")
+                    columns = [f for f in fields if f.attname in records[0]]
+                    # Поля, добавленные после выгрузки снимка, — значением по умолчанию
+                    defaults = [f for f in fields if f.attname not in records[0] and f.has_default()]
+                    names = [f.attname for f in columns]
+                    default_values = [f.get_db_prep_save(f.get_default(), db) for f in defaults]
+                    converters = [(i, _converter(f, db)) for i, f in enumerate(columns) if _needs_conversion(f)]
+                    columns += defaults
+                rows = [[record.get(attname) for attname in names] + default_values for record in records]
+                for row in rows:
+                    for i, convert in converters:
+                        row[i] = convert(row[i])
+                load_rows(model, [f.name for f in columns], rows)
+                count += len(rows)
+            counts[name] = count
+
+        # Счётчики первичных ключей (PostgreSQL) — после максимального загруженного ID
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [model for _, model in TABLES]):
+                cursor.execute(sql)
+        record_reset()
+    return counts
+
+
+def clear_catalog() -> None:
+    """
+    Удаляет каталог и производные таблицы одним DELETE на таблицу (_raw_delete).
+    Обычный delete() из-за сигналов (журнал изменений, счётчики) загрузил бы
+    каждую строку в память. Журнал по объектам не пишется — клиенты получат
+    сброс (record_reset); счётчики актёров пересчитываются после загрузки.
+    """
+    ImportJob.objects.filter(movie__isnull=False).update(movie=None)
+    with tracking_suspended():
+        # Сначала ссылающиеся таблицы: каскад ON DELETE здесь не выполняется
+        for model in DERIVED_TABLES + [model for _, model in reversed(TABLES)]:
+            queryset = model.objects.all()
+            queryset._raw_delete(queryset.db)
+
+
+def _needs_conversion(field: models.Field) -> bool:
+    """Числа и строки из NDJSON/Parquet пишутся как есть; даты, JSON и т.п. — через поле"""
+    return isinstance(field, (
+        models.DateField, models.TimeField, models.DurationField, models.DecimalField,
+        models.UUIDField, models.JSONField, models.BooleanField,
+    ))
+
+
+def _converter(field: models.Field, db):
+    return lambda value: field.get_db_prep_save(field.to_python(value), db)
+
+
+def _require_pyarrow():
+    if find_spec('pyarrow') is None:
+        raise CatalogSnapshotError("Для формата parquet установите пакет pyarrow")
+
+
+def _write_ndjson(path: Path, fields: list[models.Field], rows, chunk_size: int) -> int:
+    names = [field.attname for field in fields]
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(dict(zip(names, row)), cls=SnapshotJSONEncoder, ensure_ascii=False))
+            f.write('\n')
+            count += 1
+    return count
+
+
+def _read_ndjson(path: Path, batch_size: int):
+    batch = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                batch.append(json.loads(line))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _arrow_type(field: models.Field):
+    import pyarrow as pa
+
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, (models.AutoField, models.IntegerField, models.ForeignKey)):
+        return pa.int64()
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    return pa.string()
+
+
+def _write_parquet(path: Path, fields: list[models.Field], rows, chunk_size: int) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(field.attname, _arrow_type(field)) for field in fields])
+    names = schema.names
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                writer.write_table(pa.Table.from_pylist([dict(zip(names, r)) for r in chunk], schema))
+                count += len(chunk)
+                chunk = []
+        if chunk or not count:
+            writer.write_table(pa.Table.from_pylist([dict(zip(names, r)) for r in chunk], schema))
+            count += len(chunk)
+    return count
+
+
+def _read_parquet(path: Path, batch_size: int):
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield batch.to_pylist()
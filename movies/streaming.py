@@ -0,0 +1,78 @@
+"""
+Потоковая отдача больших ответов API (NDJSON) с постоянным расходом памяти.
+Строки генерируются по чанкам из курсора БД; под ASGI (daphne) синхронный
+генератор оборачивается в асинхронный, иначе Django прочитал бы его целиком.
+"""
+import json
+import re
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson; charset=utf-8'
+
+_accepts_gzip = re.compile(r'\bgzip\b')
+_exhausted = object()
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Рендерер для согласования Accept: application/x-ndjson; тело формирует stream_response"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+def ndjson_chunks(queryset, serializer_class, chunk_size: int = 500, context: dict = None):
+    """
+    Сериализует queryset чанками по chunk_size объектов: на каждый чанк —
+    один запрос к курсору (и по запросу на prefetch_related) и один блок байт.
+    """
+    encoder = JSONEncoder(ensure_ascii=False)
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) >= chunk_size:
+            yield _encode_chunk(chunk, serializer_class, encoder, context)
+            chunk = []
+    if chunk:
+        yield _encode_chunk(chunk, serializer_class, encoder, context)
+
+
+def _encode_chunk(chunk: list, serializer_class, encoder: json.JSONEncoder, context: dict) -> bytes:
+    data = serializer_class(chunk, many=True, context=context or {}).data
+    return ''.join(encoder.encode(item) + '\n' for item in data).encode('utf-8')
+
+
+async def iterate_in_thread(iterator):
+    """Асинхронная обёртка над синхронным генератором, обращающимся к БД"""
+    next_item = sync_to_async(next, thread_sensitive=True)
+    while True:
+        item = await next_item(iterator, _exhausted)
+        if item is _exhausted:
+            return
+        yield item
+
+
+def stream_response(request, chunks, content_type: str = NDJSON_CONTENT_TYPE) -> StreamingHttpResponse:
+    """StreamingHttpResponse с gzip (если клиент его принимает) для WSGI и ASGI"""
+    gzip = bool(_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+    if gzip:
+        chunks = compress_sequence(chunks)
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = iterate_in_thread(chunks)
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    if gzip:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    # Отключает буферизацию ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
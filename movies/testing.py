@@ -0,0 +1,148 @@
+"""
+Фейковый API Кинопоиска для тестов и бенчмарков.
+Подключается к KinopoiskService через httpx.MockTransport или поднимается
+как локальный HTTP сервер; генерирует детерминированные ответы для любого ID фильма.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+
+class FakeKinopoiskAPI:
+    """Эмулятор kinopoiskapiunofficial.tech (фильм, актёры, видео, подборки и поиск)"""
+
+    PAGE_SIZE = 20
+
+    def __init__(self, films: dict = None, staff: dict = None, videos: dict = None, errors: dict = None,
+                 catalog: list = None):
+        self.films = films or {}
+        self.staff = staff or {}
+        self.videos = videos or {}
+        # {film_id: status_code} — фильмы, для которых API вернёт ошибку
+        self.errors = errors or {}
+        # ID фильмов, которые отдают подборки и поиск по фильтрам
+        self.catalog = catalog or []
+        # Ответы, которые будут отданы первыми (по одному на запрос), — для сбоев и 429
+        self.queued = []
+        self.requests = []
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handler)
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if self.queued:
+            return self.queued.pop(0)
+        path = request.url.path
+
+        if path.endswith('/staff'):
+            film_id = int(request.url.params['filmId'])
+            return self._respond(film_id, lambda: self.staff.get(film_id, self.make_staff(film_id)))
+
+        parts = path.rstrip('/').split('/')
+        if parts[-1] in ('collections', 'films'):
+            return httpx.Response(200, json=self.make_page(int(request.url.params.get('page', 1))))
+        if parts[-1] == 'videos':
+            film_id = int(parts[-2])
+            return self._respond(film_id, lambda: self.videos.get(film_id, self.make_videos(film_id)))
+
+        film_id = int(parts[-1])
+        return self._respond(film_id, lambda: self.films.get(film_id, self.make_film(film_id)))
+
+    def _respond(self, film_id: int, payload) -> httpx.Response:
+        status = self.errors.get(film_id)
+        if status:
+            return httpx.Response(status, json={'message': 'error'})
+        return httpx.Response(200, json=payload())
+
+    def make_page(self, page: int) -> dict:
+        """Страница списка фильмов в формате /films/collections и /films"""
+        total_pages = max(1, -(-len(self.catalog) // self.PAGE_SIZE))
+        ids = self.catalog[(page - 1) * self.PAGE_SIZE:page * self.PAGE_SIZE]
+        return {
+            'total': len(self.catalog),
+            'totalPages': total_pages,
+            'items': [{'kinopoiskId': film_id, 'nameRu': f'Фильм {film_id}'} for film_id in ids],
+        }
+
+    @staticmethod
+    def make_film(film_id: int) -> dict:
+        return {
+            'kinopoiskId': film_id,
+            'nameRu': f'Фильм {film_id}',
+            'nameOriginal': f'Film {film_id}',
+            'year': 1990 + film_id % 30,
+            'description': f'Описание фильма {film_id}',
+            'ratingKinopoisk': round(5 + (film_id % 50) / 10, 1),
+            'ratingKinopoiskVoteCount': film_id * 10,
+            'posterUrl': f'https://example.com/posters/{film_id}.jpg',
+            'coverUrl': None,
+            'imdbId': f'tt{film_id:07d}',
+            'slogan': None,
+            'filmLength': 90 + film_id % 60,
+            'ratingAgeLimits': 'age16',
+            'type': 'FILM',
+            'genres': [{'genre': 'драма'}, {'genre': 'комедия' if film_id % 2 else 'триллер'}],
+            'countries': [{'country': 'США'}],
+        }
+
+    @staticmethod
+    def make_staff(film_id: int, count: int = 3) -> list:
+        staff = [{
+            'staffId': 1000 + film_id * 10 + i,
+            'nameRu': f'Актёр {film_id}-{i}',
+            'nameEn': f'Actor {film_id}-{i}',
+            'description': f'Роль {i}',
+            'posterUrl': f'https://example.com/actors/{film_id}-{i}.jpg',
+            'professionText': 'Актеры',
+            'professionKey': 'ACTOR',
+        } for i in range(count)]
+        staff.append({
+            'staffId': 1000 + film_id * 10 + 9,
+            'nameRu': f'Режиссёр {film_id}',
+            'nameEn': f'Director {film_id}',
+            'description': None,
+            'posterUrl': None,
+            'professionText': 'Режиссеры',
+            'professionKey': 'DIRECTOR',
+        })
+        return staff
+
+    @staticmethod
+    def make_videos(film_id: int) -> dict:
+        return {
+            'total': 1,
+            'items': [{'url': f'https://www.youtube.com/watch?v={film_id}', 'name': 'Трейлер', 'site': 'YOUTUBE'}],
+        }
+
+
+def serve_fake_api(api: FakeKinopoiskAPI) -> tuple[ThreadingHTTPServer, str]:
+    """
+    Запускает FakeKinopoiskAPI как локальный HTTP/1.1 сервер с keep-alive.
+    Возвращает сервер (остановить — server.shutdown()) и BASE_URL для KinopoiskService.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            request = httpx.Request('GET', f'http://{self.headers["Host"]}{self.path}', headers=dict(self.headers))
+            response = api.handler(request)
+            body = response.read()
+            self.send_response(response.status_code)
+            for name, value in response.headers.items():
+                if name.lower() not in ('content-length', 'connection'):
+                    self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f'http://{host}:{port}/api/v2.2'
@@ -1,3 +1,1531 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from importlib.util import find_spec
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import httpx
+from asgiref.sync import async_to_sync
+from PIL import Image
+from prometheus_client import REGISTRY
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.http import QueryDict
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.signals import request_started, request_finished
+from django.db.models.signals import post_delete
+from django.db import OperationalError, close_old_connections, connection
+from django.db.models.deletion import Collector
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import http_pool
+from .changes import record_changes
+from .crawler import KinopoiskCrawler
+from .facets import list_cache
+from .filters import MovieFilter
+from .jobs import enqueue_imports, claim_jobs, run_jobs, requeue_stale_jobs
+from .kinopoisk import KinopoiskService, KinopoiskImportError, KinopoiskUnavailableError
+from .metrics import MetricsMiddleware, registry
+from .models import compress_image, Movie, MovieCast, MovieSource, Actor, Genre, Country, ImportJob, CrawlState, ChangeLog, SimilarMovie, GenreTopMovie
+from .pipeline import ImportPipeline
+from .profiling import RequestProfilingMiddleware
+from .ranking import recompute_rankings
+from .similarity import rebuild_similar
+from .serializers import MovieListSerializer
+from .snapshot import CatalogSnapshotError, export_catalog, import_catalog
+from .streaming import iterate_in_thread
+from .testing import FakeKinopoiskAPI
+from .throttling import TokenBucket, CircuitBreaker, parse_retry_after
+
+
+def make_service(api, **kwargs):
+    kwargs.setdefault('rate_limiter', TokenBucket(1000))
+    kwargs.setdefault('circuit_breaker', CircuitBreaker(100, 60))
+    kwargs.setdefault('use_cache', 'cache' in kwargs)
+    return KinopoiskService(api_token='test', transport=api.transport(), **kwargs)
+
+
+class KinopoiskBulkImportTests(TestCase):
+    def setUp(self):
+        self.api = FakeKinopoiskAPI(errors={404: 404})
+        self.service = make_service(self.api)
+
+    def test_parse_items(self):
+        text = "435\nhttps://www.kinopoisk.ru/film/326/, 448 # комментарий\n\n# 999\n"
+        self.assertEqual(
+            KinopoiskService.parse_items(text),
+            ['435', 'https://www.kinopoisk.ru/film/326/', '448'],
+        )
+
+    def test_import_many_reports_per_item(self):
+        results = self.service.import_many(
+            ['435', 'https://www.kinopoisk.ru/film/326/', 404, 'not-a-url'],
+            concurrency=2, batch_size=1,
+        )
+
+        self.assertEqual([r.ok for r in results], [True, True, False, False])
+        self.assertEqual(results[0].movie.kinopoisk_id, 435)
+        self.assertEqual(results[1].movie.kinopoisk_id, 326)
+        self.assertIn('не найден', results[2].error)
+        self.assertIn('Не удалось извлечь ID', results[3].error)
+
+        self.assertEqual(Movie.objects.count(), 2)
+        self.assertEqual(MovieCast.objects.filter(movie__kinopoisk_id=435).count(), 3)
+        self.assertEqual(
+            Movie.objects.get(kinopoisk_id=435).trailer_url,
+            'https://www.youtube.com/watch?v=435',
+        )
+
+    def test_import_many_reports_stage_stats(self):
+        self.service.import_many(list(range(1, 8)), concurrency=3, batch_size=3)
+
+        stats = self.service.import_stats
+        self.assertEqual((stats.fetched, stats.batches), (7, 3))
+        self.assertGreater(stats.fetch_time, 0)
+        self.assertGreater(stats.write_time, 0)
+
+    def test_import_many_fetches_duplicates_once(self):
+        results = self.service.import_many(['435', 'https://www.kinopoisk.ru/film/435/'])
+
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual(results[0].movie.pk, results[1].movie.pk)
+        # фильм, актёры и видео — по одному запросу
+        self.assertEqual(len(self.api.requests), 3)
+
+    def test_client_is_reused_across_imports_and_closed_with_session(self):
+        client = self.service._get_client()
+        self.service.import_many(['435'])
+        self.service.import_from_url('https://www.kinopoisk.ru/film/326/')
+        self.assertIs(self.service._get_client(), client)
+
+        with self.service.session():
+            session_client = self.service._get_client()
+            self.service.import_many(['448'])
+        self.assertIsNot(session_client, client)
+        self.assertTrue(session_client.is_closed)
+        self.assertIs(self.service._get_client(), client)
+
+    def test_reimport_updates_existing_movie(self):
+        self.service.import_many(['435'])
+        self.api.films[435] = dict(FakeKinopoiskAPI.make_film(435), ratingKinopoisk=9.1)
+        self.service.import_many(['435'])
+
+        self.assertEqual(Movie.objects.count(), 1)
+        self.assertEqual(Movie.objects.get().rating, 9.1)
+        self.assertEqual(Actor.objects.count(), 3)
+
+
+@override_settings(KINOPOISK_BACKOFF_BASE=0, KINOPOISK_MAX_RETRIES=2)
+class ImportPipelineTests(TestCase):
+    def test_writes_batches_and_passes_fetch_errors(self):
+        async def fetch(key):
+            if key == 3:
+                raise KinopoiskImportError('boom')
+            return key * 10
+
+        batches = []
+        stats = ImportPipeline(fetch, batches.append, concurrency=3, batch_size=4).run(range(10))
+
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+        written = dict(item for batch in batches for item in batch)
+        self.assertEqual(written[5], 50)
+        self.assertIsInstance(written[3], KinopoiskImportError)
+        self.assertEqual((stats.fetched, stats.batches), (10, 3))
+
+    def test_backpressure_limits_fetch_ahead_of_writer(self):
+        progress = {'fetched': 0, 'written': 0, 'ahead': 0}
+
+        async def fetch(key):
+            progress['fetched'] += 1
+            progress['ahead'] = max(progress['ahead'], progress['fetched'] - progress['written'])
+            return key
+
+        def write(batch):
+            time.sleep(0.01)
+            progress['written'] += len(batch)
+
+        stats = ImportPipeline(fetch, write, concurrency=2, batch_size=2, queue_size=3).run(range(40))
+
+        self.assertEqual(progress['written'], 40)
+        # очередь + пачка писателя + по одному результату у каждой загрузки
+        self.assertLessEqual(progress['ahead'], 3 + 2 + 2)
+        self.assertGreater(stats.backpressure_wait, 0)
+
+    def test_writer_error_stops_fetching(self):
+        fetched = []
+
+        async def fetch(key):
+            fetched.append(key)
+            return key
+
+        def write(batch):
+            raise RuntimeError('db down')
+
+        with self.assertRaises(RuntimeError):
+            ImportPipeline(fetch, write, concurrency=2, batch_size=2, queue_size=2).run(range(1000))
+        self.assertLess(len(fetched), 1000)
+
+
+class KinopoiskRetryTests(TestCase):
+    def setUp(self):
+        self.api = FakeKinopoiskAPI()
+        self.service = make_service(self.api)
+
+    def test_retries_rate_limited_and_server_errors(self):
+        self.api.queued = [
+            httpx.Response(429, headers={'Retry-After': '0'}),
+            httpx.Response(503),
+        ]
+        movie = self.service.import_from_url('https://www.kinopoisk.ru/film/435/')
+
+        self.assertEqual(movie.kinopoisk_id, 435)
+        self.assertEqual(len(self.api.requests), 5)
+
+    def test_staff_failure_fails_import_instead_of_dropping_cast(self):
+        self.api.errors = {435: 500}
+        with self.assertRaises(KinopoiskImportError):
+            self.service.import_from_url('https://www.kinopoisk.ru/film/435/')
+        self.assertFalse(Movie.objects.exists())
+
+    def test_circuit_breaker_rejects_requests_when_open(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        service = make_service(self.api, circuit_breaker=breaker)
+        self.api.errors = {435: 500}
+
+        results = service.import_many(['435', '326'], concurrency=1)
+
+        self.assertFalse(any(r.ok for r in results))
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertIn('временно недоступен', results[1].error)
+        self.assertTrue(results[1].transient)
+        self.assertAlmostEqual(breaker.retry_after(), 60, delta=5)
+
+    def test_cancelled_probe_does_not_leave_breaker_half_open(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        service = make_service(self.api, circuit_breaker=breaker)
+
+        async def slow(request):
+            await asyncio.sleep(0.05)
+            return self.api.handler(request)
+        service.transport = httpx.MockTransport(slow)
+        breaker.record_failure()
+        time.sleep(0.06)
+
+        async def cancel_probe():
+            task = asyncio.ensure_future(service._request(service._get_client(), f'{service.base_url}/films/435'))
+            await asyncio.sleep(0.01)
+            self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        http_pool.loop.run(cancel_probe())
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(breaker.retry_after(), 0)
+
+        # Следующий импорт: фильм — пробный запрос, остальные после замыкания цепи
+        movie = service.import_from_url('https://www.kinopoisk.ru/film/435/')
+        self.assertEqual(movie.cast.count(), 3)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_stale_half_open_probe_is_reissued(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+
+    def test_token_bucket_queues_requests_beyond_capacity(self):
+        bucket = TokenBucket(rate=10, capacity=2)
+        delays = [bucket.reserve() for _ in range(4)]
+
+        self.assertEqual(delays[:2], [0.0, 0.0])
+        self.assertAlmostEqual(delays[2], 0.1, places=2)
+        self.assertAlmostEqual(delays[3], 0.2, places=2)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+        self.assertIsNone(parse_retry_after('soon'))
+
+
+class KinopoiskCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        self.cache = FileBasedCache(self.cache_dir.name, {})
+        self.api = FakeKinopoiskAPI()
+
+    def test_fresh_entries_are_served_without_api_calls(self):
+        make_service(self.api, cache=self.cache).import_many(['435'])
+        make_service(self.api, cache=self.cache).import_many(['435'])
+
+        self.assertEqual(len(self.api.requests), 3)
+
+    def test_cache_io_runs_off_event_loop(self):
+        on_loop = []
+        for name in ('get', 'set'):
+            original = getattr(self.cache, name)
+
+            def call(*args, original=original, **kwargs):
+                try:
+                    asyncio.get_running_loop()
+                    on_loop.append(True)
+                except RuntimeError:
+                    on_loop.append(False)
+                return original(*args, **kwargs)
+            setattr(self.cache, name, call)
+
+        make_service(self.api, cache=self.cache).import_many(['435'])
+
+        self.assertEqual(on_loop, [False] * 6)
+
+    @override_settings(KINOPOISK_CACHE_TTL={'film': 0, 'staff': 0, 'videos': 0})
+    def test_stale_entries_are_revalidated_by_etag(self):
+        revalidated = []
+
+        def handler(request):
+            if request.headers.get('If-None-Match') == '"v1"':
+                revalidated.append(request)
+                return httpx.Response(304)
+            response = self.api.handler(request)
+            response.headers['ETag'] = '"v1"'
+            return response
+
+        service = make_service(self.api, cache=self.cache)
+        service.transport = httpx.MockTransport(handler)
+        service.import_many(['435'])
+        results = service.import_many(['435'])
+
+        self.assertTrue(results[0].ok)
+        self.assertEqual(len(self.api.requests), 3)
+        self.assertEqual(len(revalidated), 3)
+        self.assertEqual(results[0].movie.cast.count(), 3)
+
+    def test_offline_replay_from_recorded_responses(self):
+        make_service(self.api, cache=self.cache).import_many(['435'])
+        Movie.objects.all().delete()
+
+        offline_api = FakeKinopoiskAPI(errors={435: 500, 326: 500})
+        results = make_service(offline_api, cache=FileBasedCache(self.cache_dir.name, {}), offline=True).import_many(
+            ['435', '326']
+        )
+
+        self.assertTrue(results[0].ok)
+        self.assertEqual(results[0].movie.cast.count(), 3)
+        self.assertIn('офлайн', results[1].error)
+        self.assertEqual(offline_api.requests, [])
+
+
+class KinopoiskPersistenceTests(TestCase):
+    def setUp(self):
+        self.service = make_service(FakeKinopoiskAPI())
+
+    def save_capturing(self, film_id, cast_size):
+        film = FakeKinopoiskAPI.make_film(film_id)
+        staff = FakeKinopoiskAPI.make_staff(film_id, count=cast_size)
+        with CaptureQueriesContext(connection) as queries:
+            movie = self.service._process_and_save(film_id, film, staff, FakeKinopoiskAPI.make_videos(film_id))
+        return movie, queries.captured_queries
+
+    def save(self, film_id, cast_size):
+        movie, queries = self.save_capturing(film_id, cast_size)
+        return movie, len(queries)
+
+    def test_query_count_does_not_depend_on_cast_size(self):
+        self.save(2, cast_size=1)  # создаёт общие жанры и страны
+        _, small = self.save(4, cast_size=2)
+        movie, large = self.save(6, cast_size=20)
+
+        self.assertEqual(movie.cast.count(), 20)
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 20)
+
+    def test_reimport_query_count(self):
+        self.save(1, cast_size=20)
+        movie, queries = self.save(1, cast_size=20)
+
+        self.assertEqual(Actor.objects.count(), 20)
+        self.assertEqual(movie.cast.count(), 20)
+        self.assertLessEqual(queries, 16)
+
+    def test_unchanged_reimport_does_not_write_cast(self):
+        movie, _ = self.save(1, cast_size=5)
+        cast_ids = list(movie.cast.order_by('order').values_list('pk', flat=True))
+
+        _, queries = self.save_capturing(1, cast_size=5)
+
+        writes = [q['sql'] for q in queries if not q['sql'].startswith(('SELECT', 'SAVEPOINT', 'RELEASE'))]
+        # единственная запись — refreshed_at фильма
+        self.assertEqual(len(writes), 1)
+        self.assertIn('UPDATE "movies_movie" SET "refreshed_at"', writes[0])
+        self.assertEqual(list(movie.cast.order_by('order').values_list('pk', flat=True)), cast_ids)
+
+    def test_changed_cast_is_updated_in_place(self):
+        movie, _ = self.save(1, cast_size=3)
+        kept = movie.cast.get(order=0).pk
+        staff = FakeKinopoiskAPI.make_staff(1, count=3)
+        staff[0]['description'] = 'Новая роль'
+        staff[2] = dict(staff[2], staffId=5555, nameRu='Новый актёр')
+
+        self.service._process_and_save(1, FakeKinopoiskAPI.make_film(1), staff)
+
+        cast = list(movie.cast.order_by('order').select_related('actor'))
+        self.assertEqual(cast[0].pk, kept)
+        self.assertEqual(cast[0].character, 'Новая роль')
+        self.assertEqual([c.actor.kinopoisk_id for c in cast], [1010, 1011, 5555])
+
+    def test_existing_actors_are_matched_by_id_and_name(self):
+        by_id = Actor.objects.create(name='Другое имя', kinopoisk_id=1010)
+        by_name = Actor.objects.create(name='Актёр 1-1')
+        Genre.objects.create(name='Драма')
+
+        movie, _ = self.save(1, cast_size=3)
+
+        by_name.refresh_from_db()
+        self.assertEqual(by_name.kinopoisk_id, 1011)
+        self.assertEqual(by_name.profile_path, 'https://example.com/actors/1-1.jpg')
+        self.assertEqual(
+            [c.actor_id for c in movie.cast.order_by('order')],
+            [by_id.pk, by_name.pk, Actor.objects.get(kinopoisk_id=1012).pk],
+        )
+        self.assertEqual(Actor.objects.count(), 3)
+        self.assertEqual(Genre.objects.filter(name='Драма').count(), 1)
+
+    def test_movie_without_kinopoisk_id_is_matched_by_title_and_year(self):
+        existing = Movie.objects.create(title='Фильм 1', overview='', release_date='1991-05-01')
+
+        movie, _ = self.save(1, cast_size=1)
+
+        self.assertEqual(movie.pk, existing.pk)
+        self.assertEqual(Movie.objects.get().kinopoisk_id, 1)
+
+
+class ImportJobQueueTests(TestCase):
+    def setUp(self):
+        self.api = FakeKinopoiskAPI(errors={404: 404})
+        self.service = make_service(self.api)
+
+    def test_worker_processes_queue(self):
+        enqueue_imports(['435', '404', 'https://www.kinopoisk.ru/film/326/'])
+
+        jobs = claim_jobs(limit=2)
+        self.assertEqual([job.source for job in jobs], ['435', '404'])
+        self.assertEqual(ImportJob.objects.filter(status=ImportJob.STATUS_RUNNING).count(), 2)
+        self.assertEqual(claim_jobs(limit=10)[0].source, 'https://www.kinopoisk.ru/film/326/')
+
+        run_jobs(jobs, service=self.service)
+
+        done, failed = ImportJob.objects.get(source='435'), ImportJob.objects.get(source='404')
+        self.assertEqual(done.status, ImportJob.STATUS_DONE)
+        self.assertEqual(done.movie.kinopoisk_id, 435)
+        self.assertEqual(failed.status, ImportJob.STATUS_FAILED)
+        self.assertIn('не найден', failed.error)
+        self.assertEqual(done.attempts, 1)
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = enqueue_imports(['435'])[0]
+        claim_jobs(limit=1)
+
+        self.assertEqual(requeue_stale_jobs(timeout=-1, max_attempts=3), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.STATUS_PENDING)
+
+        claim_jobs(limit=1)
+        self.assertEqual(requeue_stale_jobs(timeout=-1, max_attempts=2), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.STATUS_FAILED)
+
+    @override_settings(KINOPOISK_MAX_RETRIES=0)
+    def test_transient_failures_are_requeued_until_attempts_run_out(self):
+        self.api.errors[435] = 503
+        enqueue_imports(['435', '404'])
+
+        self.assertEqual(run_jobs(claim_jobs(limit=2), service=self.service, max_attempts=2), 1)
+        job, missing = ImportJob.objects.get(source='435'), ImportJob.objects.get(source='404')
+        self.assertEqual((job.status, job.attempts), (ImportJob.STATUS_PENDING, 1))
+        self.assertIsNone(job.finished_at)
+        self.assertEqual(missing.status, ImportJob.STATUS_FAILED)
+
+        self.assertEqual(run_jobs(claim_jobs(limit=2), service=self.service, max_attempts=2), 0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (ImportJob.STATUS_FAILED, 2))
+        self.assertIn('503', job.error)
+
+    def test_unexpected_batch_error_requeues_jobs(self):
+        enqueue_imports(['435'])
+        failing = mock.patch.object(self.service, 'import_many', side_effect=OperationalError('database is locked'))
+
+        with failing, self.assertLogs('movies.jobs', 'ERROR'):
+            self.assertEqual(run_jobs(claim_jobs(limit=1), service=self.service, max_attempts=2), 1)
+        job = ImportJob.objects.get()
+        self.assertEqual(job.status, ImportJob.STATUS_PENDING)
+        self.assertIn('database is locked', job.error)
+
+        with failing, self.assertLogs('movies.jobs', 'ERROR'):
+            run_jobs(claim_jobs(limit=1), service=self.service, max_attempts=2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.STATUS_FAILED)
+
+    def test_admin_enqueues_and_reports_status(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+
+        response = self.client.post(
+            reverse('admin:movies_movie_import_kinopoisk'),
+            {'kinopoisk_urls': '435\nhttps://www.kinopoisk.ru/film/326/\nnot-a-url'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(ImportJob.objects.order_by('pk').values_list('source', flat=True)),
+                         ['435', 'https://www.kinopoisk.ru/film/326/'])
+        self.assertFalse(Movie.objects.exists())
+
+        ids = ','.join(str(pk) for pk in ImportJob.objects.values_list('pk', flat=True))
+        data = self.client.get(reverse('admin:movies_movie_import_status'), {'ids': ids}).json()
+        self.assertEqual(data['pending_count'], 2)
+        self.assertEqual({job['status'] for job in data['jobs']}, {ImportJob.STATUS_PENDING})
+
+        page = self.client.get(reverse('admin:movies_movie_import_kinopoisk'))
+        self.assertContains(page, 'data-job-id')
+
+
+@override_settings(KINOPOISK_MAX_RETRIES=0)
+class RefreshRatingsTests(TestCase):
+    def setUp(self):
+        self.api = FakeKinopoiskAPI(errors={3: 500})
+        self.service = make_service(self.api)
+
+    def make_movie(self, kinopoisk_id, refreshed_at=None, **kwargs):
+        film = FakeKinopoiskAPI.make_film(kinopoisk_id)
+        kwargs.setdefault('rating', film['ratingKinopoisk'])
+        kwargs.setdefault('vote_count', film['ratingKinopoiskVoteCount'])
+        return Movie.objects.create(
+            title=f'Фильм {kinopoisk_id}', overview='', release_date='2000-01-01',
+            kinopoisk_id=kinopoisk_id, refreshed_at=refreshed_at, **kwargs
+        )
+
+    def test_refresh_updates_only_changed_movies(self):
+        changed = self.make_movie(1, rating=1.0)
+        unchanged = self.make_movie(2)
+        failing = self.make_movie(3)
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.service.refresh_ratings([changed, unchanged, failing])
+
+        self.assertEqual(result.updated, [changed])
+        self.assertEqual(result.unchanged, 1)
+        self.assertEqual([movie for movie, _ in result.failed], [failing])
+        # только фильм, без актёров и видео
+        self.assertTrue(all('/staff' not in str(r.url) and 'videos' not in str(r.url) for r in self.api.requests))
+        # + одна вставка в журнал изменений для изменившихся фильмов
+        self.assertLessEqual(len(queries), 5)
+
+        changed.refresh_from_db()
+        unchanged.refresh_from_db()
+        failing.refresh_from_db()
+        self.assertEqual(changed.rating, 5.1)
+        self.assertIsNotNone(unchanged.refreshed_at)
+        self.assertIsNone(failing.refreshed_at)
+
+    def test_stale_and_popular_movies_come_first(self):
+        now = timezone.now()
+        fresh = self.make_movie(1, refreshed_at=now)
+        popular = self.make_movie(2, refreshed_at=now - timedelta(days=2), vote_count=50000)
+        old = self.make_movie(4, refreshed_at=now - timedelta(days=30))
+        never = self.make_movie(5)
+        Movie.objects.create(title='Без ID', overview='', release_date='2000-01-01')
+
+        queryset = self.service.movies_to_refresh(
+            max_age=timedelta(days=7), popular_max_age=timedelta(days=1), popular_votes=10000
+        )
+
+        self.assertEqual(list(queryset), [never, old, popular])
+        self.assertNotIn(fresh, queryset)
+
+
+@override_settings(KINOPOISK_MAX_RETRIES=0)
+class CrawlerTests(TestCase):
+    def setUp(self):
+        self.api = FakeKinopoiskAPI(catalog=list(range(1, 46)), errors={12: 404, 13: 404})
+        self.service = make_service(self.api)
+
+    def crawl(self, state, **kwargs):
+        return list(KinopoiskCrawler(self.service, state, concurrency=4, **kwargs).run())
+
+    def test_collection_crawl_skips_existing_movies(self):
+        Movie.objects.create(title='Фильм 3', overview='', release_date='2000-01-01', kinopoisk_id=3)
+        state = CrawlState.objects.create(name='top', source=CrawlState.SOURCE_COLLECTION,
+                                          params={'type': 'TOP_250_MOVIES'})
+
+        steps = self.crawl(state)
+
+        self.assertEqual(len(steps), 3)
+        state.refresh_from_db()
+        self.assertTrue(state.finished)
+        self.assertEqual((state.discovered, state.skipped, state.imported), (45, 1, 42))
+        self.assertEqual((state.not_found, state.failed), (2, 0))
+        self.assertEqual(Movie.objects.count(), 43)
+        self.assertFalse(any(r.url.path.endswith('/films/3') for r in self.api.requests))
+
+    def test_crawl_resumes_from_checkpoint(self):
+        state = CrawlState.objects.create(name='search', source=CrawlState.SOURCE_FILTER,
+                                          params={'genres': 2})
+        first = list(KinopoiskCrawler(self.service, state).run(max_steps=1))
+        self.assertEqual(first[0].position, 1)
+
+        state = CrawlState.objects.get(name='search')
+        self.assertEqual(state.position, 2)
+        self.api.requests.clear()
+        steps = self.crawl(state)
+
+        self.assertEqual([s.position for s in steps], [2, 3])
+        pages = [r.url.params['page'] for r in self.api.requests if r.url.path.endswith('/films')]
+        self.assertEqual(pages, ['2', '3'])
+        self.assertTrue(all(r.url.params['genres'] == '2' for r in self.api.requests if r.url.path.endswith('/films')))
+        self.assertEqual(Movie.objects.count(), 43)
+
+    def test_id_range_counts_gaps_as_not_found(self):
+        state = CrawlState.objects.create(name='range', source=CrawlState.SOURCE_RANGE,
+                                          position=10, params={'end': 15})
+
+        steps = self.crawl(state, step=4)
+
+        self.assertEqual([s.discovered for s in steps], [4, 2])
+        state.refresh_from_db()
+        self.assertEqual(state.position, 16)
+        self.assertTrue(state.finished)
+        self.assertEqual((state.imported, state.not_found, state.failed), (4, 2, 0))
+
+    def test_unavailable_api_keeps_checkpoint(self):
+        service = make_service(self.api, circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        self.api.errors = {film_id: 503 for film_id in range(1, 11)}
+        state = CrawlState.objects.create(name='range', source=CrawlState.SOURCE_RANGE,
+                                          position=1, params={'end': 1000})
+
+        with self.assertRaises(KinopoiskUnavailableError):
+            list(KinopoiskCrawler(service, state, concurrency=1, step=10).run())
+
+        state.refresh_from_db()
+        self.assertEqual((state.position, state.finished, state.failed), (1, False, 0))
+        self.assertFalse(Movie.objects.exists())
+
+        # API восстановилось — тот же отрезок проверяется заново
+        self.api.errors = {}
+        steps = list(KinopoiskCrawler(self.service, state, concurrency=4, step=10).run(max_steps=1))
+        state.refresh_from_db()
+        self.assertEqual((steps[0].position, steps[0].imported, state.position), (1, 10, 11))
+
+
+class PopulateMoviesTests(TestCase):
+    def populate(self, **options):
+        call_command('populate_movies', stdout=StringIO(), **options)
+
+    def test_seed_is_idempotent_and_second_run_only_reads(self):
+        self.populate()
+        counts = (Genre.objects.count(), Actor.objects.count(), Movie.objects.count(), MovieCast.objects.count())
+        self.assertEqual(counts[:3], (10, 10, 10))
+        self.assertEqual(list(Movie.objects.get(title='Матрица').genres.order_by('name').values_list('name', flat=True)),
+                         ['Боевик', 'Фантастика'])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.populate()
+        writes = [q['sql'] for q in queries if not q['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertEqual(writes, [])
+        self.assertEqual(
+            (Genre.objects.count(), Actor.objects.count(), Movie.objects.count(), MovieCast.objects.count()), counts
+        )
+
+    def test_seed_restores_changed_paths_and_links(self):
+        self.populate()
+        matrix = Movie.objects.get(title='Матрица')
+        matrix.poster_path = '/old.png'
+        matrix.save()
+        matrix.genres.clear()
+
+        self.populate()
+
+        matrix.refresh_from_db()
+        self.assertEqual(matrix.poster_path, '/static/movies/posters/matrix.png')
+        self.assertEqual(matrix.genres.count(), 2)
+
+    def test_scale_generates_synthetic_catalog_incrementally(self):
+        self.populate(scale=30, cast_per_movie=4, actors=20, batch_size=8)
+
+        self.assertEqual(Movie.objects.filter(title__startswith='Синтетический фильм').count(), 30)
+        self.assertEqual(MovieCast.objects.filter(movie__title__startswith='Синтетический фильм').count(), 120)
+        self.assertEqual(Actor.objects.filter(name__startswith='Синтетический актёр').count(), 20)
+        self.assertTrue(Country.objects.exists())
+        self.assertFalse(Movie.objects.filter(title__startswith='Синтетический фильм', genres=None).exists())
+
+        self.populate(scale=45, cast_per_movie=4, actors=20, batch_size=8)
+        self.assertEqual(Movie.objects.filter(title__startswith='Синтетический фильм').count(), 45)
+        self.assertTrue(Movie.objects.filter(title='Синтетический фильм #45').exists())
+
+
+class CatalogSnapshotTests(TestCase):
+    def setUp(self):
+        call_command('populate_movies', stdout=StringIO())
+        movie = Movie.objects.get(title='Матрица')
+        movie.countries.add(Country.objects.create(name='США'))
+        MovieSource.objects.create(movie=movie, name='Онлайн', url='https://example.com/matrix',
+                                   description='Строка\tс табуляцией\nи переводом')
+        self.directory = tempfile.mkdtemp()
+
+    def snapshot(self):
+        return {
+            'movies': list(Movie.objects.order_by('pk').values_list('pk', 'title', 'release_date', 'rating', 'poster_path')),
+            'genres': list(Movie.genres.through.objects.order_by('pk').values_list('movie_id', 'genre_id')),
+            'countries': list(Movie.countries.through.objects.values_list('movie_id', 'country_id')),
+            'cast': list(MovieCast.objects.order_by('pk').values_list('movie_id', 'actor_id', 'character', 'order')),
+            'actors': list(Actor.objects.order_by('pk').values_list('pk', 'name', 'profile_path')),
+            'sources': list(MovieSource.objects.values_list('movie_id', 'name', 'description', 'created_at')),
+        }
+
+    def assert_round_trip(self, fmt):
+        before = self.snapshot()
+        counts = export_catalog(self.directory, fmt=fmt, chunk_size=3)
+        self.assertEqual(counts['movie'], 10)
+
+        imported = import_catalog(self.directory, batch_size=4, replace=True)
+
+        self.assertEqual(imported, counts)
+        self.assertEqual(self.snapshot(), before)
+        # счётчики ID продолжаются после загруженных
+        self.assertGreater(Genre.objects.create(name='Новый').pk, max(g.pk for g in Genre.objects.exclude(name='Новый')))
+
+    def test_ndjson_round_trip(self):
+        self.assert_round_trip('ndjson')
+
+    @skipUnless(find_spec('pyarrow'), 'pyarrow не установлен')
+    def test_parquet_round_trip(self):
+        self.assert_round_trip('parquet')
+
+    def test_replace_deletes_without_loading_rows(self):
+        export_catalog(self.directory)
+        rebuild_similar()
+        job = enqueue_imports(['435'])[0]
+        ImportJob.objects.filter(pk=job.pk).update(movie=Movie.objects.first())
+        deleted = []
+
+        def on_delete(sender, **kwargs):
+            deleted.append(sender)
+        post_delete.connect(on_delete)
+        self.addCleanup(post_delete.disconnect, on_delete)
+
+        call_command('import_catalog', self.directory, '--replace', stdout=StringIO())
+
+        self.assertEqual(deleted, [])
+        self.assertEqual(Movie.objects.count(), 10)
+        job.refresh_from_db()
+        self.assertIsNone(job.movie)
+        # Производные таблицы пересчитаны после загрузки
+        self.assertTrue(SimilarMovie.objects.exists())
+        self.assertTrue(GenreTopMovie.objects.exists())
+
+    def test_import_requires_empty_catalog(self):
+        export_catalog(self.directory)
+        with self.assertRaises(CatalogSnapshotError):
+            import_catalog(self.directory)
+        self.assertEqual(Movie.objects.count(), 10)
+
+
+class CatalogExportTests(TestCase):
+    url = '/api/catalog/export/'
+
+    def setUp(self):
+        call_command('populate_movies', stdout=StringIO())
+
+    def read_lines(self, response):
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    @override_settings(CATALOG_EXPORT_CHUNK_SIZE=4)
+    def test_streams_every_movie_in_list_format(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+            lines = self.read_lines(response)
+        # версия журнала, один запрос фильмов + жанры и страны на каждый из трёх чанков;
+        # без COUNT и запросов на фильм
+        self.assertEqual(len(queries), 1 + 1 + 3 * 2)
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual([item['id'] for item in lines], sorted(Movie.objects.values_list('pk', flat=True)))
+        matrix = next(item for item in lines if item['title'] == 'Матрица')
+        self.assertEqual(sorted(matrix['genre_ids']), sorted(Movie.objects.get(title='Матрица').genres.values_list('pk', flat=True)))
+        self.assertEqual(set(matrix), set(self.client.get('/api/movies/').json()['results'][0]))
+
+    def test_gzip_when_accepted(self):
+        plain = b''.join(self.client.get(self.url).streaming_content)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain)
+
+    def test_async_wrapper_preserves_items(self):
+        async def collect():
+            return [item async for item in iterate_in_thread(iter([b'a', b'b', b'c']))]
+
+        self.assertEqual(async_to_sync(collect)(), [b'a', b'b', b'c'])
+
+
+class ChangeTrackingTests(TestCase):
+    url = '/api/changes/'
+
+    def setUp(self):
+        self.genre = Genre.objects.create(name='Драма')
+        self.movie = Movie.objects.create(title='Фильм', overview='', release_date='2000-01-01')
+        self.version = self.client.get(self.url).json()['version']
+
+    def changes(self, since=None, **params):
+        return self.client.get(self.url, {'since': self.version if since is None else since, **params}).json()
+
+    def test_save_m2m_and_delete_are_tracked(self):
+        self.movie.genres.add(self.genre)
+        actor = Actor.objects.create(name='Актёр')
+        MovieCast.objects.create(movie=self.movie, actor=actor, character='Роль')
+        other = Movie.objects.create(title='Другой', overview='', release_date='2001-01-01')
+
+        data = self.changes()
+        self.assertEqual([m['id'] for m in data['movies']], [self.movie.pk, other.pk])
+        self.assertEqual(data['movies'][0]['genre_ids'], [self.genre.pk])
+        self.assertEqual([a['id'] for a in data['actors']], [actor.pk])
+        self.assertFalse(data['has_more'])
+
+        version, other_id = data['version'], other.pk
+        other.delete()
+        self.genre.movies.clear()
+        data = self.changes(since=version)
+        self.assertEqual(data['deleted']['movies'], [other_id])
+        self.assertEqual([m['id'] for m in data['movies']], [self.movie.pk])
+        self.assertEqual(data['movies'][0]['genre_ids'], [])
+
+        self.assertEqual(self.changes(since=data['version'])['movies'], [])
+
+    def test_only_catalog_models_are_tracked(self):
+        User.objects.create_user('editor')
+        self.assertEqual(ChangeLog.objects.filter(id__gt=self.version).count(), 0)
+        # Индексы, пересобираемые массовым удалением, удаляются одним DELETE без загрузки строк
+        other = Movie.objects.create(title='Другой', overview='', release_date='2001-01-01')
+        SimilarMovie.objects.create(movie=self.movie, similar=other, score=1, rank=1)
+        collector = Collector(using='default')
+        self.assertTrue(collector.can_fast_delete(SimilarMovie.objects.all()))
+        self.assertTrue(collector.can_fast_delete(GenreTopMovie.objects.all()))
+        with self.assertNumQueries(1):
+            SimilarMovie.objects.all().delete()
+
+    def test_limit_pages_through_log(self):
+        for i in range(5):
+            Genre.objects.create(name=f'Жанр {i}')
+
+        first = self.changes(limit=3)
+        second = self.changes(since=first['version'], limit=3)
+
+        self.assertTrue(first['has_more'])
+        self.assertFalse(second['has_more'])
+        self.assertEqual(len(first['genres']) + len(second['genres']), 5)
+
+    def test_since_accepts_timestamp(self):
+        moment = timezone.now()
+        Genre.objects.create(name='Новый')
+
+        data = self.changes(since=moment.isoformat())
+
+        self.assertEqual([g['name'] for g in data['genres']], ['Новый'])
+        for since in ('вчера', '2024-13-45T00:00:00', '9' * 30):
+            response = self.client.get(self.url, {'since': since})
+            self.assertEqual(response.status_code, 400, since)
+            self.assertIn('since', response.json())
+
+    def test_reimport_without_changes_is_not_logged(self):
+        service = make_service(FakeKinopoiskAPI())
+        service.import_many([7, 8], batch_size=2)
+        data = self.changes()
+        self.assertEqual(len(data['movies']), 2)
+        version = data['version']
+
+        service.import_many([7, 8], batch_size=2)
+
+        self.assertFalse(ChangeLog.objects.filter(id__gt=version).exists())
+
+    def test_catalog_import_requests_full_resync(self):
+        directory = tempfile.mkdtemp()
+        export_catalog(directory)
+        import_catalog(directory, replace=True)
+
+        data = self.changes()
+        self.assertTrue(data['reset'])
+        export = self.client.get('/api/catalog/export/')
+        self.assertEqual(int(export['X-Changes-Version']), data['version'])
+
+
+class MovieFacetsTests(TestCase):
+    url = '/api/movies/facets/'
+
+    def setUp(self):
+        cache.clear()
+        self.drama = Genre.objects.create(name='Драма')
+        self.comedy = Genre.objects.create(name='Комедия')
+        self.russia = Country.objects.create(name='Россия')
+        ratings = [(9.5, '2010-05-01', 16), (8.2, '2010-07-01', 16), (10.0, '2012-01-01', None), (5.0, '1999-01-01', 12)]
+        self.movies = []
+        for i, (rating, released, age) in enumerate(ratings):
+            movie = Movie.objects.create(title=f'Фильм {i}', overview='', release_date=released, rating=rating, age_rating=age)
+            movie.genres.add(self.drama)
+            self.movies.append(movie)
+        self.movies[0].genres.add(self.comedy)
+        self.movies[0].countries.add(self.russia)
+        actor = Actor.objects.create(name='Актёр')
+        # Две роли в одном фильме не должны удваивать счётчики
+        MovieCast.objects.create(movie=self.movies[0], actor=actor, character='Роль 1', order=0)
+        MovieCast.objects.create(movie=self.movies[0], actor=actor, character='Роль 2', order=1)
+        self.actor = actor
+
+    def test_counts_for_whole_catalog(self):
+        data = self.client.get(self.url).json()
+
+        self.assertEqual(data['total'], 4)
+        self.assertEqual(data['genres'], [
+            {'id': self.drama.pk, 'name': 'Драма', 'count': 4},
+            {'id': self.comedy.pk, 'name': 'Комедия', 'count': 1},
+        ])
+        self.assertEqual(data['countries'], [{'id': self.russia.pk, 'name': 'Россия', 'count': 1}])
+        self.assertEqual(data['years'], [{'value': 2012, 'count': 1}, {'value': 2010, 'count': 2}, {'value': 1999, 'count': 1}])
+        self.assertEqual(data['age_ratings'], [{'value': 12, 'count': 1}, {'value': 16, 'count': 2}, {'value': None, 'count': 1}])
+        self.assertEqual(data['ratings'], [
+            {'from': 9, 'to': 10, 'count': 2},
+            {'from': 8, 'to': 9, 'count': 1},
+            {'from': 5, 'to': 6, 'count': 1},
+        ])
+
+    def test_counts_follow_filters(self):
+        data = self.client.get(self.url, {'actor': self.actor.pk}).json()
+        self.assertEqual(data['total'], 1)
+        self.assertEqual([g['count'] for g in data['genres']], [1, 1])
+
+        data = self.client.get(self.url, {'year': 2010, 'min_rating': 9}).json()
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['ratings'], [{'from': 9, 'to': 10, 'count': 1}])
+
+    def test_cached_until_catalog_changes(self):
+        self.client.get(self.url, {'genre': self.drama.pk, 'page': 2})
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(self.url, {'genre': self.drama.pk})
+        # только версия журнала изменений
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(data.json()['total'], 4)
+
+        self.movies[3].genres.remove(self.drama)
+
+        self.assertEqual(self.client.get(self.url, {'genre': self.drama.pk}).json()['total'], 3)
+
+
+class SimilarMoviesTests(TestCase):
+    def setUp(self):
+        drama, comedy, horror = (Genre.objects.create(name=name) for name in ('Драма', 'Комедия', 'Ужасы'))
+        actor = Actor.objects.create(name='Общий актёр')
+        self.movies = {}
+        for title, genres, rating in [
+            ('A', [drama, comedy], 8.0), ('B', [drama, comedy], 8.1), ('C', [drama], 5.0), ('D', [horror], 8.0),
+        ]:
+            movie = Movie.objects.create(title=title, overview='', release_date='2000-01-01', rating=rating)
+            movie.genres.set(genres)
+            self.movies[title] = movie
+        for title in ('A', 'B'):
+            MovieCast.objects.create(movie=self.movies[title], actor=actor, character='Роль')
+
+    def similar(self, title):
+        return self.client.get(f'/api/movies/{self.movies[title].pk}/similar/')
+
+    def test_ranks_by_shared_features(self):
+        rebuild_similar(k=2)
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.similar('A').json()
+        # соседи с фильмами одним запросом + жанры и страны
+        self.assertEqual(len(queries), 3)
+        self.assertEqual([item['movie']['title'] for item in data], ['B', 'C'])
+        self.assertGreater(data[0]['score'], data[1]['score'])
+        self.assertEqual(sorted(data[0]['movie']['genre_ids']), sorted(self.movies['B'].genres.values_list('pk', flat=True)))
+        # Без общих признаков фильм не считается похожим
+        self.assertEqual(self.similar('D').json(), [])
+        self.assertEqual(self.client.get('/api/movies/999999/similar/').status_code, 404)
+
+    def test_import_refreshes_existing_index(self):
+        service = make_service(FakeKinopoiskAPI())
+        service.import_many([7])
+        self.assertFalse(SimilarMovie.objects.exists())
+
+        rebuild_similar()
+        # Фильм 9 — те же жанры и страна, что у 7
+        service.import_many([9])
+        first, second = Movie.objects.get(kinopoisk_id=7), Movie.objects.get(kinopoisk_id=9)
+        self.assertTrue(second.similar_stale)
+        self.assertFalse(SimilarMovie.objects.filter(movie=second).exists())
+
+        call_command('build_similar_movies', '--stale', stdout=StringIO())
+
+        self.assertEqual(SimilarMovie.objects.get(movie=second, rank=1).similar, first)
+        self.assertEqual(SimilarMovie.objects.get(movie=first, rank=1).similar, second)
+
+
+@override_settings(WEIGHTED_RATING_MIN_VOTES=1000, GENRE_TOP_SIZE=2)
+class RankingTests(TestCase):
+    def setUp(self):
+        self.genre = Genre.objects.create(name='Драма')
+        self.movies = {}
+        for title, rating, votes in [('Три голоса', 9.5, 3), ('Классика', 8.5, 30000), ('Середняк', 6.0, 5000), ('Без голосов', 0.0, 0)]:
+            movie = Movie.objects.create(title=title, overview='', release_date='2000-01-01', rating=rating, vote_count=votes)
+            movie.genres.add(self.genre)
+            self.movies[title] = movie
+
+    def test_weighted_rating_prefers_many_votes(self):
+        recompute_rankings()
+
+        mean = (9.5 + 8.5 + 6.0) / 3
+        classic = Movie.objects.get(title='Классика')
+        self.assertAlmostEqual(classic.weighted_rating, (30000 * 8.5 + 1000 * mean) / 31000)
+        titles = [m['title'] for m in self.client.get('/api/movies/', {'ordering': '-weighted_rating'}).json()['results']]
+        self.assertEqual(titles[:2], ['Классика', 'Три голоса'])
+        # повторный пересчёт ничего не меняет
+        self.assertEqual(recompute_rankings()[0], 0)
+
+    def test_genre_top_is_precomputed(self):
+        recompute_rankings()
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(f'/api/genres/{self.genre.pk}/top/').json()
+        # жанр, лидеры с фильмами, жанры и страны фильмов
+        self.assertEqual(len(queries), 4)
+        self.assertEqual([m['title'] for m in data], ['Классика', 'Три голоса'])
+        self.assertEqual(self.client.get('/api/genres/999999/top/').status_code, 404)
+
+    def test_import_computes_weighted_rating(self):
+        make_service(FakeKinopoiskAPI()).import_many([7])
+
+        movie = Movie.objects.get(kinopoisk_id=7)
+        mean = (9.5 + 8.5 + 6.0 + movie.rating) / 4
+        # 70 голосов — оценка почти равна средней по каталогу
+        self.assertAlmostEqual(movie.weighted_rating, (70 * movie.rating + 1000 * mean) / 1070)
+
+    def test_import_refreshes_genre_top(self):
+        recompute_rankings()
+        api = FakeKinopoiskAPI()
+        make_service(api).import_many([49])
+
+        def top(genre):
+            return [m['title'] for m in self.client.get(f'/api/genres/{genre.pk}/top/').json()]
+
+        # 9.9 при 490 голосах — выше «Классики»
+        self.assertEqual(top(self.genre), ['Фильм 49', 'Классика'])
+        self.assertEqual(top(Genre.objects.get(name='Комедия')), ['Фильм 49'])
+
+        api.films[49] = dict(FakeKinopoiskAPI.make_film(49), genres=[{'genre': 'комедия'}])
+        make_service(api).import_many([49])
+        self.assertEqual(top(self.genre), ['Классика', 'Три голоса'])
+
+
+class ActorFilmographyTests(TestCase):
+    def setUp(self):
+        self.actor = Actor.objects.create(name='Актёр')
+        self.genre = Genre.objects.create(name='Драма')
+        self.country = Country.objects.create(name='Россия')
+
+    def add_role(self, year, character):
+        movie = Movie.objects.create(title=f'Фильм {year}', overview='', release_date=f'{year}-01-01')
+        movie.genres.add(self.genre)
+        movie.countries.add(self.country)
+        MovieCast.objects.create(movie=movie, actor=self.actor, character=character, order=year % 10)
+        return movie
+
+    def filmography(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(f'/api/actors/{self.actor.pk}/movies/').json()
+        return data, len(queries)
+
+    def test_roles_sorted_by_release_date_in_constant_queries(self):
+        self.add_role(2001, 'Первая роль')
+        self.add_role(2010, 'Главная роль')
+        _, few = self.filmography()
+        for year in range(2011, 2016):
+            self.add_role(year, 'Роль')
+
+        data, many = self.filmography()
+
+        # актёр, COUNT и страница ролей с фильмами, жанры, страны
+        self.assertEqual(few, many)
+        self.assertEqual(many, 5)
+        self.assertEqual(data['count'], 7)
+        self.assertEqual([item['release_date'][:4] for item in data['results']][:2], ['2015', '2014'])
+        last = data['results'][-1]
+        self.assertEqual((last['character'], last['order']), ('Первая роль', 1))
+        self.assertEqual(last['genre_ids'], [self.genre.pk])
+        self.assertEqual(last['countries'], [{'id': self.country.pk, 'name': 'Россия'}])
+
+
+class ActorCountersTests(TestCase):
+    def make_movie(self, title, votes):
+        return Movie.objects.create(title=title, overview='', release_date='2000-01-01', vote_count=votes)
+
+    def test_cast_writes_maintain_counters(self):
+        star, newcomer = Actor.objects.create(name='Звезда'), Actor.objects.create(name='Новичок')
+        first, second = self.make_movie('Первый', 1000), self.make_movie('Второй', 50)
+        MovieCast.objects.create(movie=first, actor=star, character='Герой')
+        MovieCast.objects.create(movie=first, actor=star, character='Двойник')
+        role = MovieCast.objects.create(movie=second, actor=star, character='Злодей')
+
+        star.refresh_from_db()
+        self.assertEqual((star.movie_count, star.total_votes), (2, 1050))
+
+        role.actor = newcomer
+        role.save()
+        star.refresh_from_db()
+        newcomer.refresh_from_db()
+        self.assertEqual((star.movie_count, star.total_votes), (1, 1000))
+        self.assertEqual((newcomer.movie_count, newcomer.total_votes), (1, 50))
+
+        first.delete()
+        star.refresh_from_db()
+        self.assertEqual((star.movie_count, star.total_votes), (0, 0))
+
+    def test_import_updates_counters(self):
+        make_service(FakeKinopoiskAPI()).import_many([7, 8])
+
+        actor = Actor.objects.get(kinopoisk_id=1000 + 7 * 10)
+        self.assertEqual((actor.movie_count, actor.total_votes), (1, 70))
+
+    def test_reimport_with_new_votes_updates_counters(self):
+        api = FakeKinopoiskAPI()
+        make_service(api).import_many([7])
+        api.films[7] = dict(FakeKinopoiskAPI.make_film(7), ratingKinopoiskVoteCount=99999)
+        version = self.client.get('/api/changes/').json()['version']
+
+        make_service(api).import_many([7])
+
+        actor = Actor.objects.get(kinopoisk_id=1000 + 7 * 10)
+        self.assertEqual((actor.movie_count, actor.total_votes), (1, 99999))
+        # Счётчики изменились UPDATE-ом, но клиенты журнала об этом узнают
+        changed = self.client.get('/api/changes/', {'since': version}).json()['actors']
+        self.assertIn((actor.pk, 99999), [(a['id'], a['total_votes']) for a in changed])
+
+    def test_popular_actors_ordering_and_filter(self):
+        movies = [self.make_movie(f'Фильм {i}', votes) for i, votes in enumerate([10, 500, 20])]
+        for name, indexes in [('Редкий', [1]), ('Частый', [0, 2]), ('Без фильмов', [])]:
+            actor = Actor.objects.create(name=name)
+            for i in indexes:
+                MovieCast.objects.create(movie=movies[i], actor=actor, character='Роль')
+
+        by_votes = self.client.get('/api/actors/', {'ordering': '-total_votes'}).json()['results']
+        self.assertEqual([a['name'] for a in by_votes], ['Редкий', 'Частый', 'Без фильмов'])
+        frequent = self.client.get('/api/actors/', {'movie_count__gte': 2}).json()['results']
+        self.assertEqual([(a['name'], a['movie_count'], a['total_votes']) for a in frequent], [('Частый', 2, 30)])
+        self.assertEqual(self.client.get('/api/actors/', {'movie_count__gte': 'много'}).status_code, 400)
+
+
+class CatalogListsTests(TestCase):
+    def setUp(self):
+        list_cache.clear()
+        self.drama = Genre.objects.create(name='Драма')
+        self.comedy = Genre.objects.create(name='Комедия')
+        self.russia = Country.objects.create(name='Россия')
+        self.movie = Movie.objects.create(title='Фильм', overview='', release_date='2000-01-01')
+        self.movie.genres.add(self.drama)
+        self.movie.countries.add(self.russia)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(url).json()
+        return data, len(queries)
+
+    def test_lists_include_counts_and_are_cached(self):
+        data, queries = self.get('/api/genres/')
+        self.assertEqual(data, [
+            {'id': self.drama.pk, 'name': 'Драма', 'movie_count': 1},
+            {'id': self.comedy.pk, 'name': 'Комедия', 'movie_count': 0},
+        ])
+        self.assertEqual(queries, 2)  # версия журнала и список
+        self.assertEqual(self.get('/api/genres/')[1], 0)
+
+        data, _ = self.get('/api/countries/')
+        self.assertEqual(data, [{'id': self.russia.pk, 'name': 'Россия', 'movie_count': 1}])
+        self.assertEqual(self.get('/api/countries/')[1], 0)
+
+    def test_signals_invalidate_cache(self):
+        self.get('/api/genres/')
+        self.movie.genres.add(self.comedy)
+        self.assertEqual([g['movie_count'] for g in self.get('/api/genres/')[0]], [1, 1])
+
+        self.get('/api/countries/')
+        self.movie.delete()
+        self.assertEqual(self.get('/api/countries/')[0][0]['movie_count'], 0)
+
+    def test_changes_from_other_processes_seen_after_ttl(self):
+        self.get('/api/genres/')
+        # bulk-запись без сигналов (как у воркера импорта в другом процессе)
+        Movie.genres.through.objects.bulk_create([Movie.genres.through(movie=self.movie, genre=self.comedy)])
+        record_changes(Movie, [self.movie.pk])
+
+        self.assertEqual(self.get('/api/genres/')[0][1]['movie_count'], 0)
+        with mock.patch.object(list_cache, 'ttl', 0):
+            self.assertEqual(self.get('/api/genres/')[0][1]['movie_count'], 1)
+
+
+class MovieFilterTests(TestCase):
+    url = '/api/movies/'
+
+    def setUp(self):
+        self.drama, self.comedy, self.horror = (Genre.objects.create(name=n) for n in ('Драма', 'Комедия', 'Ужасы'))
+        self.usa, self.russia = Country.objects.create(name='США'), Country.objects.create(name='Россия')
+        self.actor = Actor.objects.create(name='Актёр')
+        specs = [
+            ('Драмеди', [self.drama, self.comedy], [self.usa], 'FILM', 2005, 16, 95, 8.1),
+            ('Драма', [self.drama], [self.russia], 'FILM', 2012, 12, 130, 7.0),
+            ('Ужастик', [self.horror], [self.usa, self.russia], 'TV_SERIES', 1999, 18, 45, 6.0),
+        ]
+        self.movies = {}
+        for title, genres, countries, kind, year, age, length, rating in specs:
+            movie = Movie.objects.create(
+                title=title, overview='', release_date=f'{year}-06-01', type=kind,
+                age_rating=age, film_length=length, rating=rating,
+            )
+            movie.genres.set(genres)
+            movie.countries.set(countries)
+            self.movies[title] = movie
+        # Две роли в одном фильме не дублируют его в выдаче
+        for character in ('Первая', 'Вторая'):
+            MovieCast.objects.create(movie=self.movies['Драмеди'], actor=self.actor, character=character)
+
+    def titles(self, query):
+        response = self.client.get(f'{self.url}?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return sorted(item['title'] for item in response.json()['results'])
+
+    def test_link_filters_any_and_all(self):
+        ids = f'{self.comedy.pk},{self.horror.pk}'
+        self.assertEqual(self.titles(f'genre={ids}'), ['Драмеди', 'Ужастик'])
+        self.assertEqual(self.titles(f'genre={self.comedy.pk}&genre={self.horror.pk}'), ['Драмеди', 'Ужастик'])
+        self.assertEqual(self.titles(f'genres={self.drama.pk}'), ['Драма', 'Драмеди'])
+        self.assertEqual(self.titles(f'genre_all={self.drama.pk},{self.comedy.pk}'), ['Драмеди'])
+        self.assertEqual(self.titles(f'country={self.russia.pk}&genre={self.drama.pk}'), ['Драма'])
+        self.assertEqual(self.titles(f'country_all={self.usa.pk},{self.russia.pk}'), ['Ужастик'])
+        self.assertEqual(self.titles(f'actor={self.actor.pk}'), ['Драмеди'])
+
+    def test_field_and_range_filters(self):
+        self.assertEqual(self.titles('type=TV_SERIES'), ['Ужастик'])
+        self.assertEqual(self.titles('year=2005'), ['Драмеди'])
+        self.assertEqual(self.titles('year_min=2000&year_max=2010'), ['Драмеди'])
+        self.assertEqual(self.titles('age_rating_min=13&age_rating_max=16'), ['Драмеди'])
+        self.assertEqual(self.titles('film_length_min=60&film_length_max=120'), ['Драмеди'])
+        self.assertEqual(self.titles('min_rating=7'), ['Драма', 'Драмеди'])
+
+    def test_invalid_values_are_rejected(self):
+        for query in ('min_rating=восемь', 'genre=1,драма', 'year=2000a', 'actor=x',
+                      'genre=1e30', 'country_all=1e30', 'actor=1e30', f'genre={2 ** 63}', 'genre=0',
+                      'genre=1.5', 'year=2005.7', 'year_min=1e30'):
+            self.assertEqual(self.client.get(f'{self.url}?{query}').status_code, 400, query)
+        self.assertEqual(self.client.get(f'{self.url}facets/?actor=1e30').status_code, 400)
+
+    @skipUnless(connection.vendor == 'sqlite', 'планы запросов в формате SQLite')
+    def test_query_plans_use_semi_joins_and_indexes(self):
+        cases = {
+            f'genre={self.drama.pk},{self.comedy.pk}': 'movies_movie_genres_movie_id_genre_id',
+            f'genre_all={self.drama.pk},{self.comedy.pk}': 'movies_movie_genres_movie_id_genre_id',
+            f'country={self.usa.pk}': 'movies_movie_countries_movie_id_country_id',
+            f'actor={self.actor.pk}': 'movies_moviecast_actor_idx',
+            'year_min=2000&year_max=2010': 'movies_movie_release_idx',
+            'type=FILM': 'movies_movie_type_idx',
+        }
+        for query, index in cases.items():
+            queryset = MovieFilter(QueryDict(query), queryset=Movie.objects.all()).qs.order_by('-release_date')
+            sql = str(queryset.query)
+            plan = queryset.explain()
+            self.assertNotIn('DISTINCT', sql, query)
+            self.assertNotIn('JOIN', sql, query)
+            self.assertIn(index, plan, query)
+            # Таблицы читаются только по индексу
+            for line in plan.splitlines():
+                if 'SCAN' in line:
+                    self.assertIn('USING', line, f'{query}: {line}')
+
+
+class ApiBudgetTests(TestCase):
+    """
+    Бюджеты числа запросов и времени ответа для всех эндпоинтов на синтетическом
+    каталоге: N+1 (запрос на фильм страницы) или лишний prefetch сразу ломают тест.
+    Время — лучшее из нескольких запусков; на медленной машине бюджеты времени
+    масштабируются переменной окружения API_BUDGET_TIME_SCALE.
+    """
+    SCALE = 2000
+    RUNS = 3
+    time_scale = float(os.environ.get('API_BUDGET_TIME_SCALE', '1'))
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('populate_movies', scale=cls.SCALE, stdout=StringIO())
+        rebuild_similar()
+        cls.ids = {
+            'movie': Movie.objects.filter(title__startswith='Синтетический').order_by('pk').values_list('pk', flat=True)[10],
+            'genre': Genre.objects.order_by('pk').values_list('pk', flat=True)[0],
+            'country': Country.objects.order_by('pk').values_list('pk', flat=True)[0],
+            'actor': Actor.objects.order_by('-movie_count').values_list('pk', flat=True)[0],
+        }
+
+    def setUp(self):
+        cache.clear()
+        list_cache.clear()
+        # Первый запрос загружает URLconf и схемы сериализаторов — не в счёт
+        self.client.get('/api/genres/')
+
+    def assertWithinBudget(self, url: str, max_queries: int, max_seconds: float):
+        url = url.format(**self.ids)
+        with self.subTest(url=url):
+            timings = []
+            for run in range(self.RUNS):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = self.client.get(url)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    timings.append(time.perf_counter() - started)
+                if run == 0:
+                    # Кэши (фасеты, списки) прогреваются первым запуском — считаем его
+                    self.assertEqual(response.status_code, 200, response.content[:200] if not response.streaming else '')
+                    count = len(queries)
+                    self.assertLessEqual(count, max_queries, '\n'.join(q['sql'] for q in queries.captured_queries))
+            self.assertLessEqual(min(timings), max_seconds * self.time_scale, f'{min(timings):.3f} с')
+
+    def test_movie_list_and_filters(self):
+        # COUNT, страница, жанры и страны страницы
+        for query in (
+            '', 'page=5', 'genre={genre}', 'genre_all={genre},{country}', 'country={country}',
+            'actor={actor}', 'type=FILM', 'year_min=1990&year_max=2000', 'min_rating=7',
+            'film_length_min=90&film_length_max=120', 'ordering=-weighted_rating', 'search=фильм',
+        ):
+            self.assertWithinBudget(f'/api/movies/?{query}', 4, 0.2)
+
+    def test_movie_detail_and_actions(self):
+        self.assertWithinBudget('/api/movies/{movie}/', 5, 0.1)
+        self.assertWithinBudget('/api/movies/{movie}/cast/', 2, 0.1)
+        self.assertWithinBudget('/api/movies/{movie}/similar/', 3, 0.1)
+        # Версия журнала и шесть агрегатов при промахе кэша
+        self.assertWithinBudget('/api/movies/facets/', 7, 0.3)
+        self.assertWithinBudget('/api/movies/facets/?genre={genre}', 7, 0.3)
+        self.assertWithinBudget('/api/movies/search/?q=Роль 1', 4, 1.0)
+
+    def test_genres_and_countries(self):
+        for resource, key in (('genres', 'genre'), ('countries', 'country')):
+            self.assertWithinBudget(f'/api/{resource}/', 2, 0.05)
+            self.assertWithinBudget(f'/api/{resource}/?search=а', 1, 0.05)
+            self.assertWithinBudget(f'/api/{resource}/{{{key}}}/', 1, 0.05)
+        self.assertWithinBudget('/api/genres/{genre}/top/', 4, 0.2)
+
+    def test_actors(self):
+        self.assertWithinBudget('/api/actors/', 2, 0.1)
+        self.assertWithinBudget('/api/actors/?ordering=-total_votes&movie_count__gte=5', 2, 0.1)
+        self.assertWithinBudget('/api/actors/?search=актёр', 2, 0.1)
+        self.assertWithinBudget('/api/actors/{actor}/', 1, 0.05)
+        self.assertWithinBudget('/api/actors/{actor}/movies/', 5, 0.2)
+
+    def test_catalog_sync(self):
+        chunks = -(-Movie.objects.count() // settings.CATALOG_EXPORT_CHUNK_SIZE)
+        # Версия и по три запроса (фильмы, жанры, страны) на пачку
+        self.assertWithinBudget('/api/catalog/export/', 1 + 3 * chunks + 1, 2.0)
+        self.assertWithinBudget('/api/changes/?since=0', 7, 1.0)
+
+
+class BenchmarkApiTests(TestCase):
+    def setUp(self):
+        call_command('populate_movies', stdout=StringIO())
+        # Как тестовый клиент Django: не закрывать соединение внутри транзакции теста
+        for signal in (request_started, request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+
+    def test_runs_asgi_app_and_writes_report(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = f'{directory}/bench.json'
+            call_command(
+                'benchmark_api', concurrency='1,4', requests=40, warmup=5, seed=1,
+                output=output, stdout=StringIO(),
+            )
+            with open(output, encoding='utf-8') as file:
+                report = json.load(file)
+
+            self.assertEqual(report['meta']['target'], 'asgi')
+            self.assertEqual(report['meta']['movies'], 10)
+            self.assertEqual([level['concurrency'] for level in report['levels']], [1, 4])
+            for level in report['levels']:
+                self.assertEqual((level['requests'], level['errors']), (40, 0))
+                latency = level['latency']
+                self.assertLessEqual(latency['p50_ms'], latency['p95_ms'])
+                self.assertLessEqual(latency['p95_ms'], latency['p99_ms'])
+                self.assertTrue(set(level['scenarios']) <= {'browse', 'filter', 'search', 'detail', 'actor'})
+                self.assertEqual(sum(stats['count'] for stats in level['scenarios'].values()), 40)
+
+            stdout = StringIO()
+            call_command('benchmark_api', concurrency='4', requests=10, warmup=0, mix='detail=1',
+                         output=f'{directory}/next.json', baseline=output, stdout=stdout)
+            self.assertIn('было', stdout.getvalue())
+
+    def test_rejects_unknown_scenario(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_api', mix='checkout=5', stdout=StringIO())
+
+
+@override_settings(
+    REQUEST_PROFILING=True, REQUEST_PROFILING_SAMPLE_RATE=0, REQUEST_PROFILING_SLOW_MS=10 ** 6,
+    REQUEST_PROFILING_TOKEN='secret', REQUEST_PROFILER='cprofile',
+)
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        call_command('populate_movies', stdout=StringIO())
+
+    def timings(self, response) -> dict:
+        metrics = {}
+        for metric in response['Server-Timing'].split(', '):
+            name, *params = metric.split(';')
+            metrics[name] = dict(param.split('=', 1) for param in params)
+        return metrics
+
+    def test_disabled_middleware_is_not_used(self):
+        with override_settings(REQUEST_PROFILING=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                RequestProfilingMiddleware(lambda request: None)
+            self.assertNotIn('Server-Timing', self.client.get('/api/genres/1/').headers)
+
+    def test_server_timing_reports_db_and_serializer(self):
+        response = self.client.get('/api/movies/')
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {'total', 'db', 'serialize'})
+        self.assertEqual(timings['db']['desc'], '"4 queries"')
+        self.assertLessEqual(float(timings['serialize']['dur']), float(timings['total']['dur']))
+
+    def test_repeated_queries_are_flagged_and_logged(self):
+        def genre_ids(serializer, movie):
+            return list(movie.genres.values_list('id', flat=True))
+
+        with mock.patch.object(MovieListSerializer, 'get_genre_ids', genre_ids), \
+                self.assertLogs('movies.profiling', 'WARNING') as logs:
+            response = self.client.get('/api/movies/')
+
+        self.assertEqual(self.timings(response)['db']['desc'], '"14 queries (10 repeated)"')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'movie-list')
+        self.assertEqual(record['duplicates'][0]['count'], 10)
+        self.assertIn('movies_movie_genres', record['duplicates'][0]['sql'])
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=1)
+    def test_sampled_log_record(self):
+        with self.assertLogs('movies.profiling', 'INFO') as logs:
+            response = self.client.get('/api/genres/')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertEqual((record['status'], record['response_bytes']), (200, len(response.content)))
+        self.assertEqual(record['duplicates'], [])
+
+    def test_profile_dump_requires_token(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(REQUEST_PROFILING_DIR=directory):
+            self.assertNotIn('X-Profile-File', self.client.get('/api/movies/', HTTP_X_PROFILE='wrong').headers)
+            response = self.client.get('/api/movies/', HTTP_X_PROFILE='secret')
+            self.assertEqual(os.listdir(directory), [response['X-Profile-File']])
+            self.assertRegex(response['X-Profile-File'], r'-GET-api-movies-\w{6}\.prof$')
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    def setUp(self):
+        call_command('populate_movies', stdout=StringIO())
+        cache.clear()
+        list_cache.clear()
+
+    def sample(self, name: str, **labels) -> float:
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    def test_request_latency_and_queries_per_view_action(self):
+        labels = {'view': 'MovieViewSet.list', 'method': 'GET', 'status': '2xx'}
+        requests = self.sample('catalog_http_request_duration_seconds_count', **labels)
+        queries = self.sample('catalog_http_request_db_queries_sum', view='MovieViewSet.list')
+        movie = Movie.objects.first()
+
+        self.client.get('/api/movies/')
+        self.client.get(f'/api/movies/{movie.pk}/cast/')
+        self.client.get('/api/movies/999999/cast/')
+
+        self.assertEqual(self.sample('catalog_http_request_duration_seconds_count', **labels), requests + 1)
+        self.assertEqual(self.sample('catalog_http_request_db_queries_sum', view='MovieViewSet.list'), queries + 4)
+        self.assertGreaterEqual(self.sample('catalog_http_request_duration_seconds_count',
+                                            view='MovieViewSet.cast', method='GET', status='4xx'), 1)
+
+    def test_cache_hits_and_misses(self):
+        before = {result: self.sample('catalog_cache_requests_total', cache='facets', result=result)
+                  for result in ('hit', 'miss')}
+        self.client.get('/api/movies/facets/')
+        self.client.get('/api/movies/facets/')
+        self.assertEqual(self.sample('catalog_cache_requests_total', cache='facets', result='miss'), before['miss'] + 1)
+        self.assertEqual(self.sample('catalog_cache_requests_total', cache='facets', result='hit'), before['hit'] + 1)
+
+    def test_kinopoisk_client_stats(self):
+        api = FakeKinopoiskAPI()
+        api.queued = [httpx.Response(429, headers={'Retry-After': '0'}), httpx.Response(503)]
+        counters = {
+            'rate_limited': ('kinopoisk_requests_total', {'status': '429'}),
+            'ok': ('kinopoisk_requests_total', {'status': '200'}),
+            'retry_429': ('kinopoisk_retries_total', {'reason': '429'}),
+            'retry_5xx': ('kinopoisk_retries_total', {'reason': '5xx'}),
+            'latency': ('kinopoisk_request_duration_seconds_count', {}),
+        }
+        before = {key: self.sample(name, **labels) for key, (name, labels) in counters.items()}
+
+        make_service(api).import_from_url('https://www.kinopoisk.ru/film/435/')
+
+        delta = {key: self.sample(name, **labels) - before[key] for key, (name, labels) in counters.items()}
+        self.assertEqual(delta, {'rate_limited': 1, 'ok': 3, 'retry_429': 1, 'retry_5xx': 1, 'latency': 5})
+
+    def test_compress_image_timing(self):
+        buffer = BytesIO()
+        Image.new('RGBA', (40, 30), 'red').save(buffer, format='PNG')
+        before = self.sample('catalog_image_compress_duration_seconds_count')
+
+        compressed = compress_image(ContentFile(buffer.getvalue(), name='poster.png'))
+
+        self.assertEqual(compressed.name, 'poster.jpg')
+        self.assertEqual(self.sample('catalog_image_compress_duration_seconds_count'), before + 1)
+
+    def test_metrics_endpoint(self):
+        self.client.get('/api/genres/')
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('catalog_http_request_duration_seconds_bucket{', response.content.decode())
+        self.assertIn('view="GenreViewSet.list"', response.content.decode())
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+
+    def test_token_required_without_debug(self):
+        with override_settings(METRICS_TOKEN=''):
+            with self.assertRaises(ImproperlyConfigured):
+                MetricsMiddleware(lambda request: None)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.client.get('/metrics').status_code, 200)
+        with override_settings(METRICS_ENABLED=False):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 404)
+
+    def test_multiprocess_registry_reads_worker_files(self):
+        with tempfile.TemporaryDirectory() as directory, mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}):
+            collected = registry()
+            self.assertIsNot(collected, REGISTRY)
+            self.assertEqual(list(collected.collect()), [])
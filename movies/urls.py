@@ -1,12 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import MovieViewSet, GenreViewSet, ActorViewSet
+from .views import MovieViewSet, GenreViewSet, CountryViewSet, ActorViewSet, CatalogExportView, ChangesView
 
 router = DefaultRouter()
 router.register(r'movies', MovieViewSet, basename='movie')
 router.register(r'genres', GenreViewSet, basename='genre')
+router.register(r'countries', CountryViewSet, basename='country')
 router.register(r'actors', ActorViewSet, basename='actor')
 
 urlpatterns = [
+    path('catalog/export/', CatalogExportView.as_view(), name='catalog-export'),
+    path('changes/', ChangesView.as_view(), name='changes'),
     path('', include(router.urls)),
 ]
@@ -1,18 +1,36 @@
-from rest_framework import viewsets, filters
+from rest_framework import viewsets, filters, serializers
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.conf import settings
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.db.models import Prefetch, Q
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiTypes
 
-from .models import Movie, Genre, Actor, MovieCast
+from .changes import changes_since, current_version
+from .facets import get_facets, list_cache, genres_with_counts, countries_with_counts
+from .filters import MovieFilter
+from .models import Movie, Genre, Actor, Country, MovieCast, ChangeLog, SimilarMovie, GenreTopMovie
 from .serializers import (
     MovieListSerializer, 
     MovieDetailSerializer, 
     GenreSerializer, 
     MovieCastSerializer,
-    ActorSerializer
+    ActorSerializer,
+    CountrySerializer,
+    ChangesSerializer,
+    MovieFacetsSerializer,
+    SimilarMovieSerializer,
+    FilmographySerializer,
+    GenreCountSerializer,
+    CountryCountSerializer,
 )
+from .streaming import NDJSONRenderer, ndjson_chunks, stream_response
 
 
 @extend_schema_view(
@@ -20,12 +38,11 @@ from .serializers import (
         summary="Список фильмов",
         description="Получить список всех фильмов с пагинацией, фильтрацией и сортировкой.",
         parameters=[
-            OpenApiParameter(name='genre', description='ID жанра для фильтрации', type=OpenApiTypes.INT),
-            OpenApiParameter(name='actor', description='ID актёра для фильтрации', type=OpenApiTypes.INT),
-            OpenApiParameter(name='year', description='Год выхода фильма', type=OpenApiTypes.INT),
-            OpenApiParameter(name='min_rating', description='Минимальный рейтинг (например: 8.0)', type=OpenApiTypes.FLOAT),
-            OpenApiParameter(name='search', description='Поиск по названию и описанию', type=OpenApiTypes.STR),
-            OpenApiParameter(name='ordering', description='Сортировка: rating, -rating, release_date, -release_date, vote_count, title', type=OpenApiTypes.STR),
+            OpenApiParameter(
+                name='ordering',
+                description='Сортировка: rating, -rating, weighted_rating, -weighted_rating (с учётом числа голосов), release_date, -release_date, vote_count, title',
+                type=OpenApiTypes.STR,
+            ),
         ],
         tags=['movies']
     ),
@@ -39,14 +56,15 @@ class MovieViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API для работы с фильмами.
     
-    Поддерживает фильтрацию по жанрам, актёрам, году выхода и рейтингу.
+    Поддерживает фильтрацию по жанрам, странам, актёрам, типу, году выхода,
+    рейтингу, возрастному рейтингу и длительности (см. filters.MovieFilter).
     Поиск по названию и описанию. Сортировка по различным полям.
     """
-    queryset = Movie.objects.prefetch_related('genres', 'cast__actor', 'countries', 'sources').all()
+    queryset = Movie.objects.all()
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['genres']
+    filterset_class = MovieFilter
     search_fields = ['title', 'overview']
-    ordering_fields = ['rating', 'release_date', 'vote_count', 'title']
+    ordering_fields = ['rating', 'weighted_rating', 'release_date', 'vote_count', 'title']
     ordering = ['-release_date']
 
     def get_serializer_class(self):
@@ -55,29 +73,14 @@ class MovieViewSet(viewsets.ReadOnlyModelViewSet):
         return MovieListSerializer
 
     def get_queryset(self):
+        # Связи загружаются только те, что выводит сериализатор действия
         queryset = super().get_queryset()
-        
-        # Фильтр по жанру через параметр genre
-        genre = self.request.query_params.get('genre')
-        if genre:
-            queryset = queryset.filter(genres__id=genre)
-        
-        # Фильтр по актёру
-        actor = self.request.query_params.get('actor')
-        if actor:
-            queryset = queryset.filter(cast__actor__id=actor)
-        
-        # Фильтр по году выхода
-        year = self.request.query_params.get('year')
-        if year:
-            queryset = queryset.filter(release_date__year=year)
-        
-        # Фильтр по минимальному рейтингу
-        min_rating = self.request.query_params.get('min_rating')
-        if min_rating:
-            queryset = queryset.filter(rating__gte=float(min_rating))
-        
-        return queryset.distinct()
+        if self.action == 'retrieve':
+            cast = MovieCast.objects.select_related('actor').order_by('order')
+            return queryset.prefetch_related('genres', 'countries', 'sources', Prefetch('cast', queryset=cast))
+        if self.action in ('list', 'search'):
+            return queryset.prefetch_related('genres', 'countries')
+        return queryset
 
     @extend_schema(
         summary="Актёрский состав",
@@ -93,6 +96,46 @@ class MovieViewSet(viewsets.ReadOnlyModelViewSet):
         serializer = MovieCastSerializer(cast, many=True)
         return Response(serializer.data)
 
+    @extend_schema(
+        summary="Похожие фильмы",
+        description=(
+            "Фильмы с общими жанрами, странами, актёрами и близким рейтингом, по убыванию сходства. "
+            "Список рассчитывается заранее (build_similar_movies) и обновляется при импорте."
+        ),
+        responses={200: SimilarMovieSerializer(many=True)},
+        tags=['movies']
+    )
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Получить похожие фильмы"""
+        if not str(pk).isdigit():
+            raise Http404
+        similar = list(
+            SimilarMovie.objects.filter(movie_id=pk).order_by('rank')
+            .select_related('similar').prefetch_related('similar__genres', 'similar__countries')
+        )
+        if not similar:
+            # Пустой список — только для существующего фильма
+            get_object_or_404(Movie.objects.only('pk'), pk=pk)
+        return Response(SimilarMovieSerializer(similar, many=True).data)
+
+    @extend_schema(
+        summary="Фасеты для фильтров",
+        description=(
+            "Количество фильмов по жанрам, странам, годам, возрастному рейтингу и диапазонам рейтинга "
+            "для текущего набора фильтров (те же параметры, что у списка фильмов). "
+            "Ответ кэшируется до следующего изменения каталога."
+        ),
+        filters=True,
+        responses={200: MovieFacetsSerializer},
+        tags=['movies']
+    )
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def facets(self, request):
+        """Счётчики по значениям фильтров для текущей выборки"""
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(get_facets(queryset, request.query_params))
+
     @extend_schema(
         summary="Умный поиск фильмов",
         description="Поиск фильмов по названию, описанию, имени актёра, персонажу и жанру.",
@@ -109,7 +152,7 @@ class MovieViewSet(viewsets.ReadOnlyModelViewSet):
         if not query:
             return Response({'results': []})
         
-        queryset = self.queryset.filter(
+        queryset = self.get_queryset().filter(
             Q(title__icontains=query) |                    # По названию
             Q(overview__icontains=query) |                 # По описанию
             Q(cast__actor__name__icontains=query) |        # По имени актёра
@@ -125,10 +168,24 @@ class MovieViewSet(viewsets.ReadOnlyModelViewSet):
         return Response({'results': serializer.data})
 
 
+class CachedCountsListMixin:
+    """
+    Список с числом фильмов: без фильтров отдаётся из кэша в памяти процесса
+    (facets.list_cache), с поиском — считается запросом.
+    """
+    cache_key = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('search'):
+            return super().list(request, *args, **kwargs)
+        data = list_cache.get(self.cache_key, lambda: list(self.get_serializer(self.get_queryset(), many=True).data))
+        return Response(data)
+
+
 @extend_schema_view(
     list=extend_schema(
         summary="Список жанров",
-        description="Получить список всех жанров фильмов.",
+        description="Получить список всех жанров фильмов с числом фильмов в каждом.",
         tags=['genres']
     ),
     retrieve=extend_schema(
@@ -137,19 +194,67 @@ class MovieViewSet(viewsets.ReadOnlyModelViewSet):
         tags=['genres']
     ),
 )
-class GenreViewSet(viewsets.ReadOnlyModelViewSet):
+class GenreViewSet(CachedCountsListMixin, viewsets.ReadOnlyModelViewSet):
     """API для работы с жанрами фильмов."""
-    queryset = Genre.objects.all()
-    serializer_class = GenreSerializer
+    queryset = genres_with_counts()
+    serializer_class = GenreCountSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['name']
     pagination_class = None
+    cache_key = 'genres'
+
+    @extend_schema(
+        summary="Лучшие фильмы жанра",
+        description=(
+            "Фильмы жанра по убыванию взвешенного рейтинга (учитывает число голосов). "
+            "Список пересчитывается при импорте фильмов жанра и вместе с рейтингами "
+            "(refresh_ratings, recompute_rankings)."
+        ),
+        responses={200: MovieListSerializer(many=True)},
+        tags=['genres']
+    )
+    @action(detail=True, methods=['get'])
+    def top(self, request, pk=None):
+        """Получить лидеров жанра"""
+        genre = self.get_object()
+        entries = (
+            GenreTopMovie.objects.filter(genre=genre).order_by('rank')
+            .select_related('movie').prefetch_related('movie__genres', 'movie__countries')
+        )
+        serializer = MovieListSerializer([entry.movie for entry in entries], many=True)
+        return Response(serializer.data)
+
+
+@extend_schema_view(
+    list=extend_schema(
+        summary="Список стран",
+        description="Получить список стран производства с числом фильмов в каждой.",
+        tags=['countries']
+    ),
+    retrieve=extend_schema(
+        summary="Детали страны",
+        description="Получить информацию о стране по ID.",
+        tags=['countries']
+    ),
+)
+class CountryViewSet(CachedCountsListMixin, viewsets.ReadOnlyModelViewSet):
+    """API для работы со странами производства."""
+    queryset = countries_with_counts()
+    serializer_class = CountryCountSerializer
+    filter_backends = [filters.SearchFilter]
+    search_fields = ['name']
+    pagination_class = None
+    cache_key = 'countries'
 
 
 @extend_schema_view(
     list=extend_schema(
         summary="Список актёров",
-        description="Получить список всех актёров с пагинацией.",
+        description=(
+            "Получить список всех актёров с пагинацией. Популярные актёры: "
+            "ordering=-total_votes (сумма голосов за фильмы) или ordering=-movie_count; "
+            "фильтры movie_count__gte, total_votes__gte."
+        ),
         tags=['actors']
     ),
     retrieve=extend_schema(
@@ -162,25 +267,134 @@ class ActorViewSet(viewsets.ReadOnlyModelViewSet):
     """API для работы с актёрами."""
     queryset = Actor.objects.all()
     serializer_class = ActorSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Счётчики денормализованы и проиндексированы: сортировка и фильтр без агрегации по ролям
+    filterset_fields = {'movie_count': ['gte'], 'total_votes': ['gte']}
     search_fields = ['name']
-    ordering_fields = ['name']
+    ordering_fields = ['name', 'movie_count', 'total_votes']
     ordering = ['name']
 
     @extend_schema(
         summary="Фильмы актёра",
-        description="Получить список фильмов, в которых снимался данный актёр.",
-        responses={200: MovieListSerializer(many=True)},
+        description="Фильмография актёра с ролями, от новых фильмов к старым.",
+        responses={200: FilmographySerializer(many=True)},
         tags=['actors']
     )
     @action(detail=True, methods=['get'])
     def movies(self, request, pk=None):
         """Получить фильмы актёра"""
         actor = self.get_object()
-        movies = Movie.objects.filter(cast__actor=actor).distinct()
-        page = self.paginate_queryset(movies)
+        # Роли с фильмами одним JOIN, жанры и страны — по запросу на страницу
+        roles = (
+            MovieCast.objects.filter(actor=actor)
+            .select_related('movie').prefetch_related('movie__genres', 'movie__countries')
+            .order_by('-movie__release_date', 'movie_id', 'order')
+        )
+        page = self.paginate_queryset(roles)
+        movies = [self._with_role(role) for role in (page if page is not None else roles)]
+        serializer = FilmographySerializer(movies, many=True)
         if page is not None:
-            serializer = MovieListSerializer(page, many=True)
             return self.get_paginated_response(serializer.data)
-        serializer = MovieListSerializer(movies, many=True)
         return Response({'results': serializer.data})
+
+    @staticmethod
+    def _with_role(role: MovieCast) -> Movie:
+        movie = role.movie
+        movie.character, movie.order = role.character, role.order
+        return movie
+
+
+@extend_schema(
+    summary="Выгрузка каталога",
+    description=(
+        "Все фильмы одним потоковым ответом для офлайн-кэша приложения: NDJSON, "
+        "по объекту в формате списка фильмов на строку, в порядке ID. "
+        "Без пагинации и подсчёта; при Accept-Encoding: gzip ответ сжимается."
+    ),
+    responses={(200, 'application/x-ndjson'): MovieListSerializer(many=True)},
+    tags=['catalog']
+)
+class CatalogExportView(APIView):
+    """Потоковая выгрузка всего каталога фильмов в NDJSON"""
+    # JSON первым: в нём отдаются ошибки при Accept: */*
+    renderer_classes = [JSONRenderer, NDJSONRenderer]
+
+    def get(self, request):
+        version = current_version()
+        queryset = Movie.objects.prefetch_related('genres', 'countries').order_by('pk')
+        chunks = ndjson_chunks(
+            queryset, MovieListSerializer,
+            chunk_size=settings.CATALOG_EXPORT_CHUNK_SIZE,
+            context={'request': request},
+        )
+        response = stream_response(request, chunks)
+        # Версия журнала изменений на момент выгрузки: с неё клиент продолжает через /api/changes/
+        response['X-Changes-Version'] = str(version)
+        return response
+
+
+@extend_schema(
+    summary="Изменения каталога",
+    description=(
+        "Фильмы, актёры, жанры и страны, изменённые после версии `since` "
+        "(ID из журнала изменений или время в ISO 8601), и ID удалённых объектов. "
+        "Следующий запрос делается с `since` = `version` из ответа; при `has_more` — сразу же. "
+        "`reset: true` означает, что каталог заменён целиком: нужна полная выгрузка "
+        "через /api/catalog/export/ (её заголовок X-Changes-Version — новая версия)."
+    ),
+    parameters=[
+        OpenApiParameter(name='since', description='Версия или время последней синхронизации', type=OpenApiTypes.STR),
+        OpenApiParameter(name='limit', description='Максимум записей журнала за запрос (до 5000)', type=OpenApiTypes.INT),
+    ],
+    responses={200: ChangesSerializer},
+    tags=['catalog']
+)
+class ChangesView(APIView):
+    """Дельта-синхронизация: изменения каталога после версии или момента времени"""
+    max_limit = 5000
+
+    def get(self, request):
+        since = self.parse_since(request.query_params.get('since', '0'))
+        try:
+            limit = min(max(int(request.query_params.get('limit', 1000)), 1), self.max_limit)
+        except ValueError:
+            raise serializers.ValidationError({'limit': 'Ожидается целое число'})
+
+        changes = changes_since(since, limit)
+        upserts = changes['upserts']
+        movies = (
+            Movie.objects.filter(pk__in=upserts[ChangeLog.MODEL_MOVIE])
+            .prefetch_related('genres', 'countries').order_by('pk')
+        )
+        objects = {
+            'movies': (ChangeLog.MODEL_MOVIE, movies, MovieListSerializer),
+            'actors': (ChangeLog.MODEL_ACTOR, Actor.objects.filter(pk__in=upserts[ChangeLog.MODEL_ACTOR]), ActorSerializer),
+            'genres': (ChangeLog.MODEL_GENRE, Genre.objects.filter(pk__in=upserts[ChangeLog.MODEL_GENRE]), GenreSerializer),
+            'countries': (ChangeLog.MODEL_COUNTRY, Country.objects.filter(pk__in=upserts[ChangeLog.MODEL_COUNTRY]), CountrySerializer),
+        }
+
+        data = {key: changes[key] for key in ('version', 'has_more', 'reset')}
+        data['deleted'] = {}
+        for key, (model, queryset, serializer_class) in objects.items():
+            found = list(queryset) if upserts[model] else []
+            data[key] = serializer_class(found, many=True, context={'request': request}).data
+            # Изменённые, но уже удалённые без записи в журнал объекты — тоже удалены
+            missing = set(upserts[model]) - {obj.pk for obj in found}
+            data['deleted'][key] = sorted(set(changes['deleted'][model]) | missing)
+        return Response(data)
+
+    @staticmethod
+    def parse_since(value: str) -> int:
+        if value.isdigit() and len(value) <= 18:
+            return int(value)
+        try:
+            # Верный формат, но несуществующая дата (2024-13-45) — ValueError
+            moment = parse_datetime(value.replace(' ', '+'))
+        except ValueError:
+            moment = None
+        if moment is None:
+            raise serializers.ValidationError({'since': 'Ожидается версия (целое число) или время в ISO 8601'})
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        first = ChangeLog.objects.filter(changed_at__gt=moment).order_by('id').values_list('id', flat=True).first()
+        return first - 1 if first else current_version()